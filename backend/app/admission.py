@@ -0,0 +1,310 @@
+from fastapi import HTTPException, status
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.auth import SECRET_KEY
+import contextlib
+import hashlib
+import heapq
+import hmac
+import os
+import time
+
+load_dotenv()
+
+# --- Configuration ---
+# Virtual waiting room in front of the booking endpoints. Buyers join a per-event
+# queue, get a signed token carrying their place, and are admitted at a fixed rate
+# per event. A buyer holds one place per event, and a token books once.
+# Joining and polling never touch the database.
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "false").lower() == "true"
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "memory").lower()  # memory | redis
+ADMISSION_REDIS_URL = os.getenv("ADMISSION_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+# Buyers admitted per second per event, and how many may be admitted at once after a quiet period
+ADMISSION_RATE_PER_SECOND = float(os.getenv("ADMISSION_RATE_PER_SECOND", 50))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", ADMISSION_RATE_PER_SECOND))
+# Per-event overrides, e.g. "12:200,15:20" (event_id:rate)
+ADMISSION_EVENT_RATES: Dict[int, float] = {
+    int(event_id): float(rate)
+    for event_id, rate in (
+        pair.split(":") for pair in os.getenv("ADMISSION_EVENT_RATES", "").split(",") if pair.strip()
+    )
+}
+# How long a queue token stays usable for booking once its place is admitted
+ADMISSION_TOKEN_TTL_SECONDS = int(os.getenv("ADMISSION_TOKEN_TTL_SECONDS", 300))
+
+
+def rate_for(event_id: int) -> float:
+    return ADMISSION_EVENT_RATES.get(event_id, ADMISSION_RATE_PER_SECOND)
+
+def burst_for(event_id: int) -> float:
+    # Events with their own rate also get a burst of one second's worth of buyers
+    return ADMISSION_EVENT_RATES.get(event_id, ADMISSION_BURST)
+
+
+# --- Queue Backends ---
+# Each event has a counter of issued places and an admission watermark that
+# advances at the event's rate (capped at issued + burst, like a token bucket).
+# Place N is admitted once the watermark reaches N. Each buyer's live place is
+# kept as a member entry, (place, expires_at), until it expires or books.
+
+# A buyer's place in an event's queue and the time its token stops being valid
+Member = Tuple[int, int]
+
+class InMemoryAdmissionQueue:
+    """Per-process queue (one worker, or tests). Only used from the event loop thread."""
+
+    def __init__(self):
+        self._state: Dict[int, list] = {}  # event_id -> [issued, watermark, last_update]
+        self._members: Dict[Tuple[int, str], Member] = {}
+        # (expires_at, event_id, username) per stored entry, soonest expiry first
+        self._expiries: List[Tuple[int, int, str]] = []
+
+    async def advance(self, event_id: int, join: bool, now: float) -> Tuple[int, float]:
+        """Moves the watermark to `now` (optionally issuing one more place); returns (issued, watermark)."""
+        rate, burst = rate_for(event_id), burst_for(event_id)
+        state = self._state.setdefault(event_id, [0, burst, now])
+        issued, watermark, last = state
+        if now > last:
+            watermark = min(watermark + (now - last) * rate, issued + burst)
+            last = now
+        if join:
+            issued += 1
+        state[:] = [issued, watermark, last]
+        return issued, watermark
+
+    async def get_member(self, event_id: int, username: str, now: float) -> Optional[Member]:
+        member = self._members.get((event_id, username))
+        return member if member is not None and member[1] > now else None
+
+    async def set_member(self, event_id: int, username: str, member: Member, now: float) -> bool:
+        """Stores the buyer's place unless they already hold a live one; False if they do."""
+        # Drop every expired entry, whatever order they were stored in (places
+        # admitted later expire later, so their expiry is not the insertion order)
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, expired_event_id, expired_username = heapq.heappop(self._expiries)
+            key = (expired_event_id, expired_username)
+            # Claimed or replaced entries left their heap item behind
+            if key in self._members and self._members[key][1] == expires_at:
+                del self._members[key]
+        if (event_id, username) in self._members:
+            return False
+        self._members[(event_id, username)] = member
+        heapq.heappush(self._expiries, (member[1], event_id, username))
+        return True
+
+    async def claim_member(self, event_id: int, username: str, member: Member) -> bool:
+        """Removes the buyer's place if it is still `member`; True for exactly one caller."""
+        if self._members.get((event_id, username)) != member:
+            return False
+        del self._members[(event_id, username)]
+        return True
+
+
+class RedisAdmissionQueue:
+    """Shared queue for multi-worker deployments. ADMISSION_REDIS_URL=fakeredis:// uses a local stand-in."""
+
+    # Same algorithm as InMemoryAdmissionQueue.advance, atomically inside Redis
+    _ADVANCE = """
+    local issued = tonumber(redis.call('HGET', KEYS[1], 'issued') or '0')
+    local watermark = tonumber(redis.call('HGET', KEYS[1], 'watermark') or ARGV[3])
+    local last = tonumber(redis.call('HGET', KEYS[1], 'last') or ARGV[1])
+    local now = tonumber(ARGV[1])
+    if now > last then
+        watermark = math.min(watermark + (now - last) * tonumber(ARGV[2]), issued + tonumber(ARGV[3]))
+        last = now
+    end
+    if ARGV[4] == '1' then issued = issued + 1 end
+    redis.call('HSET', KEYS[1], 'issued', issued, 'watermark', tostring(watermark), 'last', tostring(last))
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    return {issued, tostring(watermark)}
+    """
+    # Deletes a member entry only if it still holds the place being claimed
+    _CLAIM = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+    return 0
+    """
+
+    def __init__(self, url: str):
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            self._client = fakeredis.FakeAsyncRedis(server=_fake_redis_server())
+        else:
+            import redis.asyncio
+            self._client = redis.asyncio.Redis.from_url(url)
+        self._advance = self._client.register_script(self._ADVANCE)
+        self._claim = self._client.register_script(self._CLAIM)
+
+    async def advance(self, event_id: int, join: bool, now: float) -> Tuple[int, float]:
+        rate, burst = rate_for(event_id), burst_for(event_id)
+        issued, watermark = await self._advance(
+            keys=[f"waiting-room:{event_id}"],
+            args=[repr(now), repr(rate), repr(burst), "1" if join else "0", ADMISSION_TOKEN_TTL_SECONDS],
+        )
+        return int(issued), float(watermark)
+
+    async def get_member(self, event_id: int, username: str, now: float) -> Optional[Member]:
+        value = await self._client.get(f"waiting-room:{event_id}:member:{username}")
+        if value is None:
+            return None
+        place, expires_at = value.decode().split(".")
+        return int(place), int(expires_at)
+
+    async def set_member(self, event_id: int, username: str, member: Member, now: float) -> bool:
+        return bool(await self._client.set(
+            f"waiting-room:{event_id}:member:{username}", f"{member[0]}.{member[1]}",
+            ex=max(1, int(member[1] - now)), nx=True,
+        ))
+
+    async def claim_member(self, event_id: int, username: str, member: Member) -> bool:
+        return bool(await self._claim(
+            keys=[f"waiting-room:{event_id}:member:{username}"], args=[f"{member[0]}.{member[1]}"],
+        ))
+
+
+_fake_server = None
+
+def _fake_redis_server():
+    """One in-process fake Redis server shared by every client, standing in for a real one."""
+    global _fake_server
+    if _fake_server is None:
+        import fakeredis
+        _fake_server = fakeredis.FakeServer()
+    return _fake_server
+
+
+_queue = None
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        _queue = RedisAdmissionQueue(ADMISSION_REDIS_URL) if ADMISSION_BACKEND == "redis" else InMemoryAdmissionQueue()
+    return _queue
+
+
+# --- Queue Tokens ---
+
+def _sign(event_id: int, place: int, expires_at: int, username: str) -> str:
+    message = f"{event_id}.{place}.{expires_at}.{username}".encode()
+    return hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+def _token(event_id: int, member: Member, username: str) -> str:
+    place, expires_at = member
+    return f"{event_id}.{place}.{expires_at}.{_sign(event_id, place, expires_at, username)}"
+
+def _invalid_token(event_id: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"Invalid, expired or already used waiting room token for event {event_id}: join again."
+    )
+
+def _parse_token(token: str, event_id: int, username: str) -> Member:
+    """Returns the place and expiry signed into a valid token for this event and user, raising 403 otherwise."""
+    try:
+        token_event, place, expires_at, signature = token.split(".")
+        valid = (
+            int(token_event) == event_id
+            and hmac.compare_digest(signature, _sign(event_id, int(place), int(expires_at), username))
+            and int(expires_at) > time.time()
+        )
+    except ValueError:
+        valid = False
+    if not valid:
+        raise _invalid_token(event_id)
+    return int(place), int(expires_at)
+
+async def _check_token(event_id: int, token: str, username: str) -> Tuple[Member, float]:
+    """The token's place and the event's watermark; 403 unless it is the caller's live place."""
+    member = _parse_token(token, event_id, username)
+    now = time.time()
+    # A token that booked, or was replaced by a later place, is no longer the member entry
+    if await get_queue().get_member(event_id, username, now) != member:
+        raise _invalid_token(event_id)
+    _, watermark = await get_queue().advance(event_id, join=False, now=now)
+    return member, watermark
+
+def _queue_status(event_id: int, place: int, watermark: float) -> dict:
+    position = max(0, place - int(watermark))
+    return {
+        "event_id": event_id,
+        "position": position,
+        "admitted": position == 0,
+        "estimated_wait_seconds": round(position / rate_for(event_id), 1),
+    }
+
+
+# --- Public API ---
+
+async def join(event_id: int, username: str) -> dict:
+    """
+    Issues the next place in the event's queue as a signed token, or returns the
+    caller's current one: joining again never moves a buyer or adds a place.
+    """
+    queue = get_queue()
+    now = time.time()
+    member = await queue.get_member(event_id, username, now)
+    if member is None:
+        place, watermark = await queue.advance(event_id, join=True, now=now)
+        # Usable for ADMISSION_TOKEN_TTL_SECONDS once admitted, however long the wait
+        member = (place, int(now + max(0, place - watermark) / rate_for(event_id)) + ADMISSION_TOKEN_TTL_SECONDS)
+        if not await queue.set_member(event_id, username, member, now):
+            # A concurrent join of the same buyer stored its place first
+            member = await queue.get_member(event_id, username, now) or member
+    _, watermark = await queue.advance(event_id, join=False, now=now)
+    return {"token": _token(event_id, member, username), **_queue_status(event_id, member[0], watermark)}
+
+async def position(event_id: int, token: str, username: str) -> dict:
+    """Current position for a queue token (no database access)."""
+    (place, _), watermark = await _check_token(event_id, token, username)
+    return _queue_status(event_id, place, watermark)
+
+async def require_admission(event_ids: Iterable[int], queue_tokens: Optional[str], username: str) -> Dict[int, Member]:
+    """
+    Rejects a booking unless the caller holds an admitted token for every event, and
+    returns their places. `queue_tokens` is the X-Queue-Token header: one token, or
+    several comma-separated. Checks only: admitted() is what uses the places up.
+    """
+    if not ADMISSION_CONTROL_ENABLED:
+        return {}
+    tokens = {}
+    for token in (queue_tokens or "").split(","):
+        if token.strip():
+            tokens[token.strip().split(".", 1)[0]] = token.strip()
+
+    members = {}
+    for event_id in event_ids:
+        token = tokens.get(str(event_id))
+        if token is None:
+            raise HTTPException(
+                status_code=status.HTTP_428_PRECONDITION_REQUIRED,
+                detail=f"Join the waiting room for event {event_id} first (POST /v1/queue/{event_id}/join).",
+            )
+        members[event_id], watermark = await _check_token(event_id, token, username)
+        queue_status = _queue_status(event_id, members[event_id][0], watermark)
+        if not queue_status["admitted"]:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Still in the waiting room for event {event_id} (position {queue_status['position']}).",
+                headers={"Retry-After": str(max(1, int(queue_status["estimated_wait_seconds"])))},
+            )
+    return members
+
+@contextlib.asynccontextmanager
+async def admitted(members: Dict[int, Member], username: str) -> AsyncIterator[None]:
+    """
+    Wraps one booking: takes the places require_admission returned, so each token
+    books once (a concurrent request with the same token gets a 403), and gives
+    them back if the booking fails.
+    """
+    queue = get_queue()
+    claimed = {}
+    try:
+        for event_id, member in members.items():
+            if not await queue.claim_member(event_id, username, member):
+                raise _invalid_token(event_id)
+            claimed[event_id] = member
+        yield
+    except Exception:
+        # Not on cancellation: the booking may have committed
+        for event_id, member in claimed.items():
+            await queue.set_member(event_id, username, member, time.time())
+        raise
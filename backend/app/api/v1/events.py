@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, status, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from typing import List
-from app.database import get_db
-from app import schemas, crud
+from app.database import get_db, get_read_db, run_db, run_in_session, DBSession
+from app import schemas, crud, cache, catalog, responses, http_cache, availability, metrics, search, bulk
 from app.dependencies import admin_required, user_required
 
 router = APIRouter(
@@ -12,58 +12,256 @@ router = APIRouter(
 
 # --- 1. ADMIN-ONLY ROUTES (Protected by admin_required) ---
 
-@router.post("/", response_model=schemas.Event, status_code=status.HTTP_201_CREATED)
-def create_event(
+@router.post("/", response_model=schemas.AdminEvent, status_code=status.HTTP_201_CREATED)
+async def create_event(
     event: schemas.EventCreate,
     admin_user: dict = Depends(admin_required), # RBAC enforcement!
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_db)
 ):
     """
     ADMIN: Creates a new event entry.
     Requires JWT token with 'admin' role.
     """
-    return crud.admin_create_event(db=db, event=event)
+    created = await run_db(db, crud.admin_create_event, event=event)
+    # After the session call: the cache is never reached from inside run_db
+    await cache.run(cache.invalidate_catalog)
+    return created
 
-@router.put("/{event_id}", response_model=schemas.Event)
-def update_event(
+@router.post("/{event_id}/cancel", response_model=schemas.EventCancellation, status_code=status.HTTP_202_ACCEPTED)
+async def cancel_event(
     event_id: int,
-    event_update: schemas.EventBase,
     admin_user: dict = Depends(admin_required), # RBAC enforcement!
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_db)
+):
+    """
+    ADMIN: Cancels an event: it goes off sale and its open holds are released right
+    away, then every booked ticket is cancelled and put back in stock by a background
+    cascade, in small batches that live bookings interleave with. Poll
+    GET /{event_id}/cancellation for progress. Calling it again re-checks the tickets.
+    """
+    await run_db(db, crud.start_event_cancellation, event_id=event_id)
+    await cache.run(cache.invalidate_event, event_id)
+    return await run_db(db, crud.get_event_cancellation, event_id=event_id)
+
+@router.get("/{event_id}/cancellation", response_model=schemas.EventCancellation)
+async def get_event_cancellation(
+    event_id: int,
+    admin_user: dict = Depends(admin_required), # RBAC enforcement!
+    db: DBSession = Depends(get_db)
+):
+    """
+    ADMIN: Progress of an event's cancellation cascade (running, verifying, done),
+    with the number of its tickets still booked.
+    """
+    return await run_db(db, crud.get_event_cancellation, event_id=event_id)
+
+@router.post("/import", response_model=schemas.EventImportResult)
+async def import_events(
+    request: Request,
+    admin_user: dict = Depends(admin_required), # RBAC enforcement!
+    db: DBSession = Depends(get_db)
+):
+    """
+    ADMIN: Creates events in bulk from an uploaded file, read as it streams in.
+    CSV (Content-Type: text/csv): a header row of EventCreate field names, then one event per row.
+    NDJSON (application/x-ndjson): one EventCreate JSON object per line.
+    Valid rows are inserted in batches, each committed on its own; invalid rows are
+    skipped and reported with their line number.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in bulk.IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Upload text/csv or application/x-ndjson, not '{content_type}'"
+        )
+    return await bulk.import_events(db, request.stream(), bulk.IMPORT_FORMATS[content_type])
+
+@router.get("/{event_id}/attendees")
+async def export_attendees(
+    event_id: int,
+    query: schemas.AttendeeExportQuery = Depends(),
+    admin_user: dict = Depends(admin_required), # RBAC enforcement!
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    ADMIN: Downloads the event's tickets with their holders (ticket_id, status,
+    booking_date, user_id, username, email) as CSV or NDJSON, optionally only one status.
+    Streamed from a server-side cursor, so any number of rows uses the same memory.
+    """
+    await run_db(db, crud.get_event_by_id, event_id)  # 404 before the stream starts
+    media_type = "text/csv; charset=utf-8" if query.format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        bulk.export_attendees(event_id, query),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="event-{event_id}-attendees.{query.format}"'},
+    )
+
+@router.get("/sales", response_model=List[schemas.SalesTotals])
+async def get_sales_totals(
+    admin_user: dict = Depends(admin_required), # RBAC enforcement!
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    ADMIN: Tickets booked and cancelled, and their revenue at the current price, for
+    every event with sales. Read from the hourly rollups, never from the tickets table.
+    """
+    return await run_db(db, crud.get_sales_totals)
+
+@router.get("/{event_id}/sales", response_model=schemas.EventSales)
+async def get_event_sales(
+    event_id: int,
+    query: schemas.SalesQuery = Depends(),
+    admin_user: dict = Depends(admin_required), # RBAC enforcement!
+    db: DBSession = Depends(get_read_db)
+):
+    """
+    ADMIN: An event's tickets and revenue per booking hour and status, optionally
+    between `start` and `end`. Served from the rollups, which trail bookings and
+    cancellations by up to SALES_APPLY_INTERVAL_SECONDS.
+    """
+    return await run_db(db, crud.get_event_sales, event_id=event_id, query=query)
+
+@router.put("/{event_id}", response_model=schemas.AdminEvent)
+async def update_event(
+    event_id: int,
+    event_update: schemas.EventUpdate,
+    admin_user: dict = Depends(admin_required), # RBAC enforcement!
+    db: DBSession = Depends(get_db)
 ):
     """
     ADMIN: Updates an existing event. Handles changes to ticket quantities.
     Requires JWT token with 'admin' role.
     """
-    return crud.admin_update_event(db=db, event_id=event_id, event_update=event_update)
+    updated = await run_db(db, crud.admin_update_event, event_id=event_id, event_update=event_update)
+    await cache.run(cache.invalidate_event, event_id)
+    return updated
 
 @router.delete("/{event_id}", status_code=status.HTTP_200_OK)
-def delete_event(
+async def delete_event(
     event_id: int,
     admin_user: dict = Depends(admin_required), # RBAC enforcement!
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_db)
 ):
     """
     ADMIN: Deactivates (soft-deletes) an event.
     Requires JWT token with 'admin' role.
     """
     # The crud function returns a success message dictionary
-    return crud.admin_delete_event(db=db, event_id=event_id)
+    deleted = await run_db(db, crud.admin_delete_event, event_id=event_id)
+    await cache.run(cache.invalidate_event, event_id)
+    return deleted
 
 
 # --- 2. PUBLIC/AUTHENTICATED READ ROUTES ---
 
 @router.get("/", response_model=List[schemas.Event])
-def list_active_events(db: Session = Depends(get_db)):
+async def list_active_events(
+    request: Request,
+    query: schemas.EventQuery = Depends(),
+    db: DBSession = Depends(get_read_db) # Read replica when REPLICA_DATABASE_URL is set
+):
+    """
+    PUBLIC: Lists currently active events for browsing, ordered by date.
+    Supports date/location/price/availability filters and cursor pagination:
+    pass the X-Next-Cursor response header back as ?cursor= to get the next page.
+    Served from the catalog cache; only misses reach the database.
+    Send the ETag back as If-None-Match to get a 304 while the page is unchanged.
+    """
+    # The page's ids and their validators are enough to answer a conditional GET
+    event_ids = await catalog.active_event_ids(db, query)
+    # A page cached by this worker can still list events deactivated through another one
+    validators = await run_db(db, crud.get_event_validators, event_ids, active_only=True)
+    event_ids = [event_id for event_id in event_ids if event_id in validators]
+    # No Last-Modified: events leaving the page (deactivated, sold out) would not move it
+    headers = http_cache.cache_headers(http_cache.entity_tag(event_ids, validators))
+    if http_cache.not_modified(request, headers["ETag"]):
+        return http_cache.not_modified_response(headers)
+
+    # Bodies of another version than the validators' are read again, and the tag is
+    # recomputed from what is served, so it always describes this body
+    page = await catalog.get_events(db, event_ids, validators)
+    headers["ETag"] = http_cache.entity_tag(event_ids, validators)
+    cursor = catalog.next_cursor(page, query)
+    if cursor:
+        headers["X-Next-Cursor"] = cursor
+    # Catalog bodies are already schemas.Event in JSON form: no second validation pass
+    return responses.FastJSONResponse(page, headers=headers)
+
+@router.get("/search", response_model=List[schemas.Event])
+async def search_events(
+    query: schemas.EventSearchQuery = Depends(),
+    db: DBSession = Depends(get_read_db) # Read replica when REPLICA_DATABASE_URL is set
+):
     """
-    PUBLIC: Lists all currently active events for browsing.
+    PUBLIC: Full-text search over active events' name, location and description,
+    best match first. Every word must match; the last one also matches as a prefix (unless followed by a space),
+    so partial input works for search-as-you-type. Optional exact ?location= filter.
+    Pass the X-Next-Cursor response header back as ?cursor= to get the next page.
+    Only the SEARCH_MAX_CANDIDATES (default 1000) most recently created matches are ranked:
+    when a query matches more, every page carries X-Search-Truncated: true and older
+    matches are missing, however good. Add words or a location to narrow it.
     """
-    return crud.get_all_active_events(db=db)
+    event_ids = await run_db(db, search.search_event_ids, query)
+    truncated = await run_db(db, search.is_truncated, query)
+    # Bodies come from the catalog cache, like the list route's, checked against the live rows
+    validators = await run_db(db, crud.get_event_validators, event_ids, active_only=True)
+    page = await catalog.get_events(db, [event_id for event_id in event_ids if event_id in validators], validators)
+    headers = {}
+    cursor = search.next_cursor(len(event_ids), query)
+    if cursor:
+        headers["X-Next-Cursor"] = cursor
+    if truncated:
+        headers["X-Search-Truncated"] = "true"
+    return responses.FastJSONResponse(page, headers=headers)
 
 @router.get("/{event_id}", response_model=schemas.Event)
-def get_event(event_id: int, db: Session = Depends(get_db)):
+async def get_event(event_id: int, request: Request, db: DBSession = Depends(get_read_db)):
     """
     PUBLIC: Retrieves details for a specific event.
+    Supports If-None-Match / If-Modified-Since (304 while the event is unchanged).
+    """
+    validators = await run_db(db, crud.get_event_validators, [event_id])
+    if event_id not in validators:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+    modified = http_cache.last_modified(validators[event_id])
+    headers = http_cache.cache_headers(http_cache.entity_tag([event_id], validators), modified)
+    if http_cache.not_modified(request, headers["ETag"], modified):
+        return http_cache.not_modified_response(headers)
+
+    # Served from the catalog cache unless another worker's edit left it stale; the
+    # validators then follow the row that was read, and so do the headers
+    body = await catalog.get_event(db, event_id, validators)
+    headers = http_cache.cache_headers(http_cache.entity_tag([event_id], validators), http_cache.last_modified(validators[event_id]))
+    return responses.FastJSONResponse(body, headers=headers)
+
+@router.get(
+    "/{event_id}/availability",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}, "description": "Server-Sent Events stream"}},
+)
+async def stream_availability(event_id: int):
+    """
+    PUBLIC: Server-Sent Events stream of the event's available_tickets, for watching
+    an on-sale instead of polling the detail route. Sends the current value first,
+    then at most one `availability` event per AVAILABILITY_PUSH_INTERVAL_MS while
+    the stock keeps changing, and a keepalive comment when it does not. A `closed`
+    event ends the stream when the event is deleted or cancelled; 404 after that.
     """
-    # crud.get_event_by_id handles the 404 error if the event is not found.
-    return crud.get_event_by_id(db, event_id)
\ No newline at end of file
+    hub = availability.get_hub()
+    if hub.subscribers >= availability.AVAILABILITY_MAX_SUBSCRIBERS:
+        metrics.AVAILABILITY_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many availability streams on this server, try again shortly.",
+            headers={"Retry-After": str(max(1, availability.AVAILABILITY_RETRY_MS // 1000))},
+        )
+    # A short session of its own: a request-scoped one would stay open as long as the stream
+    stock = await run_in_session(crud.get_available_tickets, [event_id], active_only=True)
+    if event_id not in stock:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+    return StreamingResponse(
+        hub.stream(event_id, stock[event_id]),
+        media_type="text/event-stream",
+        # Never cached, and not buffered by nginx-style proxies
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
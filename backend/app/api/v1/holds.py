@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, status, Header
+from typing import List, Optional, Dict
+from app.database import get_db, run_db, DBSession
+from app import schemas, crud, admission, ratelimit
+from app.dependencies import user_id_required, user_required
+
+# 1. Define the API Router
+router = APIRouter(
+    prefix="/holds", 
+    tags=["Holds (Checkout)"]
+)
+
+@router.post(
+    "/",
+    response_model=schemas.Hold,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(ratelimit.user_rate_limited("booking"))], # Per-user and per-IP token buckets
+)
+async def create_hold(
+    hold: schemas.HoldCreate,
+    x_queue_token: Optional[str] = Header(None),
+    current_user: Dict = Depends(user_required),
+    owner_id: int = Depends(user_id_required), # Requires any authenticated user
+    db: DBSession = Depends(get_db)
+):
+    """
+    USER: Reserves tickets for checkout. The stock is taken immediately and
+    returned automatically if the hold is not confirmed before expires_at.
+    Goes through the waiting room like booking (ADMISSION_CONTROL_ENABLED): a hold
+    uses up the queue token, and confirming it needs none.
+    """
+    places = await admission.require_admission([hold.event_id], x_queue_token, current_user["username"])
+    async with admission.admitted(places, current_user["username"]):
+        return await run_db(db, crud.create_hold, owner_id=owner_id, event_id=hold.event_id, quantity=hold.quantity)
+
+@router.post(
+    "/{hold_id}/confirm",
+    response_model=List[schemas.Ticket],
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(ratelimit.user_rate_limited("booking"))], # Per-user and per-IP token buckets
+)
+async def confirm_hold(
+    hold_id: str,
+    owner_id: int = Depends(user_id_required), # Requires any authenticated user
+    db: DBSession = Depends(get_db)
+):
+    """
+    USER: Completes checkout, turning the hold into booked tickets.
+    409 if the hold already expired, was released or was confirmed before, or the event went off sale.
+    """
+    return await run_db(db, crud.confirm_hold, hold_id=hold_id, owner_id=owner_id)
+
+@router.delete("/{hold_id}", status_code=status.HTTP_200_OK)
+async def release_hold(
+    hold_id: str,
+    owner_id: int = Depends(user_id_required), # Requires any authenticated user
+    db: DBSession = Depends(get_db)
+):
+    """
+    USER: Abandons checkout and puts the held tickets back on sale.
+    """
+    return await run_db(db, crud.release_hold, hold_id=hold_id, owner_id=owner_id)
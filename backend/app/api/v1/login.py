@@ -1,22 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Header, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
 from datetime import timedelta
-from app.database import get_db
-from app import schemas, crud, auth
+from typing import Optional
+from app.database import get_db, run_db, DBSession
+from app import schemas, crud, auth, idempotency, metrics, ratelimit
 
 router = APIRouter(tags=["Authentication & Users"])
 
 # NOTE: The full path will be /v1/register (due to the prefix in main.py)
-@router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+@router.post(
+    "/register",
+    response_model=schemas.User,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(ratelimit.rate_limited("register"))], # Per-IP token bucket (429 + Retry-After)
+)
+async def register_user(
+    user: schemas.UserCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: DBSession = Depends(get_db)
+):
     """
     Endpoint for new user registration.
     Handles input validation via schemas.UserCreate and checks for duplicates via crud.
+    A retry with the same Idempotency-Key gets the original 201 instead of a 409.
     """
+    async def register():
+        # Check for duplicates before spending bcrypt time on the password
+        if await run_db(db, crud.get_user_by_username, username=user.username):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Username already registered"
+            )
+        # bcrypt runs on the bounded password pool (503 + Retry-After when saturated)
+        hashed_password = await auth.hash_password_async(user.password)
+        return await run_db(db, crud.create_user, user, hashed_password=hashed_password)
+
     try:
-        db_user = crud.create_user(db, user)
-        return db_user
+        # The password is left out of the fingerprint so it is never stored, even hashed
+        return await idempotency.run_idempotent(
+            db, "register", "", idempotency_key,
+            idempotency.request_hash(user.username, user.email), register, response_model=schemas.User,
+        )
     except HTTPException as e:
         # Re-raise exceptions caught in crud (e.g., 409 Conflict)
         raise e
@@ -28,17 +52,25 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 # NOTE: The full path will be /v1/login/token
-@router.post("/login/token", response_model=schemas.Token)
-def login_for_access_token(
+@router.post(
+    "/login/token",
+    response_model=schemas.Token,
+    dependencies=[Depends(ratelimit.login_rate_limited)], # Per-IP and per-username token buckets
+)
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), # FastAPI utility for form data
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_db)
 ):
     """
     Endpoint for user login. Authenticates credentials and returns a JWT token.
     """
-    user = crud.authenticate_user(db, username=form_data.username, password=form_data.password)
+    user = await run_db(db, crud.get_user_by_username, username=form_data.username)
+    # Password verification runs on the bounded password pool, not in the request thread
+    if user and not await auth.verify_password_async(form_data.password, user.hashed_password):
+        user = None
     
     if not user:
+        metrics.LOGINS_TOTAL.labels("failure").inc()
         # Standard security response for failed authentication
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,12 +78,15 @@ def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
         
+    metrics.LOGINS_TOTAL.labels("success").inc()
+
     # Set token expiration time
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    # Create the token, including the role in the payload
+    # Create the token, including the role and the user id in the payload
+    # ('uid' lets authenticated endpoints skip the username -> id lookup)
     access_token = auth.create_access_token(
-        data={"sub": user.username, "role": user.role},
+        data={"sub": user.username, "role": user.role, "uid": user.id},
         expires_delta=access_token_expires
     )
     
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, status, Header
+from typing import Dict
+from app import schemas, admission
+from app.dependencies import user_required
+
+# 1. Define the API Router
+router = APIRouter(
+    prefix="/queue", 
+    tags=["Waiting Room"]
+)
+
+@router.post("/{event_id}/join", response_model=schemas.QueueStatus, status_code=status.HTTP_201_CREATED)
+async def join_queue(
+    event_id: int,
+    current_user: Dict = Depends(user_required) # Requires any authenticated user
+):
+    """
+    USER: Takes the next place in the event's waiting room, or returns the caller's
+    current place if they already hold one. The returned token is bound to the caller,
+    must be sent as X-Queue-Token when booking, and is used up by one booking.
+    Never touches the database.
+    """
+    return await admission.join(event_id, current_user["username"])
+
+@router.get("/{event_id}/position", response_model=schemas.QueueStatus)
+async def queue_position(
+    event_id: int,
+    x_queue_token: str = Header(...),
+    current_user: Dict = Depends(user_required) # Requires any authenticated user
+):
+    """
+    USER: Cheap polling endpoint: current position and whether booking is open for this token.
+    Never touches the database.
+    """
+    return await admission.position(event_id, x_queue_token, current_user["username"])
@@ -1,9 +1,8 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app import schemas, crud
-from app.dependencies import user_required
+from fastapi import APIRouter, Depends, status, Header
+from typing import List, Optional, Dict
+from app.database import get_db, get_read_db, run_db, DBSession
+from app import schemas, crud, admission, batcher, idempotency, ratelimit, responses
+from app.dependencies import user_id_required, user_required
 
 # 1. Define the API Router
 router = APIRouter(
@@ -11,47 +10,133 @@ router = APIRouter(
     tags=["Tickets (User Actions)"]
 )
 
-@router.post("/book/{event_id}", response_model=schemas.Ticket, status_code=status.HTTP_201_CREATED)
-def book_ticket(
+@router.post(
+    "/book/{event_id}",
+    response_model=schemas.Ticket,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(ratelimit.user_rate_limited("booking"))], # Per-user and per-IP token buckets
+)
+async def book_ticket(
     event_id: int,
-    user_details: dict = Depends(user_required), # Requires any authenticated user
-    db: Session = Depends(get_db)
+    x_queue_token: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user: Dict = Depends(user_required),
+    owner_id: int = Depends(user_id_required), # Requires any authenticated user
+    db: DBSession = Depends(get_db)
 ):
     """
     USER: Books one ticket for a specified event. 
     Implements the critical atomic check for available tickets.
+    Retries carrying the same Idempotency-Key get the first response back instead of a second ticket.
+    With the waiting room enabled (ADMISSION_CONTROL_ENABLED), X-Queue-Token must hold
+    the caller's admitted token for the event; a successful booking uses it up.
     """
-    # 1. Get the owner's ID (You need to fetch the full user object to get the ID)
-    # NOTE: Since we don't have the user ID in the token payload yet (only username), 
-    # we need to look up the ID from the DB.
-    
-    # In a production setup, the JWT payload should contain the user ID (e.g., 'uid') 
-    # to avoid this extra DB call. For simplicity here:
-    owner = crud.get_user_by_username(db, username=user_details["username"])
-    if not owner:
-        # Should not happen if token is valid, but good practice to check
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        
-    owner_id = owner.id
-    
+    # 1. The owner's ID comes from the token's 'uid' claim (no user lookup)
+
     # 2. Call the atomic booking logic
     # This function handles the sold-out check (409 Conflict) and integrity update.
-    return crud.user_book_ticket(db=db, event_id=event_id, owner_id=owner_id)
+    # Waiting room places, checked once before the key is used (retries are checked again,
+    # replays of a booking that already used its token skip the check)
+    places: Dict[int, admission.Member] = {}
+
+    async def admit():
+        places.update(await admission.require_admission([event_id], x_queue_token, current_user["username"]))
+
+    async def book():
+        async with admission.admitted(places, current_user["username"]):
+            if batcher.BOOKING_PIPELINE_ENABLED:
+                # Write-behind mode: committed together with the other bookings of the same few milliseconds
+                return (await batcher.book_tickets(event_id=event_id, owner_id=owner_id))[0]
+            return await run_db(db, crud.user_book_ticket, event_id=event_id, owner_id=owner_id)
+
+    return await idempotency.run_idempotent(
+        db, "tickets.book", str(owner_id), idempotency_key,
+        idempotency.request_hash(event_id), book, response_model=schemas.Ticket, precondition=admit,
+    )
+
+@router.post(
+    "/book",
+    response_model=List[schemas.Ticket],
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(ratelimit.user_rate_limited("booking"))], # Per-user and per-IP token buckets
+)
+async def book_tickets_bulk(
+    booking: schemas.BookingRequest,
+    x_queue_token: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user: Dict = Depends(user_required),
+    owner_id: int = Depends(user_id_required), # Requires any authenticated user
+    db: DBSession = Depends(get_db)
+):
+    """
+    USER: Books several tickets in one request, for one event (quantity) or a basket
+    across events. All-or-nothing: if any event cannot cover its quantity (409) or
+    does not exist (404), nothing is booked. With the waiting room enabled,
+    X-Queue-Token must hold an admitted token for every event (comma-separated),
+    all used up by a successful booking.
+    Supports Idempotency-Key like the single-ticket endpoint.
+    """
+    # Merge repeated lines for the same event into one quantity
+    items = {}
+    for item in booking.items:
+        items[item.event_id] = items.get(item.event_id, 0) + item.quantity
+
+    places: Dict[int, admission.Member] = {}
+
+    async def admit():
+        places.update(await admission.require_admission(items, x_queue_token, current_user["username"]))
+
+    async def book():
+        async with admission.admitted(places, current_user["username"]):
+            return await run_db(db, crud.book_basket, owner_id=owner_id, items=items)
+
+    return await idempotency.run_idempotent(
+        db, "tickets.book_bulk", str(owner_id), idempotency_key,
+        idempotency.request_hash(sorted(items.items())), book, response_model=List[schemas.Ticket],
+        precondition=admit,
+    )
+
+@router.post("/cancel", response_model=schemas.TicketCancelResult)
+async def cancel_tickets_bulk(
+    cancellation: schemas.TicketCancelRequest,
+    owner_id: int = Depends(user_id_required), # Requires any authenticated user
+    db: DBSession = Depends(get_db)
+):
+    """
+    USER: Cancels several of the caller's tickets and puts them back on sale, in one transaction.
+    Tickets that are not the caller's or no longer booked are left alone and listed in not_cancelled.
+    """
+    cancelled = await run_db(db, crud.cancel_tickets, owner_id=owner_id, ticket_ids=cancellation.ticket_ids)
+    not_cancelled = sorted(set(cancellation.ticket_ids) - set(cancelled))
+    return schemas.TicketCancelResult(cancelled=cancelled, not_cancelled=not_cancelled)
+
+@router.post("/{ticket_id}/cancel", response_model=schemas.Ticket)
+async def cancel_ticket(
+    ticket_id: int,
+    owner_id: int = Depends(user_id_required), # Requires any authenticated user
+    db: DBSession = Depends(get_db)
+):
+    """
+    USER: Cancels one of the caller's tickets and puts it back on sale.
+    404 if the ticket is not the caller's, 409 if it was already cancelled.
+    """
+    return await run_db(db, crud.cancel_ticket, ticket_id=ticket_id, owner_id=owner_id)
 
 @router.get("/", response_model=List[schemas.Ticket])
-def list_user_tickets(
-    user_details: dict = Depends(user_required), # Requires any authenticated user
-    db: Session = Depends(get_db)
+async def list_user_tickets(
+    query: schemas.TicketQuery = Depends(),
+    owner_id: int = Depends(user_id_required), # Requires any authenticated user
+    db: DBSession = Depends(get_read_db)
 ):
     """
-    USER: Retrieves a list of all tickets owned by the current authenticated user.
-    """
-    # Get the owner's ID (same lookup as above)
-    owner = crud.get_user_by_username(db, username=user_details["username"])
-    if not owner:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        
-    owner_id = owner.id
-    
-    # Retrieve tickets from CRUD
-    return crud.get_user_tickets(db=db, owner_id=owner_id)
\ No newline at end of file
+    USER: Retrieves the tickets owned by the current authenticated user, newest first.
+    Optional ?status= filter; pass the X-Next-Cursor response header back as ?cursor=
+    to get the next page. Served by the read replica when one is configured, so a
+    ticket booked a moment ago may take the replication lag to show up.
+    """
+    # Rows come back already shaped like schemas.Ticket, so they skip response_model validation
+    tickets = await run_db(db, crud.get_user_ticket_rows, owner_id=owner_id, query=query)
+    headers = {}
+    if len(tickets) == query.limit:
+        headers["X-Next-Cursor"] = crud.encode_cursor(tickets[-1]["booking_date"], tickets[-1]["id"])
+    return responses.FastJSONResponse(tickets, headers=headers)
@@ -1,10 +1,14 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Callable, Tuple
 from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
+from concurrent.futures import ProcessPoolExecutor
+from app import metrics
+import asyncio
+import time
 import os
 
 # Load environment variables
@@ -15,6 +19,12 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-fallback-secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
+# bcrypt runs in a dedicated process pool so login storms cannot starve other endpoints
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", max((os.cpu_count() or 2) - 1, 1)))
+# Jobs allowed in flight (running + queued) before /login/token and /register answer 503
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", PASSWORD_POOL_WORKERS * 8))
+PASSWORD_POOL_RETRY_AFTER = int(os.getenv("PASSWORD_POOL_RETRY_AFTER", 1))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # This object defines the dependency for extracting the token from the request header 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/login/token")
@@ -29,6 +39,69 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain text password against a hashed one."""
     return pwd_context.verify(plain_password, hashed_password)
 
+# --- Password Hashing Pool (async, bounded) ---
+
+_password_pool: Optional[ProcessPoolExecutor] = None
+# Only touched from the event loop thread, so a plain int is enough
+_password_jobs_pending = 0
+
+def _timed(fn: Callable, *args) -> Tuple[object, float]:
+    """Runs in the pool worker: returns the result plus the pure bcrypt time."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+def _get_password_pool() -> ProcessPoolExecutor:
+    global _password_pool
+    if _password_pool is None:
+        _password_pool = ProcessPoolExecutor(max_workers=PASSWORD_POOL_WORKERS)
+    return _password_pool
+
+async def _run_password_job(operation: str, fn: Callable, *args):
+    """Submits bcrypt work to the pool, shedding load with 503 once the queue is full."""
+    global _password_jobs_pending
+    if _password_jobs_pending >= PASSWORD_POOL_MAX_PENDING:
+        metrics.PASSWORD_POOL_REJECTED.labels(operation).inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry shortly.",
+            headers={"Retry-After": str(PASSWORD_POOL_RETRY_AFTER)},
+        )
+
+    _password_jobs_pending += 1
+    metrics.PASSWORD_QUEUE_DEPTH.set(_password_jobs_pending)
+    submitted = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        result, hash_seconds = await loop.run_in_executor(_get_password_pool(), _timed, fn, *args)
+    finally:
+        _password_jobs_pending -= 1
+        metrics.PASSWORD_QUEUE_DEPTH.set(_password_jobs_pending)
+
+    metrics.PASSWORD_HASH_SECONDS.labels(operation).observe(hash_seconds)
+    metrics.PASSWORD_QUEUE_WAIT_SECONDS.labels(operation).observe(max(time.perf_counter() - submitted - hash_seconds, 0.0))
+    return result
+
+async def hash_password_async(password: str) -> str:
+    """Hashes a password on the password pool without blocking the event loop."""
+    return await _run_password_job("hash", hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifies a password on the password pool without blocking the event loop."""
+    return await _run_password_job("verify", verify_password, plain_password, hashed_password)
+
+async def start_password_pool() -> None:
+    """Starts every pool process now, instead of one by one under the first logins."""
+    loop = asyncio.get_running_loop()
+    pool = _get_password_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(PASSWORD_POOL_WORKERS)))
+
+def shutdown_password_pool() -> None:
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(wait=False, cancel_futures=True)
+        _password_pool = None
+
 # --- JWT Token Management ---
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -0,0 +1,298 @@
+from dotenv import load_dotenv
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+from app import cache, crud, metrics
+from app.database import run_in_session
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Live stock over Server-Sent Events (GET /v1/events/{event_id}/availability).
+# Subscribers get at most one message per event per interval, however many bookings commit
+AVAILABILITY_PUSH_INTERVAL_MS = float(os.getenv("AVAILABILITY_PUSH_INTERVAL_MS", 500))
+# memory: only this worker's bookings are pushed; redis: workers exchange changes over REDIS_URL
+AVAILABILITY_BROKER = os.getenv("AVAILABILITY_BROKER", "memory").lower()
+AVAILABILITY_CHANNEL = os.getenv("AVAILABILITY_CHANNEL", "availability")
+# Idle streams get a keepalive this often; every watched event is re-read at the same time,
+# which also repairs changes lost by Redis pub/sub (at-most-once delivery)
+AVAILABILITY_HEARTBEAT_SECONDS = float(os.getenv("AVAILABILITY_HEARTBEAT_SECONDS", 15))
+# Streams per worker; further subscribers get 503 + Retry-After
+AVAILABILITY_MAX_SUBSCRIBERS = int(os.getenv("AVAILABILITY_MAX_SUBSCRIBERS", 10000))
+# Reconnect delay suggested to EventSource clients (SSE retry field)
+AVAILABILITY_RETRY_MS = int(os.getenv("AVAILABILITY_RETRY_MS", 3000))
+
+
+def _frame(event: str, data: str, retry: Optional[int] = None) -> bytes:
+    """One server-sent event; data is one line of JSON, so it needs no splitting."""
+    frame = f"event: {event}\ndata: {data}\n"
+    if retry is not None:
+        frame += f"retry: {retry}\n"
+    return (frame + "\n").encode()
+
+_KEEPALIVE = b": keepalive\n\n"
+
+
+def _message(event_id: int, available: int, retry: Optional[int] = None) -> bytes:
+    data = json.dumps({"event_id": event_id, "available_tickets": available})
+    return _frame("availability", data, retry)
+
+def _closed_message(event_id: int) -> bytes:
+    return _frame("closed", json.dumps({"event_id": event_id}))
+
+
+class _Channel:
+    """One event's latest message on this worker, shared by all of its subscribers."""
+    __slots__ = ("available", "message", "seq", "changed", "subscribers", "closed")
+
+    def __init__(self):
+        self.available: Optional[int] = None
+        self.message: Optional[bytes] = None
+        self.seq = 0
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.closed = False
+
+    def push(self, event_id: int, available: int) -> None:
+        self.available = available
+        self.message = _message(event_id, available)
+        self.seq += 1
+        self.wake()
+
+    def close(self, event_id: int) -> None:
+        """The event was deleted or cancelled: subscribers send a final `closed` message and end."""
+        self.closed = True
+        self.message = _closed_message(event_id)
+        self.seq += 1
+        self.wake()
+
+    def wake(self) -> None:
+        # Every waiting subscriber wakes once; later waits go to the fresh Event
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+# --- Brokers ---
+# A broker carries each worker's batch of changed event ids to every worker's hub (itself included).
+
+class InProcessBroker:
+    """
+    Pub/sub inside one process: every attached hub receives every batch. The
+    default for a single worker, and the Redis stand-in for tests that run
+    several hubs (simulated workers) in one process.
+    """
+
+    def __init__(self):
+        self._hubs: List["AvailabilityHub"] = []
+
+    def attach(self, hub: "AvailabilityHub") -> None:
+        self._hubs.append(hub)
+
+    async def publish(self, event_ids: List[int]) -> None:
+        for hub in self._hubs:
+            hub.receive(event_ids)
+
+    async def close(self) -> None:
+        self._hubs.clear()
+
+
+class RedisBroker:
+    """Pub/sub over one Redis channel, for several worker processes. REDIS_URL=fakeredis:// works in-process."""
+
+    def __init__(self, url: str, channel: str = AVAILABILITY_CHANNEL):
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            self._client = fakeredis.aioredis.FakeRedis()
+        else:
+            import redis.asyncio
+            self._client = redis.asyncio.Redis.from_url(url)
+        self.channel = channel
+        self._listener: Optional[asyncio.Task] = None
+
+    def attach(self, hub: "AvailabilityHub") -> None:
+        self._listener = asyncio.create_task(self._listen(hub))
+
+    async def _listen(self, hub: "AvailabilityHub") -> None:
+        while True:
+            try:
+                pubsub = self._client.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        hub.receive(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Changes sent meanwhile are lost; the next heartbeat re-reads the watched events
+                logger.exception("Availability subscription to Redis failed, reconnecting")
+                await asyncio.sleep(1)
+
+    async def publish(self, event_ids: List[int]) -> None:
+        await self._client.publish(self.channel, json.dumps(event_ids))
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        await self._client.aclose()
+
+
+# --- Hub ---
+
+async def _read_stock(event_ids: List[int]) -> Dict[int, int]:
+    # Events no longer on sale are left out, which closes their channels
+    return await run_in_session(crud.get_available_tickets, event_ids, active_only=True)
+
+
+class AvailabilityHub:
+    """
+    Per-worker fan-out of stock changes to SSE subscribers.
+
+    publish() may be called from any thread (crud runs in the threadpool) and only
+    marks the event as changed. Every interval the hub sends the changed ids to the
+    broker as one batch, then reads the current stock of the changed events that
+    have subscribers here in one query and pushes the values that moved, or closes
+    the channels of events that are no longer on sale. Values are
+    read after the commits that announced them, so streams end on the committed
+    stock however the workers' batches interleave, and a subscriber gets at most
+    one message per event per interval however many bookings happened.
+
+    Subscribers hold no queue of their own: they wait on their event's channel and
+    read its latest message, so an idle stream costs one suspended generator.
+    """
+
+    def __init__(
+        self,
+        broker,
+        interval_ms: float = AVAILABILITY_PUSH_INTERVAL_MS,
+        heartbeat_seconds: float = AVAILABILITY_HEARTBEAT_SECONDS,
+        read_stock: Callable[[List[int]], Awaitable[Dict[int, int]]] = _read_stock,
+    ):
+        self.broker = broker
+        self.interval = interval_ms / 1000
+        self.heartbeat = heartbeat_seconds
+        self.read_stock = read_stock
+        self.subscribers = 0
+        self._lock = threading.Lock()
+        self._outgoing: Set[int] = set()
+        self._incoming: Set[int] = set()
+        self._channels: Dict[int, _Channel] = {}
+        self._last_heartbeat = time.monotonic()
+
+    def publish(self, event_id: int) -> None:
+        """Marks the event's stock as changed (thread-safe); announced with the next interval's batch."""
+        with self._lock:
+            self._outgoing.add(event_id)
+
+    def receive(self, event_ids: List[int]) -> None:
+        """Called by the broker with another worker's (or this one's) batch."""
+        self._incoming.update(event_ids)
+
+    async def tick(self) -> None:
+        """One interval: announce local changes, then refresh the channels of every changed event."""
+        with self._lock:
+            outgoing, self._outgoing = self._outgoing, set()
+        if outgoing:
+            await self.broker.publish(sorted(outgoing))
+
+        incoming, self._incoming = self._incoming, set()
+        now = time.monotonic()
+        heartbeat = now - self._last_heartbeat >= self.heartbeat
+        if heartbeat:
+            self._last_heartbeat = now
+        watched = list(self._channels) if heartbeat else [event_id for event_id in incoming if event_id in self._channels]
+        if watched:
+            delivered = 0
+            stock = await self.read_stock(watched)
+            for event_id in watched:
+                channel = self._channels.get(event_id)
+                if channel is None:
+                    continue
+                if event_id not in stock:
+                    # Deleted or cancelled: later subscribers get a 404 from the route
+                    del self._channels[event_id]
+                    channel.close(event_id)
+                    delivered += channel.subscribers
+                elif channel.available != stock[event_id]:
+                    channel.push(event_id, stock[event_id])
+                    delivered += channel.subscribers
+            if delivered:
+                metrics.AVAILABILITY_MESSAGES.inc(delivered)
+        if heartbeat:
+            # Channels without news wake too: their subscribers send a keepalive comment
+            for channel in list(self._channels.values()):
+                channel.wake()
+
+    async def run(self) -> None:
+        """Background loop started with the app."""
+        self.broker.attach(self)
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.tick()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Availability push failed")
+        finally:
+            await self.broker.close()
+
+    async def stream(self, event_id: int, available: int) -> AsyncIterator[bytes]:
+        """
+        SSE body for one subscriber: `available` (read by the caller) first, then each
+        coalesced change, until a `closed` message when the event goes off sale.
+        """
+        channel = self._channels.get(event_id)
+        if channel is None:
+            channel = self._channels[event_id] = _Channel()
+            channel.available = available
+        channel.subscribers += 1
+        self.subscribers += 1
+        metrics.AVAILABILITY_SUBSCRIBERS.inc()
+        try:
+            seen = channel.seq
+            yield _message(event_id, available, retry=AVAILABILITY_RETRY_MS)
+            while True:
+                if channel.seq == seen:
+                    await channel.changed.wait()
+                    if channel.seq == seen:
+                        yield _KEEPALIVE
+                        continue
+                # Only the latest message: updates that piled up while sending are skipped
+                seen = channel.seq
+                yield channel.message
+                if channel.closed:
+                    return
+        finally:
+            channel.subscribers -= 1
+            self.subscribers -= 1
+            metrics.AVAILABILITY_SUBSCRIBERS.dec()
+            if channel.subscribers == 0 and self._channels.get(event_id) is channel:
+                del self._channels[event_id]
+
+
+_hub: Optional[AvailabilityHub] = None
+
+def get_hub() -> AvailabilityHub:
+    global _hub
+    if _hub is None:
+        if AVAILABILITY_BROKER == "redis":
+            broker = RedisBroker(cache.REDIS_URL)
+        else:
+            broker = InProcessBroker()
+        _hub = AvailabilityHub(broker)
+    return _hub
+
+def publish(event_id: int) -> None:
+    """Called by crud after a commit changed an event's stock. A no-op outside the API process."""
+    if _hub is not None:
+        _hub.publish(event_id)
+
+async def run_hub() -> None:
+    await get_hub().run()
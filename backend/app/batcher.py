@@ -0,0 +1,99 @@
+from dotenv import load_dotenv
+from typing import List, Optional, Tuple
+from app import crud, models
+from app.database import run_in_session
+import asyncio
+import os
+
+load_dotenv()
+
+# Write-behind booking: queue single bookings and commit them in groups (one fsync per batch)
+BOOKING_PIPELINE_ENABLED = os.getenv("BOOKING_PIPELINE_ENABLED", "false").lower() == "true"
+# How long the first request of a batch waits for company, and the batch size that flushes early
+BOOKING_BATCH_WINDOW_MS = float(os.getenv("BOOKING_BATCH_WINDOW_MS", 5))
+BOOKING_BATCH_MAX = int(os.getenv("BOOKING_BATCH_MAX", 200))
+
+
+class BookingBatcher:
+    """
+    Per-process group commit for bookings.
+
+    Requests are queued with their own future. A batch is flushed when the window
+    elapses or it reaches max_batch requests, and runs as a single crud.book_batch
+    transaction. Only one batch is in flight at a time: while it commits, the next
+    one keeps filling, so batches grow on their own when the database is the bottleneck.
+    """
+
+    def __init__(self, window_ms: float = BOOKING_BATCH_WINDOW_MS, max_batch: int = BOOKING_BATCH_MAX):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[Tuple[int, int, int], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._commit_lock = asyncio.Lock()
+        self._tasks = set()
+
+    async def submit(self, event_id: int, owner_id: int, quantity: int = 1) -> List[models.Ticket]:
+        """Queues one booking and waits for its batch; raises the same 404/409 as crud.book_tickets."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((event_id, owner_id, quantity), future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._commit(batch))
+        # Keep a reference until the task is done so it is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _commit(self, batch: List[Tuple[Tuple[int, int, int], asyncio.Future]]) -> None:
+        async with self._commit_lock:
+            try:
+                results = await run_in_session(crud.book_batch, [request for request, _ in batch])
+            except Exception as e:
+                # The whole transaction failed: every caller gets the error, as it would have alone
+                results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():  # Caller went away (client disconnect cancels the await)
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def drain(self) -> None:
+        """Flushes the open batch and waits for every batch in flight (shutdown)."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+_batcher: Optional[BookingBatcher] = None
+
+
+def get_batcher() -> BookingBatcher:
+    """Returns the process-wide batcher, created on first use inside the running event loop."""
+    global _batcher
+    if _batcher is None:
+        _batcher = BookingBatcher()
+    return _batcher
+
+
+async def book_tickets(event_id: int, owner_id: int, quantity: int = 1) -> List[models.Ticket]:
+    """Books through the pipeline; same results and errors as crud.book_tickets."""
+    return await get_batcher().submit(event_id, owner_id, quantity)
+
+
+async def shutdown_batcher() -> None:
+    """Commits whatever is still queued before the worker exits."""
+    if _batcher is not None:
+        await _batcher.drain()
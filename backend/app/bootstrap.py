@@ -0,0 +1,122 @@
+from dotenv import load_dotenv
+from sqlalchemy import exc
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Dict
+from app import auth, catalog, schemas, crud, search
+from app.database import (
+    engine, replica_engine, async_engine, async_replica_engine, Base, SessionLocal, ReadSessionLocal, DB_POOL_SIZE,
+)
+from app.models import User
+import os
+import time
+
+load_dotenv()
+
+# --- Configuration ---
+# Schema setup and the first admin account. By default every worker runs them as it
+# starts, which suits a single process. With many workers, run them once per deploy:
+#   python -m app.bootstrap
+# and start the workers with BOOTSTRAP_ON_STARTUP=false, so they run no DDL at all.
+BOOTSTRAP_ON_STARTUP = os.getenv("BOOTSTRAP_ON_STARTUP", "true").lower() == "true"
+# Before serving, open DB_POOL_SIZE connections per engine, start the password pool's
+# processes and load the first catalog page, instead of making the first requests wait
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+
+
+# --- Bootstrap ---
+
+def create_db_and_tables():
+    Base.metadata.create_all(bind=engine)
+    # The full-text index is dialect-specific DDL outside the models
+    with engine.begin() as connection:
+        search.install_search_index(connection)
+        # Where the sales rollups start counting (older tickets: python -m app.rollups)
+        crud.install_sales_rollups(connection)
+
+def create_initial_admin(db: Session):
+    # Check if any user exists
+    if db.query(User).count() == 0:
+        # NOTE: The password must be 6+ characters to pass schema validation
+        # The email is REQUIRED by the database model (NotNullConstraint)
+        print("--- Creating initial Admin user (username: admin, password: admin123, email: admin@example.com) ---")
+        try:
+            admin_data = schemas.UserCreate(
+                username="admin",
+                password="admin123",
+                email="admin@example.com"
+            )
+            crud.create_user(db, admin_data, is_admin=True)
+        except exc.IntegrityError:
+            # Another process starting at the same time created it first
+            db.rollback()
+        except Exception as e:
+            print(f"Failed to create initial admin: {e}")
+
+def bootstrap() -> None:
+    """Tables, indexes, the full-text index, the sales rollup state and the first admin. Safe to run again: existing objects are kept."""
+    create_db_and_tables()
+    db = SessionLocal()
+    try:
+        create_initial_admin(db)
+    finally:
+        db.close()
+
+
+# --- Worker Warm-up ---
+
+def _fill_pool(db_engine) -> None:
+    """Opens DB_POOL_SIZE connections at once; closing them parks them in the pool."""
+    connections = []
+    try:
+        for _ in range(DB_POOL_SIZE):
+            connections.append(db_engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+
+async def _fill_async_pool(db_engine) -> None:
+    connections = []
+    try:
+        for _ in range(DB_POOL_SIZE):
+            connections.append(await db_engine.connect())
+    finally:
+        for connection in connections:
+            await connection.close()
+
+async def _load_catalog() -> None:
+    db = ReadSessionLocal()
+    try:
+        await catalog.get_active_events(db, schemas.EventQuery())
+    finally:
+        db.close()
+
+async def warm_up() -> Dict[str, float]:
+    """Pays this worker's first-request costs up front; returns the seconds each step took."""
+    timings = {}
+    started = time.perf_counter()
+    # The pools requests check out from in this DB_MODE
+    if async_engine is not None:
+        for db_engine in {async_engine, async_replica_engine}:
+            await _fill_async_pool(db_engine)
+    else:
+        for db_engine in {engine, replica_engine}:
+            await run_in_threadpool(_fill_pool, db_engine)
+    timings["db_pools"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await auth.start_password_pool()
+    timings["password_pool"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await _load_catalog()
+    timings["catalog"] = time.perf_counter() - started
+    return timings
+
+
+if __name__ == "__main__":
+    # One-shot schema setup before starting workers with BOOTSTRAP_ON_STARTUP=false:
+    #   python -m app.bootstrap
+    started = time.perf_counter()
+    bootstrap()
+    print(f"Bootstrap complete in {time.perf_counter() - started:.2f}s")
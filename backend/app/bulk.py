@@ -0,0 +1,215 @@
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, List, Optional, Tuple
+from app import cache, crud, models, responses, schemas
+from app.database import AsyncReadSessionLocal, ReadSessionLocal, DBSession, run_db
+import codecs
+import csv
+import io
+import json
+import os
+
+load_dotenv()
+
+# Admin bulk endpoints: event import (POST /v1/events/import) and attendee export
+# (GET /v1/events/{event_id}/attendees). Both stream, so memory holds one batch of
+# rows whatever the size of the file.
+
+# Rows per multi-row INSERT during an import; every batch commits on its own
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", 1000))
+# Rejected rows listed in the import result; further ones are only counted
+BULK_IMPORT_MAX_ERRORS = int(os.getenv("BULK_IMPORT_MAX_ERRORS", 1000))
+# Longest accepted row (characters); a body without line breaks is refused instead of buffered
+BULK_IMPORT_MAX_ROW_LENGTH = int(os.getenv("BULK_IMPORT_MAX_ROW_LENGTH", 65536))
+# Rows fetched per round trip of the export's server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+# Content-Type of the upload -> format
+IMPORT_FORMATS = {"text/csv": "csv", "application/x-ndjson": "ndjson", "application/jsonl": "ndjson"}
+EXPORT_COLUMNS = ["ticket_id", "status", "booking_date", "user_id", "username", "email"]
+
+
+def _row_too_long(line: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"Row at line {line} is longer than {BULK_IMPORT_MAX_ROW_LENGTH} characters"
+    )
+
+
+# --- Import ---
+# Parsers yield (line, fields, errors): fields for schemas.EventCreate, or the reasons the row was rejected.
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Splits the streamed body into lines (line breaks kept), decoding UTF-8 incrementally."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()  # Spreadsheet exports often start with a BOM
+    pending = ""
+    count = 0
+    try:
+        async for chunk in chunks:
+            *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+            for line in lines:
+                count += 1
+                yield line + "\n"
+            if len(pending) > BULK_IMPORT_MAX_ROW_LENGTH:
+                raise _row_too_long(count + 1)
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload is not valid UTF-8"
+        )
+    if pending:
+        yield pending
+
+async def _ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[dict], List[str]]]:
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except ValueError as exc:
+            yield line_no, None, [f"Invalid JSON: {exc}"]
+            continue
+        if not isinstance(fields, dict):
+            yield line_no, None, ["Expected a JSON object"]
+            continue
+        yield line_no, fields, []
+
+async def _csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[dict], List[str]]]:
+    """First row is the header (EventCreate field names); empty cells count as missing."""
+    header = None
+    record = ""
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        record += line
+        # An odd number of quotes means a quoted field (with a line break in it) is still open
+        if record.count('"') % 2:
+            if len(record) > BULK_IMPORT_MAX_ROW_LENGTH:
+                raise _row_too_long(line_no)
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as exc:
+            yield line_no, None, [f"Invalid CSV: {exc}"]
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+        elif len(values) != len(header):
+            yield line_no, None, [f"Expected {len(header)} fields, got {len(values)}"]
+        else:
+            yield line_no, {name: value for name, value in zip(header, values) if value != ""}, []
+    if record.strip():
+        yield line_no, None, ["Unterminated quoted field"]
+
+async def import_events(db: DBSession, chunks: AsyncIterator[bytes], format: str) -> schemas.EventImportResult:
+    """
+    Validates every row against schemas.EventCreate and inserts the valid ones
+    through crud.admin_import_events, BULK_IMPORT_BATCH_SIZE at a time.
+    """
+    rows = _csv_rows(_lines(chunks)) if format == "csv" else _ndjson_rows(_lines(chunks))
+    result = schemas.EventImportResult(imported=0, failed=0, errors=[])
+    batch: List[schemas.EventCreate] = []
+
+    async def flush():
+        result.imported += len(await run_db(db, crud.admin_import_events, batch))
+        await cache.run(cache.invalidate_catalog)
+        batch.clear()
+
+    try:
+        async for line, fields, errors in rows:
+            if not errors:
+                try:
+                    batch.append(schemas.EventCreate.model_validate(fields))
+                except ValidationError as exc:
+                    errors = [f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors()]
+            if errors:
+                result.failed += 1
+                if len(result.errors) < BULK_IMPORT_MAX_ERRORS:
+                    result.errors.append(schemas.EventImportError(line=line, errors=errors))
+                else:
+                    result.errors_truncated = True
+            elif len(batch) >= BULK_IMPORT_BATCH_SIZE:
+                await flush()
+        if batch:
+            await flush()
+    except HTTPException as exc:
+        # Earlier batches are committed: say how far the upload got
+        exc.detail = f"{exc.detail} ({result.imported} events were imported before it)"
+        raise
+    return result
+
+
+# --- Export ---
+
+def _attendees_statement(event_id: int, query: schemas.AttendeeExportQuery):
+    statement = (
+        select(
+            models.Ticket.id.label("ticket_id"),
+            models.Ticket.status,
+            models.Ticket.booking_date,
+            models.User.id.label("user_id"),
+            models.User.username,
+            models.User.email,
+        )
+        .join(models.User, models.User.id == models.Ticket.owner_id)
+        .where(models.Ticket.event_id == event_id)
+        .order_by(models.Ticket.id)
+    )
+    if query.status is not None:
+        statement = statement.where(models.Ticket.status == query.status)
+    # yield_per: server-side cursor (stream_results), rows arrive EXPORT_BATCH_SIZE at a time
+    return statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+async def _attendee_batches(event_id: int, query: schemas.AttendeeExportQuery) -> AsyncIterator[list]:
+    """
+    Export rows in batches, read from the replica in a session of the export's own:
+    the stream outlives the request's get_db session.
+    """
+    statement = _attendees_statement(event_id, query)
+    if AsyncReadSessionLocal is not None:
+        async with AsyncReadSessionLocal() as db:
+            result = await db.stream(statement)
+            async for rows in result.partitions():
+                yield rows
+        return
+
+    db = ReadSessionLocal()
+    try:
+        # Blocking fetches go to the threadpool one batch at a time
+        partitions = (await run_in_threadpool(db.execute, statement)).partitions()
+        while (rows := await run_in_threadpool(next, partitions, None)) is not None:
+            yield rows
+    finally:
+        db.close()
+
+def _csv_cell(value) -> str:
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    value = str(value)
+    # Usernames and emails are user input: keep spreadsheets from evaluating them as formulas
+    if value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+async def export_attendees(event_id: int, query: schemas.AttendeeExportQuery) -> AsyncIterator[bytes]:
+    """Body of the attendee export: one chunk per batch of rows, as CSV (with header) or NDJSON."""
+    if query.format == "csv":
+        yield (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+    async for rows in _attendee_batches(event_id, query):
+        if query.format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([_csv_cell(value) for value in row] for row in rows)
+            yield buffer.getvalue().encode()
+        else:
+            yield b"".join(responses.dumps(row._asdict()) + b"\n" for row in rows)
@@ -0,0 +1,212 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+import threading
+import time
+import sys
+import os
+
+load_dotenv()
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache whose entries also expire after `ttl` seconds.
+    Safe to share between the event loop and threadpool workers.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# --- Pluggable Cache Backends ---
+# Values are JSON strings so every backend stores the same thing. Backends are
+# synchronous; `blocking` ones do network I/O and are called off the event loop (run()).
+
+class NullBackend:
+    """Caching disabled: every read misses."""
+    blocking = False
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return [None] * len(keys)
+
+    def set_many(self, mapping: Dict[str, str], ttl: float) -> None:
+        pass
+
+    def delete(self, *keys: str) -> None:
+        pass
+
+    def incr(self, key: str) -> int:
+        return 0
+
+
+class InMemoryBackend:
+    """Per-process TTL/LRU backend (each worker has its own copy)."""
+    blocking = False
+
+    def __init__(self, maxsize: int):
+        # The per-entry TTL passed to set_many always overrides this default
+        self._entries = TTLCache(maxsize=maxsize, ttl=60)
+        # Counters never expire or get evicted
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return [
+            str(self._counters[key]) if key in self._counters else self._entries.get(key)
+            for key in keys
+        ]
+
+    def set_many(self, mapping: Dict[str, str], ttl: float) -> None:
+        for key, value in mapping.items():
+            self._entries.set(key, value, ttl=ttl)
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.delete(key)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend:
+    """Shared backend for multi-worker deployments. REDIS_URL=fakeredis:// uses an in-process stand-in."""
+    blocking = True
+
+    def __init__(self, url: str):
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            self._client = fakeredis.FakeRedis(decode_responses=True)
+        else:
+            import redis
+            self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return self._client.mget(keys) if keys else []
+
+    def set_many(self, mapping: Dict[str, str], ttl: float) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.set(key, value, px=int(ttl * 1000))
+        pipe.execute()
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._client.delete(*keys)
+
+    def incr(self, key: str) -> int:
+        return self._client.incr(key)
+
+
+# --- Catalog Cache (events) ---
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()  # memory | redis | none
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", 10000))
+# Event bodies change rarely and are invalidated on every admin write
+CACHE_EVENT_TTL_SECONDS = float(os.getenv("CACHE_EVENT_TTL_SECONDS", 300))
+# Stock is never cached, but which events a has_availability page lists changes with
+# every booking: those pages' id lists are cached this briefly
+CACHE_AVAILABILITY_TTL_SECONDS = float(os.getenv("CACHE_AVAILABILITY_TTL_SECONDS", 2))
+
+_backend = None
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if CACHE_BACKEND == "redis":
+            _backend = RedisBackend(REDIS_URL)
+        elif CACHE_BACKEND == "none":
+            _backend = NullBackend()
+        else:
+            _backend = InMemoryBackend(maxsize=CACHE_MAXSIZE)
+    return _backend
+
+def server_workers() -> int:
+    """Worker processes of the server running the app: uvicorn/gunicorn --workers (-w), else WEB_CONCURRENCY."""
+    # Spawned and forked workers keep the parent's command line
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        value = arg.split("=", 1)[1] if arg.startswith("--workers=") else None
+        if arg in ("--workers", "-w") and i + 1 < len(args):
+            value = args[i + 1]
+        if value is not None and value.isdigit():
+            return int(value)
+    value = os.getenv("WEB_CONCURRENCY", "1")
+    return int(value) if value.isdigit() else 1
+
+def check_backend() -> None:
+    """
+    Refuses the per-process memory backend when the server runs several workers:
+    invalidations would only reach the worker that made the write, and the others
+    would keep serving edited events until CACHE_EVENT_TTL_SECONDS.
+    """
+    workers = server_workers()
+    if CACHE_BACKEND == "memory" and workers > 1:
+        raise RuntimeError(
+            f"CACHE_BACKEND=memory is per process and cannot be used with {workers} workers: "
+            "set CACHE_BACKEND=redis (or none)"
+        )
+
+async def run(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Calls a cache function from the event loop: in the threadpool when the backend
+    does network I/O (Redis), directly for the in-process ones. Never call the cache
+    from inside run_db: in DB_MODE=async that code runs on the event loop.
+    """
+    if get_backend().blocking:
+        return await run_in_threadpool(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+def event_key(event_id: int) -> str:
+    return f"event:{event_id}"
+
+def catalog_generation() -> str:
+    """Version of the active-events listing; bumped whenever an event is created or changed."""
+    return get_backend().get_many(["events:gen"])[0] or "0"
+
+def invalidate_event(event_id: int) -> None:
+    """Drops everything cached about an event (called by the routes after admin writes commit)."""
+    backend = get_backend()
+    backend.delete(event_key(event_id))
+    backend.incr("events:gen")
+
+def invalidate_catalog() -> None:
+    """Drops the cached active-events listings only (events were added; no cached body changed)."""
+    get_backend().incr("events:gen")
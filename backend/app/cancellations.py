@@ -0,0 +1,67 @@
+from dotenv import load_dotenv
+from typing import Optional
+from app import crud, metrics, models
+from app.database import run_in_session
+import asyncio
+import logging
+import os
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Event cancellation cascade (POST /v1/events/{event_id}/cancel). Every worker runs the
+# loop below; each batch locks the event's progress row with SKIP LOCKED, so workers take
+# turns instead of colliding. The progress row holds the cursor: a cascade interrupted by
+# a restart is picked up where it stopped by the next worker to poll.
+CANCEL_BATCH_SIZE = int(os.getenv("CANCEL_BATCH_SIZE", 500))
+# Pause between two batches of one cascade, so bookings and other writes interleave
+CANCEL_BATCH_PAUSE_MS = float(os.getenv("CANCEL_BATCH_PAUSE_MS", 20))
+CANCEL_POLL_INTERVAL_SECONDS = float(os.getenv("CANCEL_POLL_INTERVAL_SECONDS", 2))
+
+
+async def process_cancellation(event_id: int) -> Optional[models.EventCancellation]:
+    """
+    Runs batches of one cascade until it is done or another worker holds it.
+    Returns the last progress seen (None if there was nothing to do here).
+    """
+    last = None
+    while True:
+        started = time.perf_counter()
+        progress = await run_in_session(crud.cancel_event_tickets_batch, event_id, batch_size=CANCEL_BATCH_SIZE)
+        metrics.CANCEL_BATCH_SECONDS.observe(time.perf_counter() - started)
+        if progress is None:
+            return last
+        last = progress
+        if progress.status == "done":
+            return progress
+        await asyncio.sleep(CANCEL_BATCH_PAUSE_MS / 1000)
+
+
+async def run_cancellations() -> None:
+    """Background loop started with the app: works through pending cascades every CANCEL_POLL_INTERVAL_SECONDS."""
+    while True:
+        try:
+            for event_id in await run_in_session(crud.get_pending_cancellations):
+                progress = await process_cancellation(event_id)
+                if progress is not None and progress.status == "done":
+                    logger.info("Event %d cancelled: %d tickets cancelled", event_id, progress.tickets_cancelled)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Event cancellation batch failed")
+        await asyncio.sleep(CANCEL_POLL_INTERVAL_SECONDS)
+
+
+async def _resume_all() -> None:
+    for event_id in await run_in_session(crud.get_pending_cancellations):
+        progress = await process_cancellation(event_id)
+        if progress is not None:
+            print(f"Event {event_id}: {progress.status}, {progress.tickets_cancelled} tickets cancelled")
+
+
+if __name__ == "__main__":
+    # Drains pending cascades without starting the API, e.g. while no worker is running:
+    #   python -m app.cancellations
+    asyncio.run(_resume_all())
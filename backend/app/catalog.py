@@ -0,0 +1,116 @@
+from fastapi import HTTPException, status
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from app import cache, crud, schemas
+from app.database import run_db, DBSession
+import hashlib
+import json
+
+# Read-through cache in front of crud.get_event_by_id / crud.get_active_event_ids.
+# Event bodies are cached aggressively; available_tickets is never cached but read
+# with the page's HTTP validators (one query that every catalog GET runs anyway).
+# Bodies are cached with the event's version (dropped before they are served), so a
+# reader holding the HTTP validators can tell a body that an edit made on another
+# worker left stale, and load it again.
+# Coroutines: database work goes through run_db and cache I/O through cache.run, one
+# after the other, so a Redis round trip never runs inside an async session's run_sync.
+
+
+def _event_body(event) -> Dict:
+    return {**schemas.Event.model_validate(event).model_dump(mode="json"), "version": event.version}
+
+def _served(body: Dict) -> Dict:
+    body.pop("version", None)
+    return body
+
+async def _store_events(bodies: List[Dict]) -> None:
+    await cache.run(
+        cache.get_backend().set_many,
+        {cache.event_key(body["id"]): json.dumps(body) for body in bodies},
+        ttl=cache.CACHE_EVENT_TTL_SECONDS,
+    )
+
+async def _with_availability(db: DBSession, bodies: List[Dict], available: Optional[Dict[int, int]] = None) -> List[Dict]:
+    """
+    Fills in available_tickets: the stock the caller already read (`available`, with
+    the HTTP validators), else the current stock in a single query.
+    """
+    if available is None and bodies:
+        available = await run_db(db, crud.get_available_tickets, [body["id"] for body in bodies])
+    for body in bodies:
+        body["available_tickets"] = (available or {}).get(body["id"], body["available_tickets"])
+    return bodies
+
+async def get_event(db: DBSession, event_id: int, validators: Optional[Dict[int, Tuple]] = None) -> Dict:
+    """Public: Event detail from the cache, like get_events (404 if missing)."""
+    page = await get_events(db, [event_id], validators)
+    if not page:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    return page[0]
+
+async def get_events(db: DBSession, event_ids: List[int], validators: Optional[Dict[int, Tuple]] = None) -> List[Dict]:
+    """
+    Public: Event bodies in the given order, loading the uncached ones in one query (missing IDs are skipped).
+
+    With `validators` (crud.get_event_validators), a cached body of another version is
+    loaded again and the stock shown is the validators'. The validators of every event
+    loaded are replaced with the row just read, so a tag computed from them afterwards
+    describes exactly the bodies returned, even if the event was edited in between.
+    """
+    cached_bodies = await cache.run(cache.get_backend().get_many, [cache.event_key(event_id) for event_id in event_ids])
+    bodies = {}
+    for event_id, cached in zip(event_ids, cached_bodies):
+        if cached is None:
+            continue
+        body = json.loads(cached)
+        if validators is not None and event_id in validators and body.get("version") != validators[event_id][0]:
+            continue
+        bodies[event_id] = body
+    missing = [event_id for event_id in event_ids if event_id not in bodies]
+    if missing:
+        events = await run_db(db, crud.get_events_by_ids, missing)
+        loaded = [_event_body(event) for event in events]
+        await _store_events(loaded)
+        bodies.update({body["id"]: body for body in loaded})
+        if validators is not None:
+            for event in events:
+                if event.id in validators:
+                    # Keep the later timestamp: for sharded events it also covers the shards
+                    updated_at = max(filter(None, (validators[event.id][2], event.updated_at)), default=None)
+                    validators[event.id] = (event.version, event.available_tickets, updated_at)
+    available = None if validators is None else {event_id: values[1] for event_id, values in validators.items()}
+    page = await _with_availability(db, [bodies[event_id] for event_id in event_ids if event_id in bodies], available)
+    return [_served(dict(body)) for body in page]
+
+async def active_event_ids(db: DBSession, query: Optional[schemas.EventQuery] = None) -> List[int]:
+    """
+    Public: The event ids of one catalog page. The cached page only stores ids, so
+    updating one event never requires rewriting every cached page.
+    """
+    query = query or schemas.EventQuery()
+    backend = cache.get_backend()
+    query_hash = hashlib.sha1(query.model_dump_json().encode()).hexdigest()
+    list_key = f"events:active:{await cache.run(cache.catalog_generation)}:{query_hash}"
+    cached_ids = (await cache.run(backend.get_many, [list_key]))[0]
+    if cached_ids is not None:
+        return json.loads(cached_ids)
+
+    event_ids = await run_db(db, crud.get_active_event_ids, query)
+    # Membership of "has availability" pages changes with every booking
+    ttl = cache.CACHE_AVAILABILITY_TTL_SECONDS if query.has_availability is not None else cache.CACHE_EVENT_TTL_SECONDS
+    await cache.run(backend.set_many, {list_key: json.dumps(event_ids)}, ttl=ttl)
+    return event_ids
+
+async def get_active_events(db: DBSession, query: Optional[schemas.EventQuery] = None) -> List[Dict]:
+    """Public: One catalog page from the cache; only misses reach the database."""
+    return await get_events(db, await active_event_ids(db, query))
+
+def next_cursor(page: List[Dict], query: schemas.EventQuery) -> Optional[str]:
+    """Cursor for the page after `page`, or None when it was the last one."""
+    if len(page) < query.limit:
+        return None
+    last = page[-1]
+    return crud.encode_cursor(datetime.fromisoformat(last["date"]), last["id"])
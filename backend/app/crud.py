@@ -1,9 +1,22 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from app import models, schemas
-from app.auth import hash_password, verify_password 
+from sqlalchemy.orm.attributes import set_committed_value, flag_modified
+from sqlalchemy import select, update, insert, delete, func, tuple_, or_, and_, exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from app import models, schemas, metrics, availability
+from app.auth import hash_password
 from fastapi import HTTPException, status
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import base64
+import random
+import os
+
+load_dotenv()
+
+# How long a checkout hold keeps its tickets out of stock
+HOLD_TTL_SECONDS = int(os.getenv("HOLD_TTL_SECONDS", 600))
 
 
 # --- User/Auth CRUD ---
@@ -12,8 +25,11 @@ def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     """Fetches a user by their unique username."""
     return db.query(models.User).filter(models.User.username == username).first()
 
-def create_user(db: Session, user: schemas.UserCreate, is_admin: bool = False) -> models.User:
-    """Creates a new user (handles both standard and initial admin creation)."""
+def create_user(db: Session, user: schemas.UserCreate, is_admin: bool = False, hashed_password: Optional[str] = None) -> models.User:
+    """
+    Creates a new user (handles both standard and initial admin creation).
+    Callers on the request path pass a hashed_password computed off-thread.
+    """
     
     # Input Validation Check 1 (prevent duplicate users)
     if get_user_by_username(db, username=user.username):
@@ -22,7 +38,7 @@ def create_user(db: Session, user: schemas.UserCreate, is_admin: bool = False) -
             detail="Username already registered"
         )
         
-    hashed_pass = hash_password(user.password)
+    hashed_pass = hashed_password or hash_password(user.password)
     db_user = models.User(
         username=user.username,
         email = user.email,
@@ -34,21 +50,15 @@ def create_user(db: Session, user: schemas.UserCreate, is_admin: bool = False) -
     db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
-    """Authenticates a user for login."""
-    user = get_user_by_username(db, username=username)
-    if not user:
-        return False
-    # Input Validation Check 2 (verify password)
-    if not verify_password(password, user.hashed_password):
-        return False
-    return user
-
 
 # --- Admin Event CRUD ---
 
 def get_event_by_id(db: Session, event_id: int) -> models.Event:
     """Fetches a single event by ID, raising 404 if not found."""
+    return _with_shard_totals(db, [_get_event_row(db, event_id)])[0]
+
+def _get_event_row(db: Session, event_id: int) -> models.Event:
+    """Loads the raw events row (no shard aggregation), raising 404 if not found."""
     event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if not event:
          raise HTTPException(
@@ -58,7 +68,7 @@ def get_event_by_id(db: Session, event_id: int) -> models.Event:
     return event
 
 def admin_create_event(db: Session, event: schemas.EventCreate) -> models.Event:
-    """Admin: Creates a new event."""
+    """Admin: Creates a new event. The caller then drops the cached listings (cache.invalidate_catalog)."""
     db_event = models.Event(
         name=event.name,
         description=event.description,
@@ -66,85 +76,1285 @@ def admin_create_event(db: Session, event: schemas.EventCreate) -> models.Event:
         location=event.location,
         total_tickets=event.total_tickets,
         available_tickets=event.total_tickets, # Initial available tickets equals total
-        price=event.price
+        price=event.price,
+        inventory_shards=0
     )
     db.add(db_event)
+    db.flush()
+    if event.inventory_shards:
+        _rebalance_inventory(db, db_event, event.total_tickets, event.inventory_shards)
     db.commit()
     db.refresh(db_event)
-    return db_event
+    return _with_shard_totals(db, [db_event])[0]
+
+def admin_import_events(db: Session, events: List[schemas.EventCreate]) -> List[int]:
+    """
+    Admin: Creates a batch of validated events in one transaction, with one
+    multi-row INSERT for the events (and one for the shards of sharded ones).
+    Returns the new ids in input order. The caller then drops the cached listings.
+    """
+    event_ids = db.scalars(
+        insert(models.Event).returning(models.Event.id, sort_by_parameter_order=True),
+        [
+            {
+                "name": event.name,
+                "description": event.description,
+                "date": event.date,
+                "location": event.location,
+                "total_tickets": event.total_tickets,
+                # Stock of sharded events lives in their shards, as in _rebalance_inventory
+                "available_tickets": 0 if event.inventory_shards else event.total_tickets,
+                "price": event.price,
+                "inventory_shards": event.inventory_shards,
+            }
+            for event in events
+        ],
+    ).all()
+    shard_rows = []
+    for event_id, event in zip(event_ids, events):
+        if event.inventory_shards:
+            base, extra = divmod(event.total_tickets, event.inventory_shards)
+            shard_rows.extend(
+                {"event_id": event_id, "shard_no": shard_no, "available_tickets": base + (1 if shard_no < extra else 0)}
+                for shard_no in range(event.inventory_shards)
+            )
+    if shard_rows:
+        db.execute(insert(models.EventInventoryShard), shard_rows)
+    db.commit()
+    return list(event_ids)
 
-def admin_update_event(db: Session, event_id: int, event_update: schemas.EventBase) -> models.Event:
-    """Admin: Updates an existing event."""
+def admin_update_event(db: Session, event_id: int, event_update: schemas.EventUpdate) -> models.Event:
+    """Admin: Updates an existing event. The caller then drops it from the cache (cache.invalidate_event)."""
     db_event = get_event_by_id(db, event_id)
-    
+    repriced = event_update.price != db_event.price
+    if repriced:
+        # Taken before the counters, like every other rollup writer: no applier runs meanwhile
+        _lock_sales_state(db)
+    # Locks the counters and re-reads the live stock (bookings keep running meanwhile)
+    available = _lock_available_tickets(db, db_event)
  
     if event_update.total_tickets != db_event.total_tickets:
         diff = event_update.total_tickets - db_event.total_tickets
-        db_event.available_tickets += diff
+        available += diff
         # NOTE: More robust logic would ensure available_tickets >= 0
     
     # Update fields dynamically using Pydantic's model_dump
     update_data = event_update.model_dump(exclude_unset=True)
+    shard_count = update_data.pop("inventory_shards", db_event.inventory_shards)
     for key, value in update_data.items():
         setattr(db_event, key, value)
+    db_event.version = models.Event.version + 1
+
+    # Writes the new stock back, spread over the (possibly changed) number of shards
+    _rebalance_inventory(db, db_event, available, shard_count)
+    if repriced:
+        # Revenue follows the current price; pending changes are priced when applied
+        db.flush()
+        _reprice_sales(db, models.SalesRollup.event_id == event_id)
         
     db.add(db_event)
     db.commit()
+    availability.publish(event_id)
     db.refresh(db_event)
-    return db_event
+    return _with_shard_totals(db, [db_event])[0]
 
 def admin_delete_event(db: Session, event_id: int) -> dict:
-    """Admin: Deletes an event (soft delete by setting is_active=False)."""
+    """
+    Admin: Deletes an event (soft delete by setting is_active=False) and releases its open
+    holds in the same transaction, so none can be confirmed afterwards.
+    The caller then drops it from the cache.
+    """
     db_event = get_event_by_id(db, event_id)
     # Industry best practice is soft deletion
     db_event.is_active = False 
+    db_event.version = models.Event.version + 1
+    released = _release_open_holds(db, event_id)
     db.commit()
+    # Its availability streams get a final `closed` message
+    availability.publish(event_id)
+    metrics.HOLDS_TOTAL.labels("released").inc(released)
     return {"detail": f"Event {event_id} successfully deactivated."}
 
+# --- Sharded Inventory Helpers ---
+
+def _with_shard_totals(db: Session, events: List[models.Event]) -> List[models.Event]:
+    """
+    Replaces available_tickets of sharded events with the sum over their shards.
+    The value is set as committed state, so it is never written back to the events row.
+    """
+    sharded = {event.id: event for event in events if event.inventory_shards}
+    if sharded:
+        for event_id, total in get_shard_totals(db, list(sharded)).items():
+            set_committed_value(sharded[event_id], "available_tickets", total)
+    return events
+
+def get_shard_totals(db: Session, event_ids: List[int]) -> Dict[int, int]:
+    """Aggregates the remaining stock of sharded events in one grouped query."""
+    rows = db.execute(
+        select(models.EventInventoryShard.event_id, func.sum(models.EventInventoryShard.available_tickets))
+        .where(models.EventInventoryShard.event_id.in_(event_ids))
+        .group_by(models.EventInventoryShard.event_id)
+    ).all()
+    return {event_id: int(total or 0) for event_id, total in rows}
+
+def _lock_available_tickets(db: Session, db_event: models.Event) -> int:
+    """Locks the event's stock counter(s) for the rest of the transaction and returns the live total."""
+    if db.get_bind().dialect.name == "sqlite":
+        # No FOR UPDATE there, and the driver only opens the transaction at the first write:
+        # a no-op write first takes the database lock, so no booking commits between read and write-back
+        db.execute(update(models.Event).where(models.Event.id == db_event.id).values(version=models.Event.version))
+    if db_event.inventory_shards:
+        counts = db.scalars(
+            select(models.EventInventoryShard.available_tickets)
+            .where(models.EventInventoryShard.event_id == db_event.id)
+            .with_for_update()
+        ).all()
+        return sum(counts)
+    return db.scalar(
+        select(models.Event.available_tickets)
+        .where(models.Event.id == db_event.id)
+        .with_for_update()
+    )
+
+def _rebalance_inventory(db: Session, db_event: models.Event, available: int, shard_count: int) -> None:
+    """
+    Stores `available` tickets for the event, split evenly over `shard_count` shards
+    (0 keeps everything in events.available_tickets). Existing shard rows are updated
+    in place so bookings waiting on them re-check the new value instead of failing.
+    """
+    available = max(available, 0)
+    old_count = db_event.inventory_shards
+    db_event.inventory_shards = shard_count
+
+    if shard_count == 0:
+        db_event.available_tickets = available
+    else:
+        # Stock lives in the shards; the events row is no longer touched by bookings
+        db_event.available_tickets = 0
+        base, extra = divmod(available, shard_count)
+        for shard_no in range(shard_count):
+            amount = base + (1 if shard_no < extra else 0)
+            if shard_no < old_count:
+                db.execute(
+                    update(models.EventInventoryShard)
+                    .where(
+                        models.EventInventoryShard.event_id == db_event.id,
+                        models.EventInventoryShard.shard_no == shard_no,
+                    )
+                    .values(available_tickets=amount)
+                )
+            else:
+                db.add(models.EventInventoryShard(event_id=db_event.id, shard_no=shard_no, available_tickets=amount))
+    # The loaded value may be a shard aggregate, so always write the column explicitly
+    flag_modified(db_event, "available_tickets")
+
+    if old_count > shard_count:
+        db.execute(
+            delete(models.EventInventoryShard).where(
+                models.EventInventoryShard.event_id == db_event.id,
+                models.EventInventoryShard.shard_no >= shard_count,
+            )
+        )
+
+def _take_from_shards(db: Session, db_event: models.Event, quantity: int) -> int:
+    """
+    Decrements up to `quantity` tickets from a sharded event inside the current transaction.
+    Starts at a random shard and spills over to the next one when it runs out.
+    Returns how many were taken; if that is short of `quantity`, the caller must
+    roll back or put the partial amount back with _release_inventory.
+    """
+    shard_count = db_event.inventory_shards
+    start = random.randrange(shard_count)
+
+    # Fast path: one shard covers the whole booking (always true for single tickets)
+    for offset in range(shard_count):
+        taken = db.execute(
+            update(models.EventInventoryShard)
+            .where(
+                models.EventInventoryShard.event_id == db_event.id,
+                models.EventInventoryShard.shard_no == (start + offset) % shard_count,
+                models.EventInventoryShard.available_tickets >= quantity,
+            )
+            .values(available_tickets=models.EventInventoryShard.available_tickets - quantity)
+        ).rowcount
+        if taken:
+            return quantity
+
+    # Slow path: no single shard has enough left, gather the booking from several shards
+    remaining = quantity
+    shards = db.execute(
+        select(models.EventInventoryShard.shard_no, models.EventInventoryShard.available_tickets)
+        .where(
+            models.EventInventoryShard.event_id == db_event.id,
+            models.EventInventoryShard.available_tickets > 0,
+        )
+        # Lock shards in a fixed order, like events in book_basket
+        .order_by(models.EventInventoryShard.shard_no)
+    ).all()
+    for shard_no, shard_available in shards:
+        take = min(remaining, shard_available)
+        taken = db.execute(
+            update(models.EventInventoryShard)
+            .where(
+                models.EventInventoryShard.event_id == db_event.id,
+                models.EventInventoryShard.shard_no == shard_no,
+                models.EventInventoryShard.available_tickets >= take,
+            )
+            .values(available_tickets=models.EventInventoryShard.available_tickets - take)
+        ).rowcount
+        if taken:
+            remaining -= take
+        if remaining == 0:
+            break
+    return quantity - remaining
+
+def _release_inventory(db: Session, event_id: int, quantity: int) -> None:
+    """Puts `quantity` tickets back on sale inside the current transaction (no commit)."""
+    returned = db.execute(
+        update(models.Event)
+        .where(models.Event.id == event_id, models.Event.inventory_shards == 0)
+        .values(available_tickets=models.Event.available_tickets + quantity)
+    ).rowcount
+    if not returned:
+        # Sharded event: any shard will do, pick one at random to spread the row locks
+        shard_count = db.scalar(select(models.Event.inventory_shards).where(models.Event.id == event_id))
+        db.execute(
+            update(models.EventInventoryShard)
+            .where(
+                models.EventInventoryShard.event_id == event_id,
+                models.EventInventoryShard.shard_no == random.randrange(shard_count),
+            )
+            .values(available_tickets=models.EventInventoryShard.available_tickets + quantity)
+        )
+
 # --- User Ticket CRUD ---
 
-def get_all_active_events(db: Session, skip: int = 0, limit: int = 100) -> List[models.Event]:
-    """Public: Fetches all active events for browsing."""
-    return db.query(models.Event).filter(models.Event.is_active == True).offset(skip).limit(limit).all()
+def encode_cursor(date: datetime, row_id: int) -> str:
+    """Builds the opaque keyset cursor pointing at the (date, id) of the last row served."""
+    return base64.urlsafe_b64encode(f"{date.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parses a cursor from encode_cursor, raising 400 if it was tampered with."""
+    try:
+        date, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(date), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def _active_events_statement(query: schemas.EventQuery, *columns):
+    """SELECT `columns` for one page of the active catalog, ordered by (date, id)."""
+    statement = select(*columns).where(models.Event.is_active == True)
+
+    if query.cursor:
+        statement = statement.where(tuple_(models.Event.date, models.Event.id) > decode_cursor(query.cursor))
+    if query.date_from is not None:
+        statement = statement.where(models.Event.date >= query.date_from)
+    if query.date_to is not None:
+        statement = statement.where(models.Event.date <= query.date_to)
+    if query.location is not None:
+        statement = statement.where(models.Event.location == query.location)
+    if query.min_price is not None:
+        statement = statement.where(models.Event.price >= query.min_price)
+    if query.max_price is not None:
+        statement = statement.where(models.Event.price <= query.max_price)
+    if query.has_availability is not None:
+        in_stock = or_(
+            and_(models.Event.inventory_shards == 0, models.Event.available_tickets > 0),
+            and_(
+                models.Event.inventory_shards > 0,
+                exists().where(
+                    models.EventInventoryShard.event_id == models.Event.id,
+                    models.EventInventoryShard.available_tickets > 0,
+                ),
+            ),
+        )
+        statement = statement.where(in_stock if query.has_availability else ~in_stock)
+
+    return statement.order_by(models.Event.date, models.Event.id).limit(query.limit)
+
+def get_all_active_events(db: Session, query: Optional[schemas.EventQuery] = None) -> List[models.Event]:
+    """
+    Public: Fetches one page of active events for browsing, ordered by (date, id).
+    Pages are addressed by keyset cursor, so deep pages cost the same as the first
+    one (served by ix_events_active_date_id instead of an OFFSET scan).
+    """
+    statement = _active_events_statement(query or schemas.EventQuery(), models.Event)
+    return _with_shard_totals(db, db.scalars(statement).all())
+
+def get_active_event_ids(db: Session, query: Optional[schemas.EventQuery] = None) -> List[int]:
+    """Public: The same page as get_all_active_events, IDs only (answered from the index)."""
+    return list(db.scalars(_active_events_statement(query or schemas.EventQuery(), models.Event.id)))
+
+def get_events_by_ids(db: Session, event_ids: List[int]) -> List[models.Event]:
+    """Public: Fetches several events by ID in one query (missing IDs are skipped)."""
+    events = db.query(models.Event).filter(models.Event.id.in_(event_ids)).all()
+    return _with_shard_totals(db, events)
+
+def get_available_tickets(db: Session, event_ids: List[int], active_only: bool = False) -> Dict[int, int]:
+    """
+    Public: Current stock per event (shard-aware), without loading full rows.
+    Missing IDs are skipped, and inactive ones too with `active_only`.
+    """
+    statement = select(
+        models.Event.id, models.Event.available_tickets, models.Event.inventory_shards,
+    ).where(models.Event.id.in_(event_ids))
+    if active_only:
+        statement = statement.where(models.Event.is_active == True)
+    rows = db.execute(statement).all()
+    available = {event_id: count for event_id, count, _ in rows}
+    sharded = [event_id for event_id, _, shards in rows if shards]
+    if sharded:
+        available.update(get_shard_totals(db, sharded))
+    return available
+
+def get_event_validators(db: Session, event_ids: List[int], active_only: bool = False) -> Dict[int, Tuple[int, int, Optional[datetime]]]:
+    """
+    Public: (version, available_tickets, updated_at) per event, the inputs of the HTTP
+    ETag / Last-Modified headers, without loading full rows (missing IDs are skipped,
+    and inactive ones too with `active_only`, e.g. for cached catalog pages).
+    For sharded events the stock and the timestamp include their shards.
+    """
+    statement = select(
+        models.Event.id, models.Event.version, models.Event.available_tickets,
+        models.Event.inventory_shards, models.Event.updated_at,
+    ).where(models.Event.id.in_(event_ids))
+    if active_only:
+        statement = statement.where(models.Event.is_active == True)
+    rows = db.execute(statement).all()
+    validators = {event_id: (version, available, updated_at) for event_id, version, available, _, updated_at in rows}
+    sharded = [event_id for event_id, _, _, shards, _ in rows if shards]
+    if sharded:
+        shard_rows = db.execute(
+            select(
+                models.EventInventoryShard.event_id,
+                func.sum(models.EventInventoryShard.available_tickets),
+                func.max(models.EventInventoryShard.updated_at),
+            )
+            .where(models.EventInventoryShard.event_id.in_(sharded))
+            .group_by(models.EventInventoryShard.event_id)
+        ).all()
+        for event_id, total, shard_updated_at in shard_rows:
+            version, _, updated_at = validators[event_id]
+            if shard_updated_at is not None and (updated_at is None or shard_updated_at > updated_at):
+                updated_at = shard_updated_at
+            validators[event_id] = (version, int(total or 0), updated_at)
+    return validators
 
 def user_book_ticket(db: Session, event_id: int, owner_id: int) -> models.Ticket:
     """
     User: Books a ticket, ensuring atomicity and availability.
     """
-    db_event = get_event_by_id(db, event_id)
+    return book_tickets(db, event_id=event_id, owner_id=owner_id, quantity=1)[0]
 
-    # 1. Check Availability
-    if db_event.available_tickets <= 0:
+def book_tickets(db: Session, event_id: int, owner_id: int, quantity: int = 1) -> List[models.Ticket]:
+    """
+    User: Books `quantity` tickets for one event without ever overselling.
+    """
+    return book_basket(db, owner_id=owner_id, items={event_id: quantity})
+
+def book_basket(db: Session, owner_id: int, items: Dict[int, int]) -> List[models.Ticket]:
+    """
+    User: Books tickets across one or more events ({event_id: quantity}) all-or-nothing.
+
+    The availability check and the decrement happen in a single conditional
+    UPDATE per event, so concurrent buyers never read-modify-write the same
+    counter. Events are locked in ascending id order, which keeps overlapping
+    baskets from deadlocking, and every ticket goes in with one multi-row INSERT.
+    """
+    reserved = {}
+    try:
+        # 1. Check-and-decrement each event in a fixed (id) order
+        for event_id in sorted(items):
+            reserved[event_id] = _reserve_inventory(db, event_id, items[event_id])
+    except HTTPException as e:
+        # Undo the events already reserved in this basket
+        db.rollback()
+        _count_booking(event_id, "sold_out" if e.status_code == status.HTTP_409_CONFLICT else "failed")
+        if len(items) > 1:
+            e.detail = f"Event {event_id}: {e.detail}"
+        raise
+
+    try:
+        # 2. Insert all tickets with one multi-row INSERT ... RETURNING in the same transaction
+        tickets = db.scalars(
+            insert(models.Ticket).returning(models.Ticket),
+            [
+                {"event_id": event_id, "owner_id": owner_id, "status": "booked"}
+                for event_id in sorted(items)
+                for _ in range(items[event_id])
+            ],
+        ).all()
+        _record_bookings(db, tickets)
+
+        # Commit all changes simultaneously to ensure integrity
+        db.commit()
+    except Exception:
+        for event_id in items:
+            _count_booking(event_id, "failed")
+        raise
+    for event_id, db_event in reserved.items():
+        _count_booking(event_id, "succeeded")
+        # Bookings only change the stock, which is never cached: the cached event stays valid
+        availability.publish(event_id)
+
+    # The event rows came back from RETURNING, so attach them without another query
+    for ticket in tickets:
+        set_committed_value(ticket, "event", reserved[ticket.event_id])
+    return tickets
+
+def _count_booking(event_id: int, outcome: str) -> None:
+    metrics.labelled(metrics.BOOKINGS_TOTAL, str(event_id), outcome).inc()
+
+def _reserve_inventory(db: Session, event_id: int, quantity: int) -> models.Event:
+    """
+    Takes `quantity` tickets of one event inside the current transaction (no commit).
+    Returns the event with its new stock; raises 404/409 and leaves the rollback to the caller.
+    """
+    db_event = _decrement_available(db, event_id, quantity)
+    if db_event is not None:
+        return db_event
+
+    # Only the failure and sharded paths pay for the extra lookup (404 vs. sold out)
+    db_event = _get_event_row(db, event_id)
+    _check_on_sale(db_event)
+    if not db_event.inventory_shards or _take_from_shards(db, db_event, quantity) < quantity:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="This event is sold out."
         )
+    return _with_shard_totals(db, [db_event])[0]
 
-    # 2. Critical: Decrement available tickets and create ticket in one transaction
-    db_event.available_tickets -= 1
-    
-    db_ticket = models.Ticket(
+def _check_on_sale(db_event: models.Event) -> None:
+    """Raises 409 for a deactivated (cancelled) event: its stock is no longer for sale."""
+    if not db_event.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This event is no longer on sale."
+        )
+
+def _decrement_available(db: Session, event_id: int, quantity: int) -> Optional[models.Event]:
+    """
+    Check-and-decrement of an unsharded, active event in one statement
+    (UPDATE ... WHERE available >= n RETURNING). Returns None if it did not apply.
+    """
+    return db.scalars(
+        update(models.Event)
+        .where(
+            models.Event.id == event_id,
+            models.Event.inventory_shards == 0,
+            models.Event.available_tickets >= quantity,
+            # Re-checked on the row being updated, so a cancellation committing meanwhile stops the booking
+            models.Event.is_active == True,
+        )
+        .values(available_tickets=models.Event.available_tickets - quantity)
+        .returning(models.Event)
+        # The row may already be in the session (batch retries): refresh it from RETURNING
+        .execution_options(synchronize_session=False, populate_existing=True)
+    ).first()
+
+def _take_up_to(db: Session, event_id: int, quantity: int) -> Tuple[models.Event, int]:
+    """
+    Takes as many of `quantity` tickets of one event as are left (no commit).
+    Returns the event with its new stock and the number taken; raises 404 or 409 (not on sale).
+    """
+    db_event = _decrement_available(db, event_id, quantity)
+    if db_event is not None:
+        return db_event, quantity
+
+    db_event = _get_event_row(db, event_id)
+    _check_on_sale(db_event)
+    if db_event.inventory_shards:
+        taken = _take_from_shards(db, db_event, quantity)
+        return _with_shard_totals(db, [db_event])[0], taken
+
+    # Less stock than wanted: take what is left, re-reading it if a concurrent booking got there first
+    available = db_event.available_tickets
+    while available > 0:
+        taken = min(quantity, available)
+        updated = _decrement_available(db, event_id, taken)
+        if updated is not None:
+            return updated, taken
+        # An event cancelled meanwhile counts as sold out (no row)
+        available = db.scalar(
+            select(models.Event.available_tickets).where(models.Event.id == event_id, models.Event.is_active == True)
+        ) or 0
+    set_committed_value(db_event, "available_tickets", max(available, 0))
+    return db_event, 0
+
+def book_batch(db: Session, requests: List[Tuple[int, int, int]]) -> List[object]:
+    """
+    User: Books a batch of independent requests [(event_id, owner_id, quantity)] in one transaction.
+
+    Used by the write-behind pipeline (app/batcher.py). Each event gets one
+    conditional decrement for the batch's total demand, the stock taken is handed
+    out in arrival order exactly as if the requests had run one after another, and
+    whatever no request could use goes straight back. All tickets go in with one
+    multi-row INSERT and one commit. Returns, per request, its list of tickets or
+    the HTTPException it would have raised on its own.
+    """
+    wanted: Dict[int, int] = {}
+    for event_id, _, quantity in requests:
+        wanted[event_id] = wanted.get(event_id, 0) + quantity
+
+    # 1. One check-and-decrement per event, in a fixed (id) order like book_basket
+    reserved: Dict[int, models.Event] = {}
+    left: Dict[int, int] = {}
+    missing: Dict[int, HTTPException] = {}
+    for event_id in sorted(wanted):
+        try:
+            reserved[event_id], left[event_id] = _take_up_to(db, event_id, wanted[event_id])
+        except HTTPException as e:
+            missing[event_id] = e
+
+    # 2. Grant requests first come, first served
+    results: List[object] = []
+    rows = []
+    for event_id, owner_id, quantity in requests:
+        if event_id in missing:
+            results.append(HTTPException(status_code=missing[event_id].status_code, detail=missing[event_id].detail))
+            _count_booking(event_id, "failed")
+        elif quantity > left[event_id]:
+            results.append(HTTPException(status_code=status.HTTP_409_CONFLICT, detail="This event is sold out."))
+            _count_booking(event_id, "sold_out")
+        else:
+            left[event_id] -= quantity
+            results.append(quantity)
+            rows.extend({"event_id": event_id, "owner_id": owner_id, "status": "booked"} for _ in range(quantity))
+
+    # 3. Put back what was taken for requests that could not be granted
+    for event_id, quantity in left.items():
+        if quantity:
+            _release_inventory(db, event_id, quantity)
+            set_committed_value(reserved[event_id], "available_tickets", reserved[event_id].available_tickets + quantity)
+
+    tickets = []
+    try:
+        if rows:
+            tickets = db.scalars(
+                insert(models.Ticket).returning(models.Ticket, sort_by_parameter_order=True), rows
+            ).all()
+            _record_bookings(db, tickets)
+        db.commit()
+    except Exception:
+        # Requests already answered 404/409 keep their outcome; the granted ones failed
+        for (event_id, _, _), result in zip(requests, results):
+            if isinstance(result, int):
+                _count_booking(event_id, "failed")
+        raise
+    for event_id in reserved:
+        availability.publish(event_id)
+
+    # 4. Hand each granted request its own slice of the inserted tickets
+    offset = 0
+    for i, result in enumerate(results):
+        if isinstance(result, int):
+            _count_booking(requests[i][0], "succeeded")
+            results[i] = tickets[offset:offset + result]
+            offset += result
+            for ticket in results[i]:
+                set_committed_value(ticket, "event", reserved[ticket.event_id])
+    return results
+
+_TICKET_FIELDS = [name for name in schemas.Ticket.model_fields if name != "event"]
+_EVENT_FIELDS = list(schemas.Event.model_fields)
+
+def get_user_ticket_rows(db: Session, owner_id: int, query: Optional[schemas.TicketQuery] = None) -> List[Dict]:
+    """
+    User: Fetches one page of tickets owned by a specific user, newest first, as plain
+    dicts shaped like schemas.Ticket. Selects only the schema's columns in one joined
+    query (no ORM identity map, no re-validation, no lazy load per ticket), for the
+    listing endpoint to hand straight to the JSON encoder.
+    """
+    query = query or schemas.TicketQuery()
+    columns = [getattr(models.Ticket, name) for name in _TICKET_FIELDS]
+    columns += [getattr(models.Event, name).label(f"event_{name}") for name in _EVENT_FIELDS]
+    # Not part of the public event, only needed to sum the stock of sharded events
+    columns.append(models.Event.inventory_shards)
+    statement = (
+        select(*columns)
+        .outerjoin(models.Event, models.Ticket.event_id == models.Event.id)
+        .where(models.Ticket.owner_id == owner_id)
+    )
+    if query.cursor:
+        statement = statement.where(tuple_(models.Ticket.booking_date, models.Ticket.id) < decode_cursor(query.cursor))
+    if query.status is not None:
+        statement = statement.where(models.Ticket.status == query.status)
+    statement = statement.order_by(models.Ticket.booking_date.desc(), models.Ticket.id.desc()).limit(query.limit)
+
+    rows = []
+    sharded = set()
+    for row in db.execute(statement):
+        ticket = {name: row[i] for i, name in enumerate(_TICKET_FIELDS)}
+        event_values = row[len(_TICKET_FIELDS):-1]
+        ticket["event"] = dict(zip(_EVENT_FIELDS, event_values)) if event_values[0] is not None else None
+        rows.append(ticket)
+        if row[-1]:
+            sharded.add(ticket["event_id"])
+
+    if sharded:
+        totals = get_shard_totals(db, list(sharded))
+        for row in rows:
+            if row["event"] and row["event_id"] in totals:
+                row["event"]["available_tickets"] = totals[row["event_id"]]
+    return rows
+
+# --- Hold (Reservation) CRUD ---
+
+def create_hold(db: Session, owner_id: int, event_id: int, quantity: int) -> models.Hold:
+    """
+    User: Takes `quantity` tickets out of stock for HOLD_TTL_SECONDS.
+    The hold must be confirmed before it expires, otherwise the sweeper returns the stock.
+    """
+    try:
+        db_event = _reserve_inventory(db, event_id, quantity)
+    except HTTPException:
+        db.rollback()
+        raise
+
+    db_hold = models.Hold(
         event_id=event_id,
         owner_id=owner_id,
-        status="booked"
+        quantity=quantity,
+        status="held",
+        expires_at=datetime.utcnow() + timedelta(seconds=HOLD_TTL_SECONDS)
     )
+    db.add(db_hold)
+    db.commit()
+    availability.publish(event_id)
+    metrics.HOLDS_TOTAL.labels("created").inc()
+    return db_hold
 
-    db.add(db_event) # Modify event
-    db.add(db_ticket) # Create ticket
-    
-    # Commit both changes simultaneously to ensure integrity
-    db.commit() 
-    db.refresh(db_ticket)
-    return db_ticket
+def _close_hold(db: Session, hold_id: str, owner_id: int, new_status: str) -> models.Hold:
+    """
+    Moves an open, unexpired hold owned by the caller to `new_status` with one conditional
+    UPDATE, so a hold can only ever be confirmed, released or expired once.
+    """
+    db_hold = db.scalars(
+        update(models.Hold)
+        .where(
+            models.Hold.id == hold_id,
+            models.Hold.owner_id == owner_id,
+            models.Hold.status == "held",
+            models.Hold.expires_at > datetime.utcnow(),
+        )
+        .values(status=new_status)
+        .returning(models.Hold)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if db_hold is None:
+        db.rollback()
+        if not db.scalar(select(models.Hold.id).where(models.Hold.id == hold_id, models.Hold.owner_id == owner_id)):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Hold not found"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Hold has expired or was already used."
+        )
+    return db_hold
+
+def confirm_hold(db: Session, hold_id: str, owner_id: int) -> List[models.Ticket]:
+    """
+    User: Turns a hold into booked tickets (the stock was already taken when holding).
+    Raises 409 if the event went off sale since the hold was taken.
+    """
+    db_hold = _close_hold(db, hold_id, owner_id, "confirmed")
+    try:
+        _check_on_sale(_get_event_row(db, db_hold.event_id))
+    except HTTPException:
+        db.rollback()
+        raise
+    tickets = db.scalars(
+        insert(models.Ticket).returning(models.Ticket),
+        [{"event_id": db_hold.event_id, "owner_id": owner_id, "status": "booked"} for _ in range(db_hold.quantity)],
+    ).all()
+    _record_bookings(db, tickets)
+    db.commit()
+    metrics.HOLDS_TOTAL.labels("confirmed").inc()
+
+    db_event = get_event_by_id(db, db_hold.event_id)
+    for ticket in tickets:
+        set_committed_value(ticket, "event", db_event)
+    return tickets
+
+def release_hold(db: Session, hold_id: str, owner_id: int) -> dict:
+    """User: Gives up a hold early and puts its tickets back on sale."""
+    db_hold = _close_hold(db, hold_id, owner_id, "released")
+    _release_inventory(db, db_hold.event_id, db_hold.quantity)
+    db.commit()
+    availability.publish(db_hold.event_id)
+    metrics.HOLDS_TOTAL.labels("released").inc()
+    return {"detail": f"Hold {hold_id} released."}
+
+def expire_holds(db: Session, batch_size: int = 500) -> int:
+    """
+    Sweeper: Expires one batch of overdue holds and returns their stock, one UPDATE per event.
+    Walks ix_holds_open_expires_at (open holds only), and skips rows other workers
+    are sweeping or confirming right now. Returns the number of holds expired.
+    """
+    now = datetime.utcnow()
+    overdue_ids = db.scalars(
+        select(models.Hold.id)
+        .where(models.Hold.status == "held", models.Hold.expires_at <= now)
+        .order_by(models.Hold.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not overdue_ids:
+        db.rollback()
+        return 0
+
+    # RETURNING reports exactly the holds this transaction expired (a concurrent
+    # confirm that won the race is excluded by the status check)
+    expired = db.execute(
+        update(models.Hold)
+        .where(models.Hold.id.in_(overdue_ids), models.Hold.status == "held")
+        .values(status="expired")
+        .returning(models.Hold.event_id, models.Hold.quantity)
+    ).all()
+
+    returned: Dict[int, int] = {}
+    for event_id, quantity in expired:
+        returned[event_id] = returned.get(event_id, 0) + quantity
+    # Same lock order as bookings (ascending event id)
+    for event_id in sorted(returned):
+        _release_inventory(db, event_id, returned[event_id])
+    db.commit()
 
-def get_user_tickets(db: Session, owner_id: int) -> List[models.Ticket]:
+    for event_id in returned:
+        availability.publish(event_id)
+    metrics.HOLDS_TOTAL.labels("expired").inc(len(expired))
+    return len(expired)
+
+# --- Cancellation CRUD ---
+
+def _return_to_stock(db: Session, returned: Dict[int, int]) -> None:
+    """Puts {event_id: quantity} back on sale (no commit), in the same lock order as bookings."""
+    for event_id in sorted(returned):
+        _release_inventory(db, event_id, returned[event_id])
+
+def _announce_returned(event_ids) -> None:
+    # Stock went back up: tell the availability streams
+    for event_id in event_ids:
+        availability.publish(event_id)
+
+def cancel_tickets(db: Session, owner_id: int, ticket_ids: List[int]) -> List[int]:
     """
-    User: Fetches all tickets owned by a specific user.
+    User: Cancels the caller's booked tickets among `ticket_ids` and puts them back on sale,
+    in one transaction. The UPDATE only matches tickets still 'booked', so a ticket returns
+    its stock once however many cancels race for it. Returns the ids cancelled.
     """
-    # Uses .options(joinedload(models.Ticket.event)) for efficient fetching (optional optimization)
-    tickets = (
-        db.query(models.Ticket)
-        .filter(models.Ticket.owner_id == owner_id)
-        .all()
+    cancelled = db.execute(
+        update(models.Ticket)
+        .where(
+            models.Ticket.id.in_(ticket_ids),
+            models.Ticket.owner_id == owner_id,
+            models.Ticket.status == "booked",
+        )
+        .values(status="cancelled")
+        .returning(models.Ticket.id, models.Ticket.event_id, models.Ticket.booking_date)
+    ).all()
+    returned: Dict[int, int] = {}
+    for _, event_id, _ in cancelled:
+        returned[event_id] = returned.get(event_id, 0) + 1
+    _return_to_stock(db, returned)
+    _record_cancellations(db, cancelled)
+    db.commit()
+
+    _announce_returned(returned)
+    metrics.TICKETS_CANCELLED.labels("user").inc(len(cancelled))
+    return sorted(ticket_id for ticket_id, _, _ in cancelled)
+
+def cancel_ticket(db: Session, ticket_id: int, owner_id: int) -> models.Ticket:
+    """User: Cancels one of the caller's tickets; 404 if it is not theirs, 409 if it is not booked."""
+    cancelled = cancel_tickets(db, owner_id, [ticket_id])
+    ticket = db.scalars(
+        select(models.Ticket).where(models.Ticket.id == ticket_id, models.Ticket.owner_id == owner_id)
+    ).first()
+    if ticket is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket not found"
+        )
+    if not cancelled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Ticket is already {ticket.status}."
+        )
+    set_committed_value(ticket, "event", get_event_by_id(db, ticket.event_id))
+    return ticket
+
+def _release_open_holds(db: Session, event_id: int) -> int:
+    """Releases every open hold of an event and returns their stock. Returns the number of holds released."""
+    held = db.scalars(
+        update(models.Hold)
+        .where(models.Hold.event_id == event_id, models.Hold.status == "held")
+        .values(status="released")
+        .returning(models.Hold.quantity)
+    ).all()
+    if held:
+        _release_inventory(db, event_id, sum(held))
+    return len(held)
+
+def start_event_cancellation(db: Session, event_id: int) -> models.EventCancellation:
+    """
+    Admin: Cancels an event. In this transaction it goes off sale (inactive, so new
+    bookings fail) and its open holds are released; its booked tickets are cancelled
+    afterwards by cancel_event_tickets_batch, in batches (app/cancellations.py).
+    Calling it again for a finished cancellation re-checks the event's tickets.
+    The caller then drops the event from the cache.
+    """
+    db_event = _get_event_row(db, event_id)
+    db_event.is_active = False
+    db_event.version = models.Event.version + 1
+    released = _release_open_holds(db, event_id)
+
+    progress = db.get(models.EventCancellation, event_id)
+    if progress is None:
+        progress = models.EventCancellation(event_id=event_id, status="running", last_ticket_id=0, tickets_cancelled=0, holds_released=0)
+        db.add(progress)
+    elif progress.status == "done":
+        progress.status = "verifying"
+        progress.last_ticket_id = 0
+        progress.finished_at = None
+    progress.holds_released += released
+    db.commit()
+
+    availability.publish(event_id)
+    metrics.HOLDS_TOTAL.labels("released").inc(released)
+    return progress
+
+def cancel_event_tickets_batch(db: Session, event_id: int, batch_size: int = 500) -> Optional[models.EventCancellation]:
+    """
+    Cascade: Cancels the next `batch_size` booked tickets of a cancelled event and returns
+    their stock, in one short transaction. It locks only those tickets, the event's stock
+    row(s) and the progress row, never the tickets table, so bookings keep going between
+    and during batches. Returns the progress, or None if it is finished or another worker
+    is running a batch of it right now.
+    """
+    progress = db.scalars(
+        select(models.EventCancellation)
+        .where(models.EventCancellation.event_id == event_id, models.EventCancellation.status != "done")
+        .with_for_update(skip_locked=True)
+    ).first()
+    if progress is None:
+        db.rollback()
+        return None
+
+    # Keyset over ix_tickets_event_id_id; tickets a user is cancelling right now are skipped
+    ticket_ids = db.scalars(
+        select(models.Ticket.id)
+        .where(
+            models.Ticket.event_id == event_id,
+            models.Ticket.status == "booked",
+            models.Ticket.id > progress.last_ticket_id,
+        )
+        .order_by(models.Ticket.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    cancelled = 0
+    if ticket_ids:
+        rows = db.execute(
+            update(models.Ticket)
+            .where(models.Ticket.id.in_(ticket_ids), models.Ticket.status == "booked")
+            .values(status="cancelled")
+            .returning(models.Ticket.id, models.Ticket.event_id, models.Ticket.booking_date)
+        ).all()
+        cancelled = len(rows)
+        if cancelled:
+            _release_inventory(db, event_id, cancelled)
+            _record_cancellations(db, rows)
+        progress.last_ticket_id = ticket_ids[-1]
+        progress.tickets_cancelled += cancelled
+    elif progress.status == "running":
+        # Every ticket was visited once; one more pass from the start catches the ones
+        # that were locked or committed behind the cursor
+        progress.status = "verifying"
+        progress.last_ticket_id = 0
+    else:
+        progress.status = "done"
+        progress.finished_at = datetime.utcnow()
+    db.commit()
+
+    if cancelled:
+        _announce_returned([event_id])
+        metrics.TICKETS_CANCELLED.labels("event").inc(cancelled)
+    return progress
+
+def get_pending_cancellations(db: Session) -> List[int]:
+    """Cascade: Events whose cancellation still has tickets to go through."""
+    return db.scalars(
+        select(models.EventCancellation.event_id).where(models.EventCancellation.status != "done")
+    ).all()
+
+def get_event_cancellation(db: Session, event_id: int) -> Dict:
+    """Admin: Progress of an event's cancellation, with the booked tickets still left; 404 if it was never cancelled."""
+    progress = db.get(models.EventCancellation, event_id)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event was not cancelled"
+        )
+    remaining = db.scalar(
+        select(func.count(models.Ticket.id))
+        .where(models.Ticket.event_id == event_id, models.Ticket.status == "booked")
     )
-    return tickets
\ No newline at end of file
+    return {
+        "event_id": progress.event_id,
+        "status": progress.status,
+        "tickets_cancelled": progress.tickets_cancelled,
+        "holds_released": progress.holds_released,
+        "tickets_remaining": remaining,
+        "started_at": progress.started_at,
+        "updated_at": progress.updated_at,
+        "finished_at": progress.finished_at,
+    }
+
+def get_inventory_discrepancies(db: Session, event_ids: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Reconciliation: Events whose stock counter disagrees with their tickets and holds.
+    For every event, total_tickets == available (events row or shard sum) + booked
+    tickets + tickets in open holds. Run it on a quiet database (or accept in-flight noise).
+    """
+    booked = dict(db.execute(
+        select(models.Ticket.event_id, func.count(models.Ticket.id))
+        .where(models.Ticket.status == "booked")
+        .group_by(models.Ticket.event_id)
+    ).all())
+    held = dict(db.execute(
+        select(models.Hold.event_id, func.sum(models.Hold.quantity))
+        .where(models.Hold.status == "held")
+        .group_by(models.Hold.event_id)
+    ).all())
+    statement = select(models.Event)
+    if event_ids is not None:
+        statement = statement.where(models.Event.id.in_(event_ids))
+    discrepancies = []
+    for db_event in _with_shard_totals(db, db.scalars(statement).all()):
+        accounted = db_event.available_tickets + booked.get(db_event.id, 0) + int(held.get(db_event.id) or 0)
+        if accounted != db_event.total_tickets:
+            discrepancies.append({
+                "event_id": db_event.id,
+                "total_tickets": db_event.total_tickets,
+                "available_tickets": db_event.available_tickets,
+                "booked": booked.get(db_event.id, 0),
+                "held": int(held.get(db_event.id) or 0),
+            })
+    return discrepancies
+
+# --- Sales Rollup CRUD ---
+# sales_rollups holds tickets per (event, booking hour, status). Bookings and cancellations
+# only append their changes to sales_rollup_deltas, in their own transaction; the applier
+# (app/rollups.py) folds those into the rollups in batches. Everything that writes the
+# rollups starts with _lock_sales_state, so appliers, backfill chunks and repricing run
+# one at a time while bookings never wait for them.
+
+def _sales_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def _dialect_insert(dialect_name: str, table):
+    """INSERT with ON CONFLICT support for the dialect in use (PostgreSQL or SQLite)."""
+    return (postgresql.insert if dialect_name == "postgresql" else sqlite.insert)(table)
+
+def _record_sales(db: Session, changes: Dict[Tuple[int, datetime, str], int]) -> None:
+    """Appends {(event_id, bucket, status): tickets} to sales_rollup_deltas (no commit)."""
+    rows = [
+        {"event_id": event_id, "bucket": bucket, "status": ticket_status, "tickets": tickets}
+        for (event_id, bucket, ticket_status), tickets in sorted(changes.items()) if tickets
+    ]
+    if rows:
+        db.execute(insert(models.SalesRollupDelta), rows)
+
+def _record_bookings(db: Session, tickets: List[models.Ticket]) -> None:
+    changes: Dict[Tuple[int, datetime, str], int] = {}
+    for ticket in tickets:
+        key = (ticket.event_id, _sales_bucket(ticket.booking_date), "booked")
+        changes[key] = changes.get(key, 0) + 1
+    _record_sales(db, changes)
+
+def _record_cancellations(db: Session, cancelled: List[Tuple[int, int, datetime]]) -> None:
+    """
+    Moves just-cancelled tickets [(ticket_id, event_id, booking_date)] from 'booked' to
+    'cancelled' in their booking hour (no commit). Tickets booked before the rollups
+    existed are left to the backfill until its cursor has passed them. This runs after
+    the UPDATE that cancelled them: a backfill chunk covering them has either committed
+    its cursor already, or is waiting for their row locks and will read them cancelled.
+    """
+    state = db.execute(
+        select(models.SalesRollupState.tracked_from_ticket_id, models.SalesRollupState.backfill_cursor)
+    ).first()
+    changes: Dict[Tuple[int, datetime, str], int] = {}
+    for ticket_id, event_id, booking_date in cancelled:
+        if state is not None and state.backfill_cursor < ticket_id < state.tracked_from_ticket_id:
+            continue
+        bucket = _sales_bucket(booking_date)
+        changes[(event_id, bucket, "booked")] = changes.get((event_id, bucket, "booked"), 0) - 1
+        changes[(event_id, bucket, "cancelled")] = changes.get((event_id, bucket, "cancelled"), 0) + 1
+    _record_sales(db, changes)
+
+def _lock_sales_state(db: Session) -> bool:
+    """
+    Serializes rollup writers for the rest of the transaction: a row lock on PostgreSQL,
+    the database write lock on SQLite. False if the state row was never created (bootstrap).
+    """
+    return db.execute(
+        update(models.SalesRollupState)
+        .where(models.SalesRollupState.id == 1)
+        .values(updated_at=datetime.utcnow())
+    ).rowcount > 0
+
+def _reprice_sales(db: Session, *criteria) -> None:
+    """Sets revenue = tickets * the event's current price on the matching rollup rows (no commit)."""
+    price = select(models.Event.price).where(models.Event.id == models.SalesRollup.event_id).scalar_subquery()
+    db.execute(
+        update(models.SalesRollup)
+        .where(*criteria)
+        .values(revenue=models.SalesRollup.tickets * price)
+        .execution_options(synchronize_session=False)
+    )
+
+def install_sales_rollups(connection) -> None:
+    """
+    Bootstrap: Creates the state row once. Tickets booked from now on are counted as they
+    change; the ones already in the table are left to the backfill (python -m app.rollups).
+    """
+    next_ticket_id = (connection.scalar(select(func.max(models.Ticket.id))) or 0) + 1
+    connection.execute(
+        _dialect_insert(connection.dialect.name, models.SalesRollupState)
+        .values(id=1, tracked_from_ticket_id=next_ticket_id, backfill_cursor=0)
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+
+def apply_sales_deltas(db: Session, batch_size: int = 5000) -> int:
+    """
+    Applier: Folds the oldest `batch_size` pending changes into sales_rollups with one
+    upsert per (event, hour, status), reprices the rows it touched and deletes the
+    changes, in one transaction. Returns the number of changes applied.
+    """
+    _lock_sales_state(db)
+    deltas = db.execute(
+        select(
+            models.SalesRollupDelta.id, models.SalesRollupDelta.event_id, models.SalesRollupDelta.bucket,
+            models.SalesRollupDelta.status, models.SalesRollupDelta.tickets,
+        )
+        .order_by(models.SalesRollupDelta.id)
+        .limit(batch_size)
+    ).all()
+    if not deltas:
+        db.rollback()
+        return 0
+
+    totals: Dict[Tuple[int, datetime, str], int] = {}
+    for _, event_id, bucket, ticket_status, tickets in deltas:
+        totals[(event_id, bucket, ticket_status)] = totals.get((event_id, bucket, ticket_status), 0) + tickets
+    upsert = _dialect_insert(db.get_bind().dialect.name, models.SalesRollup)
+    db.execute(
+        upsert.on_conflict_do_update(
+            index_elements=["event_id", "bucket", "status"],
+            set_={"tickets": models.SalesRollup.tickets + upsert.excluded.tickets},
+        ),
+        [
+            {"event_id": event_id, "bucket": bucket, "status": ticket_status, "tickets": tickets, "revenue": 0}
+            for (event_id, bucket, ticket_status), tickets in sorted(totals.items())
+        ],
+    )
+    _reprice_sales(db, tuple_(models.SalesRollup.event_id, models.SalesRollup.bucket, models.SalesRollup.status).in_(sorted(totals)))
+    db.execute(delete(models.SalesRollupDelta).where(models.SalesRollupDelta.id.in_([row.id for row in deltas])))
+    db.commit()
+    metrics.SALES_DELTAS_APPLIED.inc(len(deltas))
+    return len(deltas)
+
+def backfill_sales_rollups(db: Session, chunk_size: int = 5000) -> Optional[int]:
+    """
+    Backfill: Counts the next `chunk_size` tickets booked before the rollups existed
+    (keyset over the primary key) and queues them as changes for the applier, in one
+    short transaction that also moves the cursor. Returns the number of tickets read,
+    or None once every older ticket is counted.
+    """
+    if not _lock_sales_state(db):
+        db.rollback()
+        return None
+    state = db.scalars(select(models.SalesRollupState).where(models.SalesRollupState.id == 1)).one()
+    if state.backfill_finished_at is not None:
+        db.rollback()
+        return None
+    # Locked, so a cancel of one of them waits for this chunk (see _record_cancellations)
+    rows = db.execute(
+        select(models.Ticket.id, models.Ticket.event_id, models.Ticket.booking_date, models.Ticket.status)
+        .where(models.Ticket.id > state.backfill_cursor, models.Ticket.id < state.tracked_from_ticket_id)
+        .order_by(models.Ticket.id)
+        .limit(chunk_size)
+        .with_for_update()
+    ).all()
+    if not rows:
+        state.backfill_finished_at = datetime.utcnow()
+        db.commit()
+        return None
+
+    changes: Dict[Tuple[int, datetime, str], int] = {}
+    for _, event_id, booking_date, ticket_status in rows:
+        key = (event_id, _sales_bucket(booking_date), ticket_status)
+        changes[key] = changes.get(key, 0) + 1
+    _record_sales(db, changes)
+    state.backfill_cursor = rows[-1].id
+    db.commit()
+    return len(rows)
+
+def get_sales_rollup_status(db: Session) -> Dict:
+    """Applier/Backfill: Changes not applied yet and how far the backfill got."""
+    state = db.get(models.SalesRollupState, 1)
+    return {
+        "pending_changes": db.scalar(select(func.count(models.SalesRollupDelta.id))),
+        "tracked_from_ticket_id": state.tracked_from_ticket_id if state else None,
+        "backfill_cursor": state.backfill_cursor if state else None,
+        "backfill_finished_at": state.backfill_finished_at if state else None,
+    }
+
+def _sales_totals(event_id: int, rows) -> Dict:
+    totals = {"event_id": event_id, "tickets_booked": 0, "tickets_cancelled": 0, "revenue_booked": 0, "revenue_cancelled": 0}
+    for ticket_status, tickets, revenue in rows:
+        if ticket_status in ("booked", "cancelled"):
+            totals[f"tickets_{ticket_status}"] += tickets
+            totals[f"revenue_{ticket_status}"] += revenue
+    return totals
+
+def get_event_sales(db: Session, event_id: int, query: Optional[schemas.SalesQuery] = None) -> Dict:
+    """
+    Admin: An event's tickets and revenue per booking hour and status, read from
+    sales_rollups (one row per hour and status, however many tickets were sold).
+    Changes reach the rollups within one applier interval.
+    """
+    query = query or schemas.SalesQuery()
+    get_event_by_id(db, event_id)
+    statement = (
+        select(models.SalesRollup.bucket, models.SalesRollup.status, models.SalesRollup.tickets, models.SalesRollup.revenue)
+        .where(models.SalesRollup.event_id == event_id, models.SalesRollup.tickets != 0)
+        .order_by(models.SalesRollup.bucket, models.SalesRollup.status)
+    )
+    if query.start is not None:
+        statement = statement.where(models.SalesRollup.bucket >= _sales_bucket(query.start))
+    if query.end is not None:
+        statement = statement.where(models.SalesRollup.bucket < query.end)
+    rows = db.execute(statement).all()
+    return {
+        **_sales_totals(event_id, ((row.status, row.tickets, row.revenue) for row in rows)),
+        "buckets": [row._asdict() for row in rows],
+    }
+
+def get_sales_totals(db: Session, event_ids: Optional[List[int]] = None) -> List[Dict]:
+    """Admin: Tickets and revenue by status for every event with sales (or just `event_ids`), from sales_rollups."""
+    statement = (
+        select(
+            models.SalesRollup.event_id, models.SalesRollup.status,
+            func.sum(models.SalesRollup.tickets), func.sum(models.SalesRollup.revenue),
+        )
+        .group_by(models.SalesRollup.event_id, models.SalesRollup.status)
+        .order_by(models.SalesRollup.event_id)
+    )
+    if event_ids is not None:
+        statement = statement.where(models.SalesRollup.event_id.in_(event_ids))
+    by_event: Dict[int, list] = {}
+    for event_id, ticket_status, tickets, revenue in db.execute(statement):
+        by_event.setdefault(event_id, []).append((ticket_status, tickets, revenue))
+    return [_sales_totals(event_id, rows) for event_id, rows in by_event.items()]
+
+# --- Idempotency Key CRUD ---
+
+def _get_idempotency_key(db: Session, scope: str, principal: str, key: str) -> Optional[models.IdempotencyKey]:
+    return db.scalars(
+        select(models.IdempotencyKey).where(
+            models.IdempotencyKey.scope == scope,
+            models.IdempotencyKey.principal == principal,
+            models.IdempotencyKey.key == key,
+        )
+    ).first()
+
+def claim_idempotency_key(db: Session, scope: str, principal: str, key: str, request_hash: str, stale_after: float) -> Optional[models.IdempotencyKey]:
+    """
+    Claims a key for the request about to run. Returns None once claimed, or the
+    existing row (finished, or still running elsewhere) if another request got it first.
+    A claim neither finished nor refreshed (refresh_idempotency_key) for `stale_after`
+    seconds belongs to a crashed worker and is taken over.
+    """
+    try:
+        db.add(models.IdempotencyKey(scope=scope, principal=principal, key=key, request_hash=request_hash))
+        db.commit()
+        return None
+    except IntegrityError:
+        # The unique index decides races between workers
+        db.rollback()
+
+    existing = _get_idempotency_key(db, scope, principal, key)
+    if existing is None:
+        # Deleted by the TTL cleanup in between: try again from scratch
+        return claim_idempotency_key(db, scope, principal, key, request_hash, stale_after)
+    if existing.status_code is None and existing.created_at < datetime.utcnow() - timedelta(seconds=stale_after):
+        taken_over = db.execute(
+            update(models.IdempotencyKey)
+            .where(
+                models.IdempotencyKey.id == existing.id,
+                models.IdempotencyKey.status_code.is_(None),
+                models.IdempotencyKey.created_at == existing.created_at,
+            )
+            .values(created_at=datetime.utcnow(), request_hash=request_hash)
+        ).rowcount
+        db.commit()
+        if taken_over:
+            return None
+        db.refresh(existing)
+    return existing
+
+def refresh_idempotency_key(db: Session, scope: str, principal: str, key: str) -> None:
+    """Heartbeat of a claim whose request is still running, so it never looks stale."""
+    db.execute(
+        update(models.IdempotencyKey)
+        .where(
+            models.IdempotencyKey.scope == scope,
+            models.IdempotencyKey.principal == principal,
+            models.IdempotencyKey.key == key,
+            models.IdempotencyKey.status_code.is_(None),
+        )
+        .values(created_at=datetime.utcnow())
+    )
+    db.commit()
+
+def complete_idempotency_key(db: Session, scope: str, principal: str, key: str, status_code: int, response_body: str) -> None:
+    """Stores the response of a claimed key for later replays."""
+    db.execute(
+        update(models.IdempotencyKey)
+        .where(
+            models.IdempotencyKey.scope == scope,
+            models.IdempotencyKey.principal == principal,
+            models.IdempotencyKey.key == key,
+        )
+        .values(status_code=status_code, response_body=response_body)
+    )
+    db.commit()
+
+def release_idempotency_key(db: Session, scope: str, principal: str, key: str) -> None:
+    """Drops an unfinished claim whose request failed, so the client can retry with the same key."""
+    db.execute(
+        delete(models.IdempotencyKey).where(
+            models.IdempotencyKey.scope == scope,
+            models.IdempotencyKey.principal == principal,
+            models.IdempotencyKey.key == key,
+            models.IdempotencyKey.status_code.is_(None),
+        )
+    )
+    db.commit()
+
+def delete_expired_idempotency_keys(db: Session, older_than: datetime, batch_size: int = 1000) -> int:
+    """Deletes up to `batch_size` keys created before `older_than`; returns how many were deleted."""
+    expired_ids = select(models.IdempotencyKey.id).where(
+        models.IdempotencyKey.created_at < older_than
+    ).order_by(models.IdempotencyKey.created_at).limit(batch_size)
+    deleted = db.execute(
+        delete(models.IdempotencyKey).where(models.IdempotencyKey.id.in_(expired_ids.scalar_subquery()))
+    ).rowcount
+    db.commit()
+    return deleted
@@ -1,8 +1,14 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
+from app import metrics
 import os
-from typing import Generator
+import time
+from typing import Generator, AsyncGenerator, Callable, Union
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,23 +18,152 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise Exception("DATABASE_URL environment variable is not set in .env file.")
 
+# "sync": blocking sessions run in FastAPI's threadpool (psycopg2)
+# "async": AsyncSession on the event loop (asyncpg, or aiosqlite for local SQLite)
+DB_MODE = os.getenv("DB_MODE", "sync").lower()
+
+if DB_MODE not in ("sync", "async"):
+    raise Exception(f"DB_MODE must be 'sync' or 'async', got '{DB_MODE}'.")
+
+def _to_async_url(url: str) -> str:
+    """Maps a sync DATABASE_URL onto the matching asyncio driver."""
+    for prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+
+# Optional read replica: catalog and ticket-listing reads go there, writes stay on the primary
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+ASYNC_REPLICA_DATABASE_URL = os.getenv("ASYNC_REPLICA_DATABASE_URL") or (
+    _to_async_url(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else None
+)
+
+# Connection pool, per engine and per worker process (SQLAlchemy's defaults unless set).
+# A worker can hold up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections per engine.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", -1))  # Reconnect after N seconds (-1: never)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"  # Test connections on checkout
+
+
+class _InstrumentedPool:
+    """Pool mixin that reports how long each checkout waited for a connection."""
+    metrics_name = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            metrics.DB_POOL_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            metrics.DB_POOL_WAIT_SECONDS.labels(self.metrics_name).observe(time.perf_counter() - started)
+        if metrics.MULTIPROCESS:
+            self._store_gauges()
+        return record
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        if metrics.MULTIPROCESS:
+            self._store_gauges()
+
+    def _store_gauges(self) -> None:
+        # Multiprocess mode only exports stored values, never set_function callbacks
+        metrics.DB_POOL_CHECKED_OUT.labels(self.metrics_name).set(self.checkedout())
+        metrics.DB_POOL_OVERFLOW.labels(self.metrics_name).set(max(self.overflow(), 0))
+        metrics.DB_POOL_SIZE.labels(self.metrics_name).set(self.size())
+
+
+def _pool_options(url: str, name: str, async_driver: bool = False) -> dict:
+    """Engine keyword arguments for the configured pool, instrumented under `name`."""
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory SQLite keeps its single shared connection; there is nothing to size
+        return options
+    base_pool = AsyncAdaptedQueuePool if async_driver else QueuePool
+    options.update(
+        # recreate() (on dispose) builds the same class, so the metrics label survives
+        poolclass=type(f"{base_pool.__name__}_{name}", (_InstrumentedPool, base_pool), {"metrics_name": name}),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+def _export_pool_gauges(db_engine, name: str) -> None:
+    """Publishes checked-out/overflow/size gauges read live from the engine's current pool."""
+    if not isinstance(db_engine.pool, _InstrumentedPool) or metrics.MULTIPROCESS:
+        # Multiprocess mode: the pool stores them itself on every checkout and return
+        return
+    metrics.DB_POOL_CHECKED_OUT.labels(name).set_function(lambda: db_engine.pool.checkedout())
+    metrics.DB_POOL_OVERFLOW.labels(name).set_function(lambda: max(db_engine.pool.overflow(), 0))
+    metrics.DB_POOL_SIZE.labels(name).set_function(lambda: db_engine.pool.size())
+
+
+def _create_engine(url: str, name: str):
+    db_engine = create_engine(url, **_pool_options(url, name))
+    _export_pool_gauges(db_engine, name)
+    return db_engine
+
+
+def _create_async_engine(url: str, name: str):
+    db_engine = create_async_engine(url, **_pool_options(url, name, async_driver=True))
+    _export_pool_gauges(db_engine, name)
+    return db_engine
+
+
 #  Create the SQLAlchemy Engine
 # The engine manages connection pools and the dialect/driver (psycopg2)
-engine = create_engine(DATABASE_URL)
+# The sync engine is always created: startup DDL and scripts use it in both modes.
+engine = _create_engine(DATABASE_URL, "primary")
+# Without a replica, reads share the primary engine and its pool
+replica_engine = _create_engine(REPLICA_DATABASE_URL, "replica") if REPLICA_DATABASE_URL else engine
 
 # 2. Create the Session Local class
 SessionLocal = sessionmaker(
-    autocommit=False, 
-    autoflush=False, 
+    autocommit=False,
+    autoflush=False,
+    # Objects are only serialized after commit; keep their loaded state instead of re-SELECTing it
+    expire_on_commit=False,
     bind=engine
 )
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=replica_engine)
+
+# 2b. Async engine and session factory (only built in async mode, so asyncpg stays optional)
+async_engine = _create_async_engine(ASYNC_DATABASE_URL, "primary_async") if DB_MODE == "async" else None
+AsyncSessionLocal = (
+    async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    if async_engine is not None else None
+)
+async_replica_engine = (
+    _create_async_engine(ASYNC_REPLICA_DATABASE_URL, "replica_async")
+    if async_engine is not None and ASYNC_REPLICA_DATABASE_URL else async_engine
+)
+AsyncReadSessionLocal = (
+    async_sessionmaker(bind=async_replica_engine, autoflush=False, expire_on_commit=False)
+    if async_replica_engine is not None else None
+)
+
+# Either session type can be handed to route handlers, depending on DB_MODE
+DBSession = Union[Session, AsyncSession]
 
 # 3. Create the Base Class for Models
 # This is the base class from which all SQLAlchemy models will inherit.
 Base = declarative_base()
 
 # 4. Database Session Dependency
-def get_db() -> Generator:
+def get_sync_db() -> Generator:
     """
     Dependency function for FastAPI routes to manage the database session lifecycle.
     """
@@ -38,4 +173,60 @@ def get_db() -> Generator:
         yield db
     finally:
         # Ensure the session is closed after the request is processed
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncGenerator:
+    """
+    Async variant of get_sync_db: yields an AsyncSession bound to the asyncio driver.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+get_db = get_async_db if DB_MODE == "async" else get_sync_db
+
+def get_sync_read_db() -> Generator:
+    """
+    Like get_sync_db, but on the read replica (REPLICA_DATABASE_URL) when one is configured.
+    Only for read-only endpoints that can tolerate replication lag.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db() -> AsyncGenerator:
+    """Async variant of get_sync_read_db."""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+get_read_db = get_async_read_db if DB_MODE == "async" else get_sync_read_db
+
+async def run_db(db: DBSession, fn: Callable, *args, **kwargs):
+    """
+    Awaits a crud function with either session type.
+
+    crud functions are written once against a sync Session. On an AsyncSession
+    they run through run_sync(), which drives the asyncio driver from a greenlet
+    so the event loop is never blocked; on a sync Session they go to the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+async def run_in_session(fn: Callable, *args, **kwargs):
+    """
+    Runs a crud function in a fresh session of the configured DB_MODE.
+    Used by background tasks, which have no request-scoped get_db session.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await run_db(db, fn, *args, **kwargs)
+
+    def _run():
+        db = SessionLocal()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+    return await run_in_threadpool(_run)
@@ -1,10 +1,22 @@
 from fastapi import Depends, HTTPException, status
 from typing import Dict
 from app.auth import oauth2_scheme, decode_access_token
+from app.cache import TTLCache
+from app.database import get_db, run_db, DBSession
+from app import crud
+import os
+
+# Tokens issued before the 'uid' claim existed are resolved through this cache
+# until they expire (ACCESS_TOKEN_EXPIRE_MINUTES bounds the migration window).
+LEGACY_UID_CACHE_SIZE = int(os.getenv("LEGACY_UID_CACHE_SIZE", 10000))
+LEGACY_UID_CACHE_TTL_SECONDS = int(os.getenv("LEGACY_UID_CACHE_TTL_SECONDS", 300))
+
+_legacy_user_ids = TTLCache(maxsize=LEGACY_UID_CACHE_SIZE, ttl=LEGACY_UID_CACHE_TTL_SECONDS)
 
 def get_current_user_details(token: str = Depends(oauth2_scheme)) -> Dict[str, str]:
     """
-    Decodes the JWT token provided in the Authorization header and extracts user/role.
+    Decodes the JWT token provided in the Authorization header and extracts user/role/id.
+    'user_id' is None for tokens issued before the 'uid' claim was added.
     """
     # decode_access_token is imported from app.auth
     payload = decode_access_token(token)
@@ -17,13 +29,34 @@ def get_current_user_details(token: str = Depends(oauth2_scheme)) -> Dict[str, s
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload (missing username or role)",
         )
-    return {"username": username, "role": role}
+    return {"username": username, "role": role, "user_id": payload.get("uid")}
 
 #  Ensures the user is logged in (used for booking/viewing tickets)
 def user_required(current_user: Dict = Depends(get_current_user_details)):
     """Ensures the user is authenticated (applies to 'user' and 'admin')."""
     return current_user
 
+# Resolves the caller's user id, normally straight from the token (no DB query)
+async def user_id_required(
+    current_user: Dict = Depends(user_required),
+    db: DBSession = Depends(get_db)
+) -> int:
+    """
+    Returns the authenticated user's id from the 'uid' claim.
+    Legacy tokens without it fall back to a TTL-bounded username -> id cache.
+    """
+    if current_user["user_id"] is not None:
+        return current_user["user_id"]
+
+    user_id = _legacy_user_ids.get(current_user["username"])
+    if user_id is None:
+        owner = await run_db(db, crud.get_user_by_username, username=current_user["username"])
+        if not owner:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        user_id = owner.id
+        _legacy_user_ids.set(current_user["username"], user_id)
+    return user_id
+
 # Enforces Admin Role (used for Event CRUD)
 def admin_required(current_user: Dict = Depends(get_current_user_details)):
     """
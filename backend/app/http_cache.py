@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
+import os
+
+load_dotenv()
+
+# Cache-Control of the public catalog: how long a CDN / reverse proxy / browser may
+# reuse a response without asking, and how long past that it may serve it while it
+# revalidates in the background (0 = not sent). Stock counts are part of the
+# response, so keep max-age in the range of CACHE_AVAILABILITY_TTL_SECONDS.
+CATALOG_MAX_AGE_SECONDS = int(os.getenv("CATALOG_MAX_AGE_SECONDS", 2))
+CATALOG_STALE_WHILE_REVALIDATE_SECONDS = int(os.getenv("CATALOG_STALE_WHILE_REVALIDATE_SECONDS", 0))
+
+# Conditional GETs on the catalog. Validators come from crud.get_event_validators:
+# (version, available_tickets, updated_at) per event. The ETag covers exactly what
+# the response shows (the event's details via version, plus its stock), so two
+# equal tags always mean equal bodies.
+
+
+def entity_tag(event_ids: Iterable[int], validators: Dict[int, Tuple]) -> str:
+    """Strong ETag for a response listing `event_ids` in this order."""
+    digest = hashlib.sha1()
+    for event_id in event_ids:
+        version, available, _ = validators[event_id]
+        digest.update(f"{event_id}:{version}:{available};".encode())
+    return f'"{digest.hexdigest()}"'
+
+def last_modified(validators: Tuple) -> Optional[datetime]:
+    """When the event (or its stock) last changed, to the second; None for rows older than the column."""
+    updated_at = validators[2]
+    return updated_at.replace(microsecond=0) if updated_at is not None else None
+
+def cache_headers(etag: str, modified: Optional[datetime] = None) -> Dict[str, str]:
+    """ETag, Last-Modified and Cache-Control for a catalog response (200 and 304 alike)."""
+    cache_control = f"public, max-age={CATALOG_MAX_AGE_SECONDS}"
+    if CATALOG_STALE_WHILE_REVALIDATE_SECONDS:
+        cache_control += f", stale-while-revalidate={CATALOG_STALE_WHILE_REVALIDATE_SECONDS}"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+def not_modified(request: Request, etag: str, modified: Optional[datetime] = None) -> bool:
+    """
+    Evaluates If-None-Match, or If-Modified-Since when no If-None-Match was sent
+    (RFC 9110, 13.2.2). Unparseable dates are ignored.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: W/"x" matches "x"
+        return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return modified.replace(tzinfo=timezone.utc) <= since
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    """304 carrying the same validators and Cache-Control a 200 would have."""
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,223 @@
+from dotenv import load_dotenv
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+from app import crud, metrics
+from app.cache import TTLCache
+from app.database import run_db, run_in_session, DBSession, DB_POOL_TIMEOUT
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long a key (and its stored response) stays replayable
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", 86400))
+# In-memory LRU in front of the table: retry storms are answered without a query
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+IDEMPOTENCY_CACHE_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_CACHE_TTL_SECONDS", 600))
+# A running request refreshes its claim this often, however long it waits on the pool,
+# the write-behind batcher or a slow commit
+IDEMPOTENCY_HEARTBEAT_SECONDS = float(os.getenv("IDEMPOTENCY_HEARTBEAT_SECONDS", 5))
+# A claim not refreshed for this long belongs to a dead worker and may be taken over.
+# A refresh can itself wait DB_POOL_TIMEOUT for a connection, so this must be well above
+# both, or a retry could take over a live claim and book again
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", 300))
+if IDEMPOTENCY_LOCK_TIMEOUT_SECONDS < 2 * (DB_POOL_TIMEOUT + IDEMPOTENCY_HEARTBEAT_SECONDS):
+    raise ValueError(
+        f"IDEMPOTENCY_LOCK_TIMEOUT_SECONDS ({IDEMPOTENCY_LOCK_TIMEOUT_SECONDS:g}) must be at least twice "
+        f"DB_POOL_TIMEOUT + IDEMPOTENCY_HEARTBEAT_SECONDS ({DB_POOL_TIMEOUT + IDEMPOTENCY_HEARTBEAT_SECONDS:g})"
+    )
+# How often a duplicate polls for a response that another worker is still producing
+IDEMPOTENCY_POLL_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL_SECONDS", 0.05))
+IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS", 600))
+IDEMPOTENCY_CLEANUP_BATCH_SIZE = int(os.getenv("IDEMPOTENCY_CLEANUP_BATCH_SIZE", 1000))
+
+# (scope, principal, key) -> (request_hash, status_code, response_body)
+_responses = TTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_CACHE_TTL_SECONDS)
+# Keys currently being processed by this worker; duplicates wait on the future
+_in_flight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+
+
+def request_hash(*parts: Any) -> str:
+    """Fingerprints the request a key was first used with."""
+    return hashlib.sha256(json.dumps(jsonable_encoder(parts), sort_keys=True).encode()).hexdigest()
+
+
+def _check_same_request(stored_hash: str, expected_hash: str) -> None:
+    if stored_hash != expected_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request."
+        )
+
+
+def _replay(stored: Tuple[str, int, str], expected_hash: str, source: str) -> Response:
+    stored_hash, status_code, body = stored
+    _check_same_request(stored_hash, expected_hash)
+    metrics.IDEMPOTENCY_REPLAYS.labels(source).inc()
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def run_idempotent(
+    db: DBSession,
+    scope: str,
+    principal: str,
+    key: Optional[str],
+    expected_hash: str,
+    handler: Callable[[], Awaitable[Any]],
+    response_model: Any,
+    status_code: int = status.HTTP_201_CREATED,
+    precondition: Optional[Callable[[], Awaitable[Any]]] = None,
+) -> Any:
+    """
+    Runs `handler` at most once per (scope, principal, key).
+
+    Without a key the handler just runs. With one, a stored response is replayed
+    from memory or the idempotency_keys table; a duplicate arriving while the first
+    request is still running waits for it (on a future in this worker, by polling the
+    table across workers) instead of booking again. Successes and 4xx errors are
+    stored; 5xx errors release the key so the retry runs for real. A request whose
+    client disconnects still runs to the end and stores its response.
+    `precondition` runs right before the handler, not for replays, and its errors
+    are never stored (e.g. the waiting room: a retry must be checked again).
+    """
+    if key is None:
+        if precondition is not None:
+            await precondition()
+        return await handler()
+
+    cache_key = (scope, principal, key)
+    while True:
+        stored = _responses.get(cache_key)
+        if stored is not None:
+            return _replay(stored, expected_hash, "memory")
+        running = _in_flight.get(cache_key)
+        if running is None:
+            break
+        # Same key already running in this worker: wait for it, then look again
+        await asyncio.shield(running)
+
+    done = asyncio.get_running_loop().create_future()
+    _in_flight[cache_key] = done
+    try:
+        return await _run_claimed(db, cache_key, expected_hash, handler, response_model, status_code, precondition)
+    finally:
+        del _in_flight[cache_key]
+        done.set_result(None)
+
+
+async def _run_claimed(db, cache_key, expected_hash, handler, response_model, status_code, precondition) -> Any:
+    # 1. Claim the key in the table (the unique index settles races between workers)
+    while True:
+        existing = await run_db(
+            db, crud.claim_idempotency_key, *cache_key,
+            request_hash=expected_hash, stale_after=IDEMPOTENCY_LOCK_TIMEOUT_SECONDS,
+        )
+        if existing is None:
+            break
+        if existing.status_code is not None:
+            stored = (existing.request_hash, existing.status_code, existing.response_body)
+            _responses.set(cache_key, stored)
+            return _replay(stored, expected_hash, "db")
+        _check_same_request(existing.request_hash, expected_hash)
+        # Still running in another worker
+        await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL_SECONDS)
+
+    # 2. Not a replay: check the precondition, releasing the key if it refuses
+    if precondition is not None:
+        try:
+            await precondition()
+        except Exception:
+            await run_in_session(crud.release_idempotency_key, *cache_key)
+            raise
+
+    # 3. Run the request and store whatever it answered, in a task of its own: a client
+    # that disconnects cancels this coroutine, but not a booking that may already be
+    # committing (threadpool thread, batcher), and a retry must replay that booking
+    task = asyncio.ensure_future(_complete(db, cache_key, expected_hash, handler, response_model, status_code))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        # Keep the request, and the session the handler uses, open until it is done
+        while not task.done():
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                pass
+        if not task.cancelled():
+            task.exception()  # Stored or released already; the client is gone
+        raise
+
+
+async def _complete(db, cache_key, expected_hash, handler, response_model, status_code) -> Response:
+    # The claim stays fresh until the response is stored (or the key released)
+    heartbeat = asyncio.create_task(_heartbeat(cache_key))
+    try:
+        return await _finish(db, cache_key, expected_hash, handler, response_model, status_code)
+    finally:
+        heartbeat.cancel()
+
+
+async def _heartbeat(cache_key) -> None:
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_HEARTBEAT_SECONDS)
+        try:
+            await run_in_session(crud.refresh_idempotency_key, *cache_key)
+        except Exception:
+            logger.warning("Could not refresh idempotency key claim", exc_info=True)
+
+
+async def _finish(db, cache_key, expected_hash, handler, response_model, status_code) -> Response:
+    try:
+        result = await handler()
+    except HTTPException as e:
+        if e.status_code >= 500:
+            await run_in_session(crud.release_idempotency_key, *cache_key)
+            raise
+        await _store(db, cache_key, expected_hash, e.status_code, json.dumps({"detail": e.detail}))
+        raise
+    except asyncio.CancelledError:
+        # Worker shutting down mid-request: whether it committed is unknown, so the claim
+        # stays in flight until it goes stale rather than letting a retry book again
+        raise
+    except Exception:
+        # The handler's transaction failed and was rolled back: let the retry run for real
+        await run_in_session(crud.release_idempotency_key, *cache_key)
+        raise
+
+    body = json.dumps(jsonable_encoder(TypeAdapter(response_model).validate_python(result, from_attributes=True)))
+    await _store(db, cache_key, expected_hash, status_code, body)
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
+async def _store(db, cache_key, expected_hash, status_code: int, body: str) -> None:
+    await run_db(db, crud.complete_idempotency_key, *cache_key, status_code=status_code, response_body=body)
+    _responses.set(cache_key, (expected_hash, status_code, body))
+
+
+async def run_idempotency_cleanup() -> None:
+    """Background loop started with the app: deletes keys older than IDEMPOTENCY_KEY_TTL_SECONDS."""
+    while True:
+        try:
+            older_than = datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_KEY_TTL_SECONDS)
+            while await run_in_session(
+                crud.delete_expired_idempotency_keys, older_than, batch_size=IDEMPOTENCY_CLEANUP_BATCH_SIZE
+            ) == IDEMPOTENCY_CLEANUP_BATCH_SIZE:
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Idempotency key cleanup failed")
+        await asyncio.sleep(IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS)
@@ -0,0 +1,101 @@
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Optional
+from app import metrics
+import os
+import time
+
+load_dotenv()
+
+# Request/DB instrumentation; /metrics and the domain counters stay on either way
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+
+class QueryStats:
+    """Statements run on behalf of one request (shared with threadpool/greenlet copies of its context)."""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_request_queries: ContextVar[Optional[QueryStats]] = ContextVar("request_queries", default=None)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: in-flight gauge, per-route request counter and latency
+    histogram, and the number/time of SQL statements each request ran.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500  # Unhandled exceptions never send a response start
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        queries = QueryStats()
+        token = _request_queries.set(queries)
+        metrics.HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
+            _request_queries.reset(token)
+            route = _route_template(scope)
+            method = scope["method"]
+            metrics.labelled(metrics.HTTP_REQUESTS_TOTAL, method, route, str(status_code)).inc()
+            metrics.labelled(metrics.HTTP_REQUEST_SECONDS, method, route).observe(elapsed)
+            metrics.labelled(metrics.DB_QUERIES_PER_REQUEST, route).observe(queries.count)
+            metrics.labelled(metrics.DB_QUERY_SECONDS_PER_REQUEST, route).observe(queries.seconds)
+
+
+def _route_template(scope) -> str:
+    """
+    Path template of the matched route, e.g. /v1/events/{event_id}; 404s share one label.
+    Routes of included routers may only know their path below the prefix, so the
+    prefix is taken from the request path (path parameters never contain '/').
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    segments = scope["path"].split("/")
+    prefix = "/".join(segments[:len(segments) - template.count("/")])
+    return prefix + template
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Statements on one connection never overlap, so a single slot is enough
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"]
+    metrics.DB_QUERIES_TOTAL.inc()
+    metrics.DB_QUERY_SECONDS_TOTAL.inc(elapsed)
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.count += 1
+        queries.seconds += elapsed
+
+
+def instrument_queries() -> None:
+    """Times every statement on every engine (the async engines run on sync Engines underneath)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
@@ -1,29 +1,13 @@
 from fastapi import FastAPI
-from app.database import engine, Base, SessionLocal
-from app.api.v1 import login, events, tickets
-from app.models import User
-from app import schemas, crud
-from sqlalchemy.orm import Session 
-
-def create_db_and_tables():
-    Base.metadata.create_all(bind=engine)
-    
-def create_initial_admin(db: Session):
-    # Check if any user exists
-    if db.query(User).count() == 0:
-        # NOTE: The password must be 6+ characters to pass schema validation
-        # The email is REQUIRED by the database model (NotNullConstraint)
-        print("--- Creating initial Admin user (username: admin, password: admin123, email: admin@example.com) ---") 
-        try:
-            # FIX APPLIED HERE: Added the required 'email' field
-            admin_data = schemas.UserCreate(
-                username="admin", 
-                password="admin123",
-                email="admin@example.com"
-            )
-            crud.create_user(db, admin_data, is_admin=True)
-        except Exception as e:
-            print(f"Failed to create initial admin: {e}")
+from app.database import async_engine, async_replica_engine
+from app.api.v1 import login, events, tickets, holds, queue
+from app import auth, metrics, sweeper, batcher, idempotency, instrumentation, availability, cancellations, bootstrap, rollups, cache
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Event Ticketing API v1.0",
@@ -33,23 +17,86 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Per-route request metrics and per-request SQL statement counts (METRICS_ENABLED)
+if instrumentation.METRICS_ENABLED:
+    app.add_middleware(instrumentation.MetricsMiddleware)
+    instrumentation.instrument_queries()
+
 # 2. Define Startup Event Handler
 @app.on_event("startup")
 def on_startup():
-    """Run database initialization and create admin on application start."""
+    """
+    Run database initialization and create admin on application start
+    (BOOTSTRAP_ON_STARTUP; off when `python -m app.bootstrap` did it once for all workers).
+    """
+    # Before anything else: a per-process cache cannot be shared by several workers
+    cache.check_backend()
+    if not bootstrap.BOOTSTRAP_ON_STARTUP:
+        return
     print("Initializing Database...")
-    create_db_and_tables()
-    
-    db = SessionLocal()
-    create_initial_admin(db)
-    db.close()
+    bootstrap.bootstrap()
     print("Initialization complete.")
 
+@app.on_event("startup")
+async def warm_up_worker():
+    """Open connection pools and caches before the first request (WARMUP_ON_STARTUP)."""
+    if not bootstrap.WARMUP_ON_STARTUP:
+        return
+    started = time.perf_counter()
+    timings = await bootstrap.warm_up()
+    logger.info(
+        "Worker %d warmed up in %.3fs (%s)", os.getpid(), time.perf_counter() - started,
+        ", ".join(f"{step} {seconds:.3f}s" for step, seconds in timings.items()),
+    )
+
+# Long-running tasks owned by this worker, cancelled on shutdown
+background_tasks = []
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """
+    Start the hold expiry sweeper (HOLD_SWEEPER_ENABLED), the idempotency key cleanup,
+    the availability hub, the event cancellation cascade and the sales rollup applier.
+    """
+    if sweeper.HOLD_SWEEPER_ENABLED:
+        background_tasks.append(asyncio.create_task(sweeper.run_hold_sweeper()))
+    background_tasks.append(asyncio.create_task(idempotency.run_idempotency_cleanup()))
+    background_tasks.append(asyncio.create_task(availability.run_hub()))
+    background_tasks.append(asyncio.create_task(cancellations.run_cancellations()))
+    background_tasks.append(asyncio.create_task(rollups.run_rollup_applier()))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Stop background tasks, the password pool and the async engine's connections (DB_MODE=async)."""
+    # Commit queued write-behind bookings while the database is still reachable
+    await batcher.shutdown_batcher()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    auth.shutdown_password_pool()
+    if async_engine is not None:
+        await async_engine.dispose()
+    if async_replica_engine is not None and async_replica_engine is not async_engine:
+        await async_replica_engine.dispose()
+    metrics.mark_worker_dead()
+
 
 # 3. Include API Routers (Handles API Versioning /v1/)
+# Login, registration and booking routes declare their own rate limits (app/ratelimit.py)
 app.include_router(login.router, prefix="/v1")
 app.include_router(events.router, prefix="/v1")
 app.include_router(tickets.router, prefix="/v1")
+app.include_router(holds.router, prefix="/v1")
+app.include_router(queue.router, prefix="/v1")
+
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """
+    Prometheus scrape endpoint. Reports all workers when PROMETHEUS_MULTIPROC_DIR is set;
+    otherwise only the worker that answers (run a single worker, or scrape each one).
+    """
+    return metrics.metrics_response()
 
 
 @app.get("/", tags=["Root"])
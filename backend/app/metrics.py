@@ -0,0 +1,230 @@
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+from fastapi import Response
+from typing import Any, Dict, Tuple
+import os
+
+# Several worker processes (uvicorn/gunicorn --workers): with PROMETHEUS_MULTIPROC_DIR set, every
+# worker writes its samples there and /metrics reports the sum over all of them. Without it each
+# worker only has its own, so a scrape sees whichever worker answered it. prometheus_client reads
+# the variable when it is imported: set it in the server's environment (not only .env), pointing
+# at an empty directory that is wiped before every start.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# --- HTTP Requests ---
+# route is the path template (/v1/events/{event_id}), never the raw path, to bound label cardinality
+
+HTTP_REQUESTS_TOTAL = Counter(
+    "http_requests_total",
+    "Requests handled, by route template and response status",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled",
+    multiprocess_mode="livesum",
+)
+
+# --- Database Queries ---
+
+DB_QUERIES_TOTAL = Counter(
+    "db_queries_total",
+    "SQL statements executed, including background tasks",
+)
+DB_QUERY_SECONDS_TOTAL = Counter(
+    "db_query_seconds_total",
+    "Time spent executing SQL statements",
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed while handling one request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 20, 50),
+)
+DB_QUERY_SECONDS_PER_REQUEST = Histogram(
+    "db_query_seconds_per_request",
+    "Time one request spent executing SQL statements",
+    ["route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+# --- Bookings / Logins ---
+
+BOOKINGS_TOTAL = Counter(
+    "bookings_total",
+    "Booking attempts per event",
+    ["event_id", "outcome"],  # succeeded, sold_out, failed
+)
+LOGINS_TOTAL = Counter(
+    "logins_total",
+    "Login attempts",
+    ["outcome"],  # success, failure
+)
+
+# --- Password Hashing Pool ---
+
+PASSWORD_QUEUE_DEPTH = Gauge(
+    "password_pool_queue_depth",
+    "bcrypt jobs submitted to the password pool and not yet finished",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds",
+    "CPU time of one bcrypt hash/verify inside the pool worker",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0),
+)
+PASSWORD_QUEUE_WAIT_SECONDS = Histogram(
+    "password_queue_wait_seconds",
+    "Time a bcrypt job waited for a free pool worker",
+    ["operation"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+PASSWORD_POOL_REJECTED = Counter(
+    "password_pool_rejected_total",
+    "bcrypt jobs rejected with 503 because the pool queue was full",
+    ["operation"],
+)
+
+# --- Holds / Reservations ---
+
+HOLDS_TOTAL = Counter(
+    "holds_total",
+    "Hold lifecycle transitions",
+    ["outcome"],  # created, confirmed, released, expired
+)
+HOLD_SWEEP_SECONDS = Histogram(
+    "hold_sweep_seconds",
+    "Duration of one expiry sweeper batch",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# --- Cancellations ---
+
+TICKETS_CANCELLED = Counter(
+    "tickets_cancelled_total",
+    "Tickets cancelled and put back on sale",
+    ["source"],  # user, event
+)
+CANCEL_BATCH_SECONDS = Histogram(
+    "event_cancel_batch_seconds",
+    "Duration of one event cancellation cascade batch",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# --- Sales Rollups ---
+
+SALES_DELTAS_APPLIED = Counter(
+    "sales_rollup_deltas_applied_total",
+    "Ticket changes folded into the sales rollups",
+)
+SALES_APPLY_SECONDS = Histogram(
+    "sales_rollup_apply_seconds",
+    "Duration of one sales rollup applier batch",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# --- Rate Limiting ---
+
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests refused with 429 because one of their token buckets was empty",
+    ["route_class"],  # login, register, booking, default
+)
+RATE_LIMIT_ERRORS = Counter(
+    "rate_limit_backend_errors_total",
+    "Checks let through because the rate limit backend failed",
+)
+
+# --- Idempotency Keys ---
+
+IDEMPOTENCY_REPLAYS = Counter(
+    "idempotency_replays_total",
+    "Retried requests answered with a stored response",
+    ["source"],  # memory, db
+)
+
+# --- Availability Stream ---
+
+AVAILABILITY_SUBSCRIBERS = Gauge(
+    "availability_stream_subscribers",
+    "Open Server-Sent Events availability streams",
+    multiprocess_mode="livesum",
+)
+AVAILABILITY_MESSAGES = Counter(
+    "availability_stream_messages_total",
+    "Coalesced stock updates handed to subscribers (one per subscriber per update)",
+)
+AVAILABILITY_REJECTED = Counter(
+    "availability_stream_rejected_total",
+    "Streams refused with 503 because the worker was at AVAILABILITY_MAX_SUBSCRIBERS",
+)
+
+# --- Database Connection Pools ---
+# One label value per engine: primary, replica, and their *_async twins in DB_MODE=async.
+# Gauges of live workers are summed across processes in multiprocess mode (livesum).
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond pool_size (bounded by DB_MAX_OVERFLOW)",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured number of persistent connections",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Time a checkout waited for a connection (including opening a new one)",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT seconds",
+    ["pool"],
+)
+
+# --- Labelled Children ---
+
+_children: Dict[Tuple[Any, Tuple[str, ...]], Any] = {}
+
+def labelled(metric: Any, *values: str) -> Any:
+    """
+    metric.labels(*values), memoised in a plain dict: hot paths do a lock-free
+    lookup instead of going through labels(), which takes the metric's lock.
+    """
+    child = _children.get((metric, values))
+    if child is None:
+        # Racing threads both get the same child back from labels(), so this is safe
+        child = _children[(metric, values)] = metric.labels(*values)
+    return child
+
+# --- Exposition ---
+
+def metrics_response() -> Response:
+    """Renders every registered metric in the Prometheus text format, over all workers in multiprocess mode."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+def mark_worker_dead() -> None:
+    """Drops this worker's live gauges from the multiprocess totals (worker shutdown)."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
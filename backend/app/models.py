@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Numeric, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from uuid import uuid4
 from app.database import Base 
 
 class User(Base):
@@ -21,6 +22,16 @@ class User(Base):
 class Event(Base):
     """Represents the 'events' table (Admin CRUD entity)."""
     __tablename__ = "events"
+    __table_args__ = (
+        # Keyset pagination of the public catalog: WHERE is_active ORDER BY date, id
+        Index("ix_events_active_date_id", "is_active", "date", "id"),
+        # Location-filtered catalog pages (partial: only active events are browsed)
+        Index(
+            "ix_events_active_location_date_id", "location", "date", "id",
+            postgresql_where=text("is_active"),
+            sqlite_where=text("is_active = 1"),
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
@@ -32,14 +43,43 @@ class Event(Base):
     available_tickets = Column(Integer, nullable=False) 
     price = Column(Numeric(10, 2), nullable=False)
     is_active = Column(Boolean, default=True)
+    # 0 = stock lives in available_tickets; N > 0 = stock is split across N inventory shards
+    inventory_shards = Column(Integer, default=0, nullable=False)
+    # HTTP validators (ETag / Last-Modified): version counts edits of the event's details,
+    # updated_at also moves with every UPDATE of the row, bookings included
+    version = Column(Integer, default=1, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship to tickets
     tickets = relationship("Ticket", back_populates="event")
+    shards = relationship("EventInventoryShard", back_populates="event")
+
+
+class EventInventoryShard(Base):
+    """Represents the 'event_inventory_shards' table (split stock counters for hot events)."""
+    __tablename__ = "event_inventory_shards"
+    __table_args__ = (UniqueConstraint("event_id", "shard_no"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+    shard_no = Column(Integer, nullable=False)
+    # Each booking only locks one shard row, so N bookings can commit in parallel
+    available_tickets = Column(Integer, nullable=False)
+    # Bookings of sharded events never touch the events row; Last-Modified reads this too
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    event = relationship("Event", back_populates="shards")
 
 
 class Ticket(Base):
     """Represents the 'tickets' table (User booking entity)."""
     __tablename__ = "tickets"
+    __table_args__ = (
+        # "My tickets" pages: WHERE owner_id = ? ORDER BY booking_date DESC, id DESC
+        Index("ix_tickets_owner_booking_date", "owner_id", "booking_date", "id"),
+        # Attendee export: WHERE event_id = ? ORDER BY id
+        Index("ix_tickets_event_id_id", "event_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     # Foreign Keys
@@ -51,4 +91,104 @@ class Ticket(Base):
     
     # Relationships
     owner = relationship("User", back_populates="tickets")
-    event = relationship("Event", back_populates="tickets")
\ No newline at end of file
+    event = relationship("Event", back_populates="tickets")
+
+
+class Hold(Base):
+    """Represents the 'holds' table (time-boxed reservations taken from stock before checkout)."""
+    __tablename__ = "holds"
+    __table_args__ = (
+        # The expiry sweeper only ever scans open holds, oldest expiry first
+        Index(
+            "ix_holds_open_expires_at", "expires_at",
+            postgresql_where=text("status = 'held'"),
+            sqlite_where=text("status = 'held'"),
+        ),
+    )
+
+    # Random, unguessable id handed to the client for confirm/release
+    id = Column(String(32), primary_key=True, default=lambda: uuid4().hex)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String, default="held", nullable=False)  # 'held', 'confirmed', 'released' or 'expired'
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class EventCancellation(Base):
+    """Represents the 'event_cancellations' table (progress of an event's ticket cancellation cascade)."""
+    __tablename__ = "event_cancellations"
+
+    event_id = Column(Integer, ForeignKey("events.id"), primary_key=True)
+    # 'running': first pass over the tickets; 'verifying': second pass from the start for
+    # tickets the first one could not see (locked, or committed behind the cursor); 'done'
+    status = Column(String, default="running", nullable=False)
+    # Keyset cursor: tickets up to this id were handled in the current pass
+    last_ticket_id = Column(Integer, default=0, nullable=False)
+    tickets_cancelled = Column(Integer, default=0, nullable=False)
+    holds_released = Column(Integer, default=0, nullable=False)
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class SalesRollup(Base):
+    """Represents the 'sales_rollups' table (tickets per event, booking hour and status, for admin analytics)."""
+    __tablename__ = "sales_rollups"
+
+    event_id = Column(Integer, ForeignKey("events.id"), primary_key=True)
+    # The hour the tickets were booked in; a cancelled ticket moves from 'booked' to
+    # 'cancelled' in the same hour, so the rows always equal a GROUP BY over tickets
+    bucket = Column(DateTime, primary_key=True)
+    status = Column(String, primary_key=True)  # 'booked' or 'cancelled'
+    tickets = Column(Integer, default=0, nullable=False)
+    # tickets * the event's current price, kept up to date when the price changes
+    revenue = Column(Numeric(14, 2), default=0, nullable=False)
+
+
+class SalesRollupDelta(Base):
+    """Represents the 'sales_rollup_deltas' table (ticket changes not yet folded into sales_rollups)."""
+    __tablename__ = "sales_rollup_deltas"
+
+    # Insert-only: bookings and cancellations append here in their own transaction and
+    # never touch a shared rollup row; app/rollups.py applies and deletes them in batches
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False)
+    tickets = Column(Integer, nullable=False)  # Negative when tickets left the status
+
+
+class SalesRollupState(Base):
+    """Represents the 'sales_rollup_state' table (one row: which tickets the rollups cover)."""
+    __tablename__ = "sales_rollup_state"
+
+    id = Column(Integer, primary_key=True)
+    # Tickets from this id on were counted as they were booked. Older ones (booked before
+    # the rollups existed) are counted by the backfill, python -m app.rollups
+    tracked_from_ticket_id = Column(Integer, nullable=False)
+    # Backfill keyset cursor: older tickets up to this id are counted
+    backfill_cursor = Column(Integer, default=0, nullable=False)
+    backfill_finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class IdempotencyKey(Base):
+    """Represents the 'idempotency_keys' table (stored responses replayed to retried requests)."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # One stored response per endpoint, caller and client-chosen key
+        UniqueConstraint("scope", "principal", "key"),
+        # TTL cleanup deletes the oldest keys first
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    scope = Column(String(64), nullable=False)  # Endpoint, e.g. 'tickets.book'
+    principal = Column(String(255), nullable=False)  # User id, '' on anonymous endpoints
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # A reused key must come with the same request
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is still running
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
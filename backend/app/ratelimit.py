@@ -0,0 +1,218 @@
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from itertools import islice
+from typing import Callable, Dict, List, Tuple
+from dotenv import load_dotenv
+from app import metrics
+from app.dependencies import user_required
+import logging
+import math
+import os
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Token buckets per route class and scope (ip, user, account). A request takes one
+# token from each of its buckets, or none at all and gets 429 + Retry-After.
+# The client address is request.client: behind a proxy, run uvicorn with
+# --proxy-headers --forwarded-allow-ips so it is the caller's, not the proxy's.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory | redis
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+# Buckets kept by the memory backend; past it, refilled buckets are dropped first
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+
+# (route_class, scope) -> (tokens per second, burst)
+RATE_LIMITS: Dict[Tuple[str, str], Tuple[float, float]] = {
+    ("login", "ip"): (1, 20),           # bcrypt: a handful of logins per address
+    ("login", "account"): (0.2, 10),    # Password guessing against one username from many addresses
+    ("register", "ip"): (0.2, 10),
+    ("booking", "user"): (2, 10),
+    ("booking", "ip"): (20, 100),       # Several buyers can share an address (NAT, offices)
+}
+# Only these routes are limited: catalog reads are served from caches and 304s, and
+# availability streams are capped by AVAILABILITY_MAX_SUBSCRIBERS
+
+
+def parse_limits(spec: str) -> Dict[Tuple[str, str], Tuple[float, float]]:
+    """
+    Parses RATE_LIMITS overrides, e.g. "booking.user=5:20,login.ip=2:40"
+    (class.scope=rate:burst), raising ValueError on anything else, so a typo
+    stops the server at startup instead of silently keeping the default.
+    """
+    limits = {}
+    for pair in spec.split(","):
+        if not pair.strip():
+            continue
+        try:
+            name, limit = pair.split("=")
+            key = tuple(name.strip().split("."))
+            rate, burst = (float(value) for value in limit.split(":"))
+        except ValueError:
+            raise ValueError(f"RATE_LIMITS: '{pair.strip()}' is not class.scope=rate:burst") from None
+        if key not in RATE_LIMITS:
+            known = ", ".join(".".join(name) for name in RATE_LIMITS)
+            raise ValueError(f"RATE_LIMITS: unknown limit '{name.strip()}' (one of {known})")
+        if not (rate > 0 and burst >= 1):
+            raise ValueError(f"RATE_LIMITS: '{pair.strip()}' needs a rate above 0 and a burst of at least 1")
+        limits[key] = (rate, burst)
+    return limits
+
+RATE_LIMITS.update(parse_limits(os.getenv("RATE_LIMITS", "")))
+
+# A bucket to take from: (key, rate, burst)
+Bucket = Tuple[str, float, float]
+
+
+# --- Bucket Backends ---
+# take() refills every bucket to `now`, then takes a token from each if all of them
+# have one. Returns 0.0 when the request may proceed, else the seconds until it could.
+
+class InMemoryRateLimiter:
+    """
+    Per-process buckets (one worker, or tests). Only used from the event loop thread,
+    and take() never awaits, so a check-and-take cannot interleave with another: no lock.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self._buckets: Dict[str, list] = {}  # key -> [tokens, last_update, full_at]
+        self._max_keys = max_keys
+
+    async def take(self, buckets: List[Bucket], now: float) -> float:
+        wait = 0.0
+        states = []
+        for key, rate, burst in buckets:
+            state = self._buckets.get(key)
+            if state is None:
+                tokens, last = burst, now
+            elif now > state[1]:
+                tokens, last = min(burst, state[0] + (now - state[1]) * rate), now
+            else:
+                tokens, last = state[0], state[1]
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / rate)
+            states.append((tokens - 1, last))
+        if wait:
+            return wait
+        for (key, rate, burst), (tokens, last) in zip(buckets, states):
+            self._buckets[key] = [tokens, last, last + (burst - tokens) / rate]
+        if len(self._buckets) > self._max_keys:
+            self._evict(now)
+        return 0.0
+
+    def _evict(self, now: float) -> None:
+        # A refilled bucket is the same as no bucket, so dropping those changes nothing
+        self._buckets = {key: state for key, state in self._buckets.items() if state[2] > now}
+        if len(self._buckets) > self._max_keys // 2:
+            # Still crowded (e.g. many addresses at once): forget the oldest half
+            for key in list(islice(self._buckets, len(self._buckets) - self._max_keys // 2)):
+                del self._buckets[key]
+
+
+class RedisRateLimiter:
+    """Buckets shared by every worker. RATE_LIMIT_REDIS_URL=fakeredis:// uses a local stand-in."""
+
+    # Same algorithm as InMemoryRateLimiter.take, atomically inside Redis, in one round trip
+    _TAKE = """
+    local now = tonumber(ARGV[1])
+    local wait = 0
+    local tokens, last = {}, {}
+    for i, key in ipairs(KEYS) do
+        local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+        local state = redis.call('HMGET', key, 'tokens', 'last')
+        tokens[i] = tonumber(state[1]) or burst
+        last[i] = tonumber(state[2]) or now
+        if now > last[i] then
+            tokens[i] = math.min(burst, tokens[i] + (now - last[i]) * rate)
+            last[i] = now
+        end
+        if tokens[i] < 1 then wait = math.max(wait, (1 - tokens[i]) / rate) end
+    end
+    if wait > 0 then return tostring(wait) end
+    for i, key in ipairs(KEYS) do
+        local rate, burst = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+        redis.call('HSET', key, 'tokens', tostring(tokens[i] - 1), 'last', tostring(last[i]))
+        -- Gone once refilled, when it would be back to burst anyway
+        redis.call('PEXPIRE', key, math.ceil((burst - tokens[i] + 1) / rate * 1000))
+    end
+    return '0'
+    """
+
+    def __init__(self, url: str):
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            self._client = fakeredis.FakeAsyncRedis()
+        else:
+            import redis.asyncio
+            self._client = redis.asyncio.Redis.from_url(url)
+        self._take = self._client.register_script(self._TAKE)
+
+    async def take(self, buckets: List[Bucket], now: float) -> float:
+        args = [repr(now)]
+        for _, rate, burst in buckets:
+            args += [repr(rate), repr(burst)]
+        return float(await self._take(keys=[f"rate-limit:{key}" for key, _, _ in buckets], args=args))
+
+
+_limiter = None
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = RedisRateLimiter(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_BACKEND == "redis" else InMemoryRateLimiter()
+    return _limiter
+
+
+# --- Enforcement ---
+
+async def check(route_class: str, identities: Dict[str, str]) -> None:
+    """
+    Takes a token from the route class's bucket for every scope in `identities`
+    (scope -> who, e.g. {"ip": "10.0.0.7"}), raising 429 when one of them is empty.
+    Scopes without a configured limit are ignored.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+    buckets = [
+        (f"{route_class}:{scope}:{who}", *RATE_LIMITS[(route_class, scope)])
+        for scope, who in identities.items() if (route_class, scope) in RATE_LIMITS
+    ]
+    if not buckets:
+        return
+    try:
+        wait = await get_limiter().take(buckets, time.time())
+    except Exception:
+        # The limiter protects the API; an unreachable Redis must not take the API down with it
+        metrics.RATE_LIMIT_ERRORS.inc()
+        logger.warning("Rate limiter unavailable, letting the request through", exc_info=True)
+        return
+    if wait:
+        metrics.labelled(metrics.RATE_LIMITED, route_class).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many requests. Retry in {math.ceil(wait)} seconds.",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+def rate_limited(route_class: str) -> Callable:
+    """Dependency for public routes: the route class's per-IP bucket."""
+    async def dependency(request: Request) -> None:
+        await check(route_class, {"ip": _client_ip(request)})
+    return dependency
+
+def user_rate_limited(route_class: str) -> Callable:
+    """Dependency for authenticated routes: the route class's per-user and per-IP buckets."""
+    async def dependency(request: Request, current_user: Dict = Depends(user_required)) -> None:
+        user = current_user["user_id"] if current_user["user_id"] is not None else current_user["username"]
+        await check(route_class, {"user": str(user), "ip": _client_ip(request)})
+    return dependency
+
+async def login_rate_limited(request: Request, form_data: OAuth2PasswordRequestForm = Depends()) -> None:
+    """Dependency for the login route: per-IP, and per submitted username whether or not it exists."""
+    await check("login", {"ip": _client_ip(request), "account": form_data.username.lower()})
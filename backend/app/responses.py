@@ -0,0 +1,36 @@
+from decimal import Decimal
+from fastapi.responses import JSONResponse
+from typing import Any
+import pydantic_core
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to pydantic-core's encoder
+    orjson = None
+
+# Response class for hot list endpoints that build their bodies as plain dicts.
+# Returning it from a route skips the response_model validation pass (the model
+# still documents the route in OpenAPI), so the handler owns the output shape.
+# It is deliberately not the app's default_response_class: any custom default
+# turns off FastAPI's own pydantic dump_json path for every other route.
+
+
+def _default(value: Any) -> Any:
+    # Same rendering as the schemas' JSON mode (prices are strings, not floats)
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Renders plain dicts/lists (datetimes and Decimals included) as compact JSON."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return pydantic_core.to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
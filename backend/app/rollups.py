@@ -0,0 +1,66 @@
+from dotenv import load_dotenv
+from app import crud, metrics
+from app.database import run_in_session
+import asyncio
+import logging
+import os
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Sales rollups (GET /v1/events/{event_id}/sales). Bookings and cancellations append their
+# changes to sales_rollup_deltas; every worker runs the applier loop below, which folds
+# them into sales_rollups. Appliers lock the rollup state row, so they take turns.
+SALES_APPLY_INTERVAL_SECONDS = float(os.getenv("SALES_APPLY_INTERVAL_SECONDS", 5))
+SALES_APPLY_BATCH_SIZE = int(os.getenv("SALES_APPLY_BATCH_SIZE", 5000))
+# Tickets read per backfill transaction (python -m app.rollups)
+SALES_BACKFILL_CHUNK_SIZE = int(os.getenv("SALES_BACKFILL_CHUNK_SIZE", 5000))
+
+
+async def apply_pending() -> int:
+    """Applies batches until no change is left; returns how many were applied."""
+    applied = 0
+    while True:
+        started = time.perf_counter()
+        count = await run_in_session(crud.apply_sales_deltas, batch_size=SALES_APPLY_BATCH_SIZE)
+        metrics.SALES_APPLY_SECONDS.observe(time.perf_counter() - started)
+        applied += count
+        if count < SALES_APPLY_BATCH_SIZE:
+            return applied
+
+
+async def run_rollup_applier() -> None:
+    """Background loop started with the app: applies pending sales changes every SALES_APPLY_INTERVAL_SECONDS."""
+    while True:
+        try:
+            await apply_pending()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Sales rollup batch failed")
+        await asyncio.sleep(SALES_APPLY_INTERVAL_SECONDS)
+
+
+async def backfill() -> int:
+    """
+    Counts the tickets booked before the rollups existed, one chunk per transaction,
+    applying as it goes. Resumes from the stored cursor; returns the tickets counted.
+    """
+    counted = 0
+    while (count := await run_in_session(crud.backfill_sales_rollups, chunk_size=SALES_BACKFILL_CHUNK_SIZE)) is not None:
+        counted += count
+        await apply_pending()
+        print(f"Backfilled {counted} tickets", flush=True)
+    await apply_pending()
+    return counted
+
+
+if __name__ == "__main__":
+    # Once, after the first deploy with rollups (and python -m app.bootstrap); safe to
+    # run while the API serves traffic, and again after an interruption:
+    #   python -m app.rollups
+    started = time.perf_counter()
+    total = asyncio.run(backfill())
+    print(f"Backfill complete: {total} tickets in {time.perf_counter() - started:.2f}s")
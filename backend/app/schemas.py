@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Literal
 from decimal import Decimal
 
 
@@ -42,11 +42,12 @@ class TokenData(BaseModel):
     """Schema for data retrieved from the JWT payload."""
     username: Optional[str] = None
     role: Optional[str] = None
+    user_id: Optional[int] = None
 
 # ----------------- 3. Event Schemas -----------------
 
 class EventBase(BaseModel):
-    """Base schema for creating and updating an Event."""
+    """Base schema for the public fields of an Event."""
     name: str = Field(..., max_length=100)
     description: Optional[str] = None
     date: datetime
@@ -55,14 +56,55 @@ class EventBase(BaseModel):
     price: Decimal = Field(..., gt=0)
 
 class EventCreate(EventBase):
-    pass 
+    """Admin: Schema for creating an Event, including how its stock is stored."""
+    # Optional "sharded inventory" mode for hot events (0 = single counter)
+    inventory_shards: int = Field(0, ge=0, le=64)
+
+class EventUpdate(EventCreate):
+    """Admin: Schema for updating an Event. Leaving out inventory_shards keeps the current sharding."""
+    pass
 
 
 class Event(EventBase, CoreSchema):
-    """Schema for returning Event data to the client."""
+    """Schema for returning Event data to the client (no storage details)."""
     id: int
     available_tickets: int
     is_active: bool
+
+class AdminEvent(Event):
+    """Schema for returning Event data to admins, with how its stock is stored."""
+    inventory_shards: int
+    
+class EventQuery(BaseModel):
+    """Query parameters for browsing the catalog (keyset-paginated on (date, id))."""
+    cursor: Optional[str] = Field(None, description="Opaque cursor from the previous page's X-Next-Cursor header")
+    limit: int = Field(100, ge=1, le=100)
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    location: Optional[str] = Field(None, max_length=100)
+    min_price: Optional[Decimal] = Field(None, ge=0)
+    max_price: Optional[Decimal] = Field(None, ge=0)
+    has_availability: Optional[bool] = None
+
+class EventSearchQuery(BaseModel):
+    """Query parameters for full-text search over active events (ranked, best match first)."""
+    q: str = Field(..., min_length=1, max_length=200, description="Words to find in name, location or description; the last one may be a prefix")
+    location: Optional[str] = Field(None, max_length=100)
+    cursor: Optional[str] = Field(None, description="Opaque cursor from the previous page's X-Next-Cursor header")
+    limit: int = Field(20, ge=1, le=100)
+
+class EventImportError(BaseModel):
+    """A rejected row of a bulk import; `line` is where the row ends in the uploaded file."""
+    line: int
+    errors: List[str]
+
+class EventImportResult(BaseModel):
+    """Outcome of a bulk event import: valid rows are created, invalid ones are listed."""
+    imported: int
+    failed: int
+    errors: List[EventImportError]
+    # True when more rows failed than are listed in `errors`
+    errors_truncated: bool = False
     
 # ----------------- 4. Ticket Schemas (User Booking) -----------------
 
@@ -75,4 +117,98 @@ class Ticket(CoreSchema):
     status: str
     
     # Optional nested structure to display event details with the ticket
-    event: Optional[Event] = None
\ No newline at end of file
+    event: Optional[Event] = None
+
+class BookingItem(BaseModel):
+    """One line of a bulk booking: `quantity` tickets for one event."""
+    event_id: int
+    quantity: int = Field(1, ge=1, le=20)
+
+class BookingRequest(BaseModel):
+    """Schema for booking several tickets, possibly across events, in one all-or-nothing request."""
+    items: List[BookingItem] = Field(..., min_length=1, max_length=20)
+
+# ----------------- 5. Hold Schemas (Checkout Reservations) -----------------
+
+class HoldCreate(BaseModel):
+    """Schema for reserving tickets for a limited time before checkout."""
+    event_id: int
+    quantity: int = Field(1, ge=1, le=20)
+
+class Hold(CoreSchema):
+    """Schema for returning a hold; confirm it before expires_at or the stock goes back on sale."""
+    id: str
+    event_id: int
+    owner_id: int
+    quantity: int
+    status: str
+    created_at: datetime
+    expires_at: datetime
+
+# ----------------- 6. Waiting Room Schemas -----------------
+
+class QueueStatus(BaseModel):
+    """Schema for a buyer's place in an event's waiting room."""
+    event_id: int
+    position: int
+    admitted: bool
+    estimated_wait_seconds: float
+    # Only returned when joining; send it as X-Queue-Token when booking
+    token: Optional[str] = None
+
+class TicketCancelRequest(BaseModel):
+    """Schema for cancelling several of the caller's tickets at once."""
+    ticket_ids: List[int] = Field(..., min_length=1, max_length=100)
+
+class TicketCancelResult(BaseModel):
+    """Which tickets were cancelled; the rest were not the caller's or no longer booked."""
+    cancelled: List[int]
+    not_cancelled: List[int]
+
+class EventCancellation(CoreSchema):
+    """Progress of an event cancellation: its booked tickets are cancelled in batches."""
+    event_id: int
+    status: str  # running, verifying, done
+    tickets_cancelled: int
+    holds_released: int
+    tickets_remaining: int
+    started_at: datetime
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class AttendeeExportQuery(BaseModel):
+    """Query parameters for exporting an event's ticket holders."""
+    format: Literal["csv", "ndjson"] = "csv"
+    status: Optional[str] = Field(None, max_length=20)
+
+class TicketQuery(BaseModel):
+    """Query parameters for listing the caller's tickets (keyset-paginated, newest first)."""
+    cursor: Optional[str] = Field(None, description="Opaque cursor from the previous page's X-Next-Cursor header")
+    limit: int = Field(100, ge=1, le=100)
+    status: Optional[str] = Field(None, max_length=20)
+
+# ----------------- 7. Sales Analytics Schemas (Admin) -----------------
+
+class SalesQuery(BaseModel):
+    """Query parameters for an event's hourly sales (booking hours, UTC)."""
+    start: Optional[datetime] = Field(None, description="First hour to include")
+    end: Optional[datetime] = Field(None, description="Only hours before this one")
+
+class SalesBucket(BaseModel):
+    """Tickets booked in one hour that are now in `status`, and what they are worth at the current price."""
+    bucket: datetime
+    status: str  # booked, cancelled
+    tickets: int
+    revenue: Decimal
+
+class SalesTotals(BaseModel):
+    """An event's tickets and revenue by current status."""
+    event_id: int
+    tickets_booked: int = 0
+    tickets_cancelled: int = 0
+    revenue_booked: Decimal = Decimal(0)
+    revenue_cancelled: Decimal = Decimal(0)
+
+class EventSales(SalesTotals):
+    """Hourly sales of one event; the totals cover the returned hours."""
+    buckets: List[SalesBucket]
@@ -0,0 +1,202 @@
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from app import schemas
+import base64
+import os
+import re
+
+load_dotenv()
+
+# Full-text search over events.name / location / description, best match first
+# (name weighs most, then location, then description) among the SEARCH_MAX_CANDIDATES
+# newest matches; the route flags pages of a query that matched more (X-Search-Truncated).
+#   Postgres: stored tsvector column events.search_vector + GIN index
+#   SQLite:   FTS5 table events_fts, kept in sync with events by triggers
+# Both rank alike: weighted hits of the query words per column (ts_rank's default
+# weights 1.0 / 0.4 / 0.2). No IDF: FTS5's bm25 re-reads every match of each word
+# to get it, which costs tens of ms for common words on a 1M-event catalog.
+# Neither lives in the ORM model: install_search_index() creates them at startup.
+
+# Postgres text search configuration (stemming and stop words)
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "english")
+if not re.fullmatch(r"[a-z_]+", SEARCH_LANGUAGE):
+    raise Exception("SEARCH_LANGUAGE must be the name of a text search configuration, e.g. 'english'.")
+# Matches ranked per query. Ranking is linear in the matches, so when a common word matches
+# more than this, only the most recently created ones are ranked (keeps latency flat with catalog size)
+# and responses carry X-Search-Truncated: true, so clients can ask the user to narrow the query
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", 1000))
+# Pages are addressed by offset into the ranking; this caps how deep they go
+SEARCH_MAX_RESULTS = min(int(os.getenv("SEARCH_MAX_RESULTS", 500)), SEARCH_MAX_CANDIDATES)
+
+_MAX_TERMS = 8
+_WORD = re.compile(r"\w+")
+
+
+# --- Index DDL ---
+
+def _postgres_ddl() -> List[str]:
+    def weighted(column: str, weight: str) -> str:
+        return f"setweight(to_tsvector('{SEARCH_LANGUAGE}'::regconfig, coalesce({column}, '')), '{weight}')"
+
+    vector = " || ".join([weighted("name", "A"), weighted("location", "B"), weighted("description", "C")])
+    return [
+        # Generated, so every write path keeps it current; stored, so ranking never re-parses the text
+        f"ALTER TABLE events ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_events_search_vector ON events USING GIN (search_vector)",
+    ]
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE events_fts USING fts5(
+        name, location, description,
+        content='events', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2',
+        prefix='1 2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+        INSERT INTO events_fts(rowid, name, location, description) VALUES (new.id, new.name, new.location, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+        INSERT INTO events_fts(events_fts, rowid, name, location, description) VALUES ('delete', old.id, old.name, old.location, old.description);
+    END""",
+    # Only edits of the indexed text: stock updates from bookings never touch the index
+    """CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF name, location, description ON events BEGIN
+        INSERT INTO events_fts(events_fts, rowid, name, location, description) VALUES ('delete', old.id, old.name, old.location, old.description);
+        INSERT INTO events_fts(rowid, name, location, description) VALUES (new.id, new.name, new.location, new.description);
+    END""",
+    # Indexes the rows that existed before the table did
+    "INSERT INTO events_fts(events_fts) VALUES ('rebuild')",
+]
+
+def _sqlite_hits(column: int, text_column: str) -> str:
+    # highlight() marks every matched phrase with a \x01; counting them needs no IDF
+    return f"coalesce(length(highlight(events_fts, {column}, char(1), '')) - length({text_column}), 0)"
+
+_SQLITE_SCORE = (
+    f"(1.0 * {_sqlite_hits(0, 'events.name')} + 0.4 * {_sqlite_hits(1, 'events.location')}"
+    f" + 0.2 * {_sqlite_hits(2, 'events.description')})"
+)
+
+def install_search_index(connection: Connection) -> None:
+    """Creates the text index for the connection's dialect if it is missing, indexing existing events."""
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        for statement in _postgres_ddl():
+            connection.execute(text(statement))
+    elif dialect == "sqlite":
+        if connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'events_fts'")).first() is None:
+            for statement in _SQLITE_DDL:
+                connection.execute(text(statement))
+
+
+# --- Queries ---
+
+def _terms(q: str) -> List[str]:
+    """Words of the query, lower-cased; anything else (quotes, operators) is dropped."""
+    return _WORD.findall(q.lower())[:_MAX_TERMS]
+
+def _is_prefix(q: str) -> bool:
+    """The last word is still being typed unless the query ends with a space or punctuation."""
+    return q[-1:].isalnum()
+
+def _fts5_match(terms: List[str], prefix: bool, location: Optional[str] = None) -> str:
+    # All words must match; the last one as a prefix (search-as-you-type)
+    match = " ".join(f'"{term}"' for term in terms) + ("*" if prefix else "")
+    location_terms = _terms(location or "")
+    if location_terms:
+        # Narrows the candidates through the index; the exact location is compared on events
+        match += ' location : "' + " ".join(location_terms) + '"'
+    return match
+
+def _tsquery(terms: List[str], prefix: bool) -> str:
+    return " & ".join(terms) + (":*" if prefix else "")
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"search|{offset}".encode()).decode()
+
+def decode_cursor(cursor: str) -> int:
+    """Parses a cursor from encode_cursor, raising 400 if it was tampered with."""
+    try:
+        kind, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if kind != "search" or int(offset) < 0:
+            raise ValueError(cursor)
+        return int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def _matches(db: Session, query: schemas.EventSearchQuery, terms: List[str]) -> Tuple[str, dict]:
+    """FROM/WHERE clause selecting the active events matching terms (and query.location), with its parameters."""
+    params = {}
+    location_filter = ""
+    if query.location is not None:
+        location_filter = " AND events.location = :location"
+        params["location"] = query.location
+    if db.get_bind().dialect.name == "postgresql":
+        params.update(config=SEARCH_LANGUAGE, query=_tsquery(terms, _is_prefix(query.q)))
+        return (
+            " FROM events WHERE events.search_vector @@ to_tsquery(CAST(:config AS regconfig), :query)"
+            " AND events.is_active" + location_filter
+        ), params
+    params["query"] = _fts5_match(terms, _is_prefix(query.q), query.location)
+    return (
+        " FROM events_fts JOIN events ON events.id = events_fts.rowid"
+        " WHERE events_fts MATCH :query AND events.is_active = 1" + location_filter
+    ), params
+
+def search_event_ids(db: Session, query: schemas.EventSearchQuery) -> List[int]:
+    """
+    Public: IDs of one page of active events matching every word of query.q, best match first
+    among the SEARCH_MAX_CANDIDATES most recently created matches (see is_truncated).
+    """
+    terms = _terms(query.q)
+    offset = decode_cursor(query.cursor) if query.cursor else 0
+    limit = min(query.limit, SEARCH_MAX_RESULTS - offset)
+    if not terms or limit <= 0:
+        return []
+
+    matches, params = _matches(db, query, terms)
+    params.update(limit=limit, offset=offset, candidates=SEARCH_MAX_CANDIDATES)
+    # Candidates are taken newest first, which both indexes serve without visiting
+    # every match; only the candidates are scored
+    if db.get_bind().dialect.name == "postgresql":
+        statement = text(
+            "SELECT candidates.id FROM ("
+            " SELECT events.id, events.search_vector" + matches +
+            " ORDER BY events.id DESC LIMIT :candidates"
+            ") AS candidates"
+            " ORDER BY ts_rank(candidates.search_vector, to_tsquery(CAST(:config AS regconfig), :query)) DESC,"
+            " candidates.id LIMIT :limit OFFSET :offset"
+        )
+    else:
+        statement = text(
+            "SELECT candidates.id FROM ("
+            " SELECT events.id, " + _SQLITE_SCORE + " AS score" + matches +
+            " ORDER BY events_fts.rowid DESC LIMIT :candidates"
+            ") AS candidates"
+            " ORDER BY candidates.score DESC, candidates.id LIMIT :limit OFFSET :offset"
+        )
+    return list(db.scalars(statement, params))
+
+def is_truncated(db: Session, query: schemas.EventSearchQuery) -> bool:
+    """
+    Public: True when more than SEARCH_MAX_CANDIDATES events match, so older matches were
+    left out of the ranking. Reads one index entry past the cap; nothing is scored.
+    """
+    terms = _terms(query.q)
+    if not terms:
+        return False
+    matches, params = _matches(db, query, terms)
+    params["candidates"] = SEARCH_MAX_CANDIDATES
+    return db.scalar(text("SELECT 1" + matches + " LIMIT 1 OFFSET :candidates"), params) is not None
+
+def next_cursor(served: int, query: schemas.EventSearchQuery) -> Optional[str]:
+    """Cursor for the page after one that served `served` results, or None when it was the last one."""
+    offset = (decode_cursor(query.cursor) if query.cursor else 0) + served
+    if served < query.limit or offset >= SEARCH_MAX_RESULTS:
+        return None
+    return encode_cursor(offset)
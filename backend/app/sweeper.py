@@ -0,0 +1,44 @@
+from dotenv import load_dotenv
+from app import crud, metrics
+from app.database import run_in_session
+import asyncio
+import logging
+import os
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Every worker may run a sweeper; batches lock with SKIP LOCKED so they never collide
+HOLD_SWEEPER_ENABLED = os.getenv("HOLD_SWEEPER_ENABLED", "true").lower() == "true"
+HOLD_SWEEP_INTERVAL_SECONDS = float(os.getenv("HOLD_SWEEP_INTERVAL_SECONDS", 5))
+HOLD_SWEEP_BATCH_SIZE = int(os.getenv("HOLD_SWEEP_BATCH_SIZE", 500))
+
+
+async def sweep_expired_holds() -> int:
+    """Expires overdue holds batch by batch until none are left; returns how many were expired."""
+    total = 0
+    while True:
+        started = time.perf_counter()
+        expired = await run_in_session(crud.expire_holds, batch_size=HOLD_SWEEP_BATCH_SIZE)
+        metrics.HOLD_SWEEP_SECONDS.observe(time.perf_counter() - started)
+        total += expired
+        if expired < HOLD_SWEEP_BATCH_SIZE:
+            return total
+        # Let bookings interleave with a large backlog instead of draining it in one go
+        await asyncio.sleep(0)
+
+
+async def run_hold_sweeper() -> None:
+    """Background loop started with the app: sweeps every HOLD_SWEEP_INTERVAL_SECONDS."""
+    while True:
+        try:
+            expired = await sweep_expired_holds()
+            if expired:
+                logger.info("Hold sweeper returned %d expired holds to stock", expired)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Hold sweeper batch failed")
+        await asyncio.sleep(HOLD_SWEEP_INTERVAL_SECONDS)
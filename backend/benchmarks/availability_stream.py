@@ -0,0 +1,199 @@
+"""
+Availability push (SSE) checks.
+
+1. Coalescing across workers: several AvailabilityHubs (simulated workers) share
+   an InProcessBroker, the stand-in for Redis. Every hub publishes stock changes
+   as fast as it can while subscribers on every hub record what they receive.
+   Fails if a subscriber got more than one message per event per interval or
+   did not end on the last published value.
+2. Idle memory: 10k subscribers parked on one hub, measured with tracemalloc
+   before and after a flood of updates (there are no per-subscriber queues, so
+   the flood must not grow it).
+3. End to end: SSE streams against the running API while tickets are booked.
+   Reports how long after the last booking every stream showed the final stock.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.availability_stream
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.availability_stream --idle-subscribers 10000 --http-subscribers 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+import httpx
+
+from app.availability import AvailabilityHub, InProcessBroker
+from app.database import Base, engine
+from benchmarks.booking_load import seed_event
+from benchmarks.common import login, serve
+
+
+async def _consume(hub: AvailabilityHub, event_id: int, received: list) -> None:
+    async for message in hub.stream(event_id, -1):
+        if message.startswith(b"event:"):
+            data = json.loads(message.split(b"data: ", 1)[1].split(b"\n", 1)[0])
+            received.append((time.monotonic(), data["available_tickets"]))
+
+
+async def coalescing(workers: int, subscribers: int, events: int, seconds: float, interval_ms: float) -> dict:
+    broker = InProcessBroker()
+    stock = {event_id: 1_000_000 for event_id in range(events)}  # Stands in for the database
+
+    async def read_stock(event_ids):
+        return {event_id: stock[event_id] for event_id in event_ids}
+
+    hubs = [
+        AvailabilityHub(broker, interval_ms=interval_ms, heartbeat_seconds=3600, read_stock=read_stock)
+        for _ in range(workers)
+    ]
+    runners = [asyncio.create_task(hub.run()) for hub in hubs]
+    inboxes = {}
+    consumers = []
+    for h, hub in enumerate(hubs):
+        for s in range(subscribers):
+            received = inboxes[(h, s)] = []
+            consumers.append(asyncio.create_task(_consume(hub, s % events, received)))
+    await asyncio.sleep(interval_ms / 1000)
+
+    published = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        # Every simulated worker commits a booking and announces it
+        for hub in hubs:
+            event_id = published % events
+            stock[event_id] -= 1
+            hub.publish(event_id)
+            published += 1
+        await asyncio.sleep(0)  # Let the tick loops run between bursts
+    await asyncio.sleep(3 * interval_ms / 1000)
+
+    for task in consumers + runners:
+        task.cancel()
+    await asyncio.gather(*consumers, *runners, return_exceptions=True)
+
+    # Messages after the initial one, per subscriber; gaps shorter than most of an interval mean no coalescing
+    min_gap = min(
+        (b[0] - a[0] for received in inboxes.values() for a, b in zip(received[1:], received[2:])),
+        default=None,
+    )
+    wrong_final = sum(1 for (h, s), received in inboxes.items() if not received or received[-1][1] != stock[s % events])
+    delivered = sum(len(received) - 1 for received in inboxes.values())
+    return {
+        "workers": workers,
+        "subscribers": workers * subscribers,
+        "updates_published": published,
+        "messages_delivered": delivered,
+        "messages_per_subscriber_per_second": round(delivered / (workers * subscribers) / seconds, 2),
+        "min_gap_ms": round(min_gap * 1000, 1) if min_gap is not None else None,
+        "wrong_final_value": wrong_final,
+    }
+
+
+async def idle_memory(subscribers: int, updates: int) -> dict:
+    updated = [0]
+
+    async def read_stock(event_ids):
+        return {event_id: updated[0] for event_id in event_ids}
+
+    hub = AvailabilityHub(InProcessBroker(), heartbeat_seconds=3600, read_stock=read_stock)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sink = []
+    consumers = [asyncio.create_task(_consume(hub, 1, sink)) for _ in range(subscribers)]
+    await asyncio.sleep(0.1)
+    sink.clear()  # What the subscribers received is the benchmark's, not the hub's
+    idle = tracemalloc.get_traced_memory()[0]
+
+    hub.broker.attach(hub)
+    for n in range(updates):
+        updated[0] = n
+        hub.publish(1)
+        await hub.tick()  # Subscribers are woken but only read the latest message
+    await asyncio.sleep(0.1)
+    sink.clear()
+    flooded = tracemalloc.get_traced_memory()[0]
+
+    for task in consumers:
+        task.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+    tracemalloc.stop()
+    return {
+        "subscribers": subscribers,
+        "bytes_per_idle_subscriber": round((idle - before) / subscribers),
+        "growth_after_updates_bytes": flooded - idle,
+        "open_after_cancel": hub.subscribers,
+    }
+
+
+async def end_to_end(base_url: str, event_id: int, headers: dict, subscribers: int, bookings: int) -> dict:
+    final = {}
+    connected = asyncio.Event()
+    limits = httpx.Limits(max_connections=subscribers + 10)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def watch(i: int):
+            async with client.stream("GET", f"/v1/events/{event_id}/availability") as response:
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        final[i] = (time.monotonic(), json.loads(line[5:])["available_tickets"])
+                        if len(final) == subscribers:
+                            connected.set()
+
+        watchers = [asyncio.create_task(watch(i)) for i in range(subscribers)]
+        await asyncio.wait_for(connected.wait(), 60)
+        for _ in range(bookings):
+            await client.post(f"/v1/tickets/book/{event_id}", headers=headers)
+        last_booking = time.monotonic()
+        expected = (await client.get(f"/v1/events/{event_id}")).json()["available_tickets"]
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and any(value != expected for _, value in final.values()):
+            await asyncio.sleep(0.05)
+        for task in watchers:
+            task.cancel()
+        await asyncio.gather(*watchers, return_exceptions=True)
+
+    stale = sum(1 for _, value in final.values() if value != expected)
+    return {
+        "subscribers": subscribers,
+        "bookings": bookings,
+        "stale_streams": stale,
+        "final_value_after_ms": round((max(at for at, _ in final.values()) - last_booking) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--subscribers", type=int, default=250, help="per simulated worker")
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--interval-ms", type=float, default=200)
+    parser.add_argument("--idle-subscribers", type=int, default=10000)
+    parser.add_argument("--http-subscribers", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=100)
+    args = parser.parse_args()
+
+    results = {
+        "coalescing": asyncio.run(coalescing(args.workers, args.subscribers, args.events, args.seconds, args.interval_ms)),
+        "idle_memory": asyncio.run(idle_memory(args.idle_subscribers, 1000)),
+    }
+
+    Base.metadata.create_all(bind=engine)
+    event_id = seed_event(args.bookings * 2)
+    with serve({"AVAILABILITY_PUSH_INTERVAL_MS": str(args.interval_ms)}) as base_url:
+        headers = login(base_url)
+        results["end_to_end"] = asyncio.run(end_to_end(base_url, event_id, headers, args.http_subscribers, args.bookings))
+
+    print(json.dumps(results, indent=2))
+    coalesced = results["coalescing"]
+    if coalesced["min_gap_ms"] is not None and coalesced["min_gap_ms"] < 0.5 * args.interval_ms:
+        raise SystemExit(f"Updates were not coalesced: two messages {coalesced['min_gap_ms']} ms apart")
+    if coalesced["wrong_final_value"] or results["end_to_end"]["stale_streams"]:
+        raise SystemExit("Some subscribers did not end on the latest stock")
+    if results["idle_memory"]["open_after_cancel"]:
+        raise SystemExit("Cancelled streams were not unsubscribed")
+
+
+if __name__ == "__main__":
+    main()
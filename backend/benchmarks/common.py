@@ -0,0 +1,108 @@
+"""
+Shared helpers for the HTTP benchmarks: run the API in a subprocess and
+drive it with an async httpx load generator.
+"""
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+# (method, path, request kwargs) as passed to httpx.AsyncClient.request
+Request = Tuple[str, str, dict]
+
+
+@contextlib.contextmanager
+def serve(env: Optional[Dict[str, str]] = None, port: int = 8765, workers: int = 1) -> Iterator[str]:
+    """Starts app.main:app with uvicorn under the given environment and yields its base URL."""
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+    # Load comes from one address and a few accounts: the rate limiter would refuse most of it
+    env = {"RATE_LIMIT_ENABLED": "false", **(env or {})}
+    if workers > 1:
+        # The default per-process cache refuses to run with several workers
+        env.setdefault("CACHE_BACKEND", "none")
+    proc = subprocess.Popen(command, env={**os.environ, **env}, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base_url)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + "/").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise SystemExit(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+def login(base_url: str, username: str = "bench-user", password: str = "bench-password") -> Dict[str, str]:
+    """Registers the benchmark user if needed and returns its Authorization header."""
+    httpx.post(f"{base_url}/v1/register", json={
+        "username": username, "email": f"{username}@example.com", "password": password,
+    })
+    response = httpx.post(f"{base_url}/v1/login/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> dict:
+    """Turns raw per-request latencies (seconds) into the JSON summary every benchmark reports."""
+    return {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def http_load(base_url: str, next_request: Callable[[int], Request], total: int, concurrency: int) -> dict:
+    """Sends `total` requests from `concurrency` concurrent clients; next_request(i) builds request i."""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def worker():
+            for i in counter:
+                method, path, kwargs = next_request(i)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **kwargs)
+                    code = response.status_code
+                except httpx.HTTPError:
+                    code = 0
+                latencies.append(time.perf_counter() - started)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, statuses, elapsed)
@@ -0,0 +1,111 @@
+"""
+Rate limiter accuracy and overhead.
+
+1. Accuracy: a client calling every millisecond for --seconds of simulated time
+   must get exactly burst + rate * seconds requests through, on both backends.
+   Also checks that a request refused by one bucket takes nothing from the others.
+2. Overhead: time per ratelimit.check() (one request's per-user and per-IP
+   buckets), for one busy user and for a spray of distinct addresses large
+   enough to trigger the memory backend's eviction. Fails if the memory
+   backend's median exceeds --budget-us (p99 is reported, but on a busy or
+   single-core machine it measures the scheduler more than the limiter):
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.rate_limit
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.rate_limit --redis-url redis://localhost:6379/0
+
+The redis backend runs against --redis-url (RATE_LIMIT_REDIS_URL, else an in-process
+fakeredis); against a real server its cost is one round trip per request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from fastapi import HTTPException
+
+from app import ratelimit
+from benchmarks.common import percentile
+
+
+def backends(redis_url: str) -> dict:
+    return {"memory": ratelimit.InMemoryRateLimiter(max_keys=10000), "redis": ratelimit.RedisRateLimiter(redis_url)}
+
+
+async def accuracy(limiter, seconds: float, rate: float = 10, burst: float = 20) -> dict:
+    key = f"accuracy:{time.time_ns()}"
+    allowed = 0
+    start = time.time()
+    for ms in range(int(seconds * 1000)):
+        allowed += await limiter.take([(key, rate, burst)], start + ms / 1000) == 0
+    expected = burst + int(rate * (seconds - 0.001))
+
+    # A request refused by its user bucket must leave its address bucket untouched
+    user, ip = f"user:{time.time_ns()}", f"ip:{time.time_ns()}"
+    for _ in range(3):
+        await limiter.take([(user, 1, 3)], start)
+    refused = await limiter.take([(user, 1, 3), (ip, 1, 1)], start)
+    ip_kept = await limiter.take([(ip, 1, 1)], start) == 0
+    return {"allowed": allowed, "expected": expected, "refused_wait_s": round(refused, 3), "ip_bucket_untouched": ip_kept}
+
+
+async def overhead(limiter, calls: int, distinct: bool) -> dict:
+    """Per-call latency of check() with `limiter` installed, in microseconds."""
+    ratelimit._limiter = limiter
+    samples = []
+    refused = 0
+    for i in range(calls):
+        if distinct:
+            identities = {"user": f"spray-{i}", "ip": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"}
+        else:
+            identities = {"user": "busy", "ip": "10.0.0.1"}
+        started = time.perf_counter_ns()
+        try:
+            await ratelimit.check("booking", identities)
+        except HTTPException:
+            refused += 1
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    return {
+        "calls": calls,
+        "refused": refused,
+        "p50_us": round(percentile(samples, 50), 2),
+        "p99_us": round(percentile(samples, 99), 2),
+        "mean_us": round(sum(samples) / len(samples), 2),
+    }
+
+
+async def run(args) -> dict:
+    results = {}
+    for name, limiter in backends(args.redis_url).items():
+        calls = args.calls if name == "memory" else args.calls // 10
+        results[name] = {
+            "accuracy": await accuracy(limiter, args.seconds),
+            "one_user": await overhead(limiter, calls, distinct=False),
+            "distinct_addresses": await overhead(limiter, calls, distinct=True),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200000, help="per memory run; the redis runs make a tenth")
+    parser.add_argument("--seconds", type=float, default=10.0, help="simulated time of the accuracy run")
+    parser.add_argument("--budget-us", type=float, default=20.0, help="memory backend median limit")
+    parser.add_argument("--redis-url", default=os.getenv("RATE_LIMIT_REDIS_URL", "fakeredis://"))
+    args = parser.parse_args()
+
+    ratelimit.RATE_LIMIT_ENABLED = True
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+
+    for name, result in results.items():
+        check = result["accuracy"]
+        if check["allowed"] != check["expected"] or not check["ip_bucket_untouched"]:
+            raise SystemExit(f"{name}: bucket accounting is off: {check}")
+    for run_name in ("one_user", "distinct_addresses"):
+        if results["memory"][run_name]["p50_us"] > args.budget_us:
+            raise SystemExit(f"memory backend median {results['memory'][run_name]['p50_us']} us is over the {args.budget_us} us budget")
+
+
+if __name__ == "__main__":
+    main()
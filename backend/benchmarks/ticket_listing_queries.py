@@ -0,0 +1,92 @@
+"""
+N+1 guard for the "my tickets" listing.
+
+Seeds a heavy user whose tickets span many events, then counts the SQL
+statements issued while loading *and serializing* pages of different sizes,
+with their timings, on any database and at any size. Exits non-zero if the
+count grows with the page size. The same check runs in CI on every push as
+tests/test_ticket_listing.py, through the HTTP route:
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.ticket_listing_queries
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+
+from app import crud, models, responses, schemas
+from app.database import Base, SessionLocal, engine
+
+# Ticket page joined with its events + shard totals for sharded events
+MAX_QUERIES_PER_PAGE = 2
+
+
+def seed_heavy_user(tickets: int, events: int) -> int:
+    """Creates a user owning `tickets` tickets spread over `events` events (every third one sharded)."""
+    db = SessionLocal()
+    try:
+        user = models.User(username=f"heavy-{time.time_ns()}", email=f"heavy-{time.time_ns()}@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        event_ids = [
+            crud.admin_create_event(db, schemas.EventCreate(
+                name=f"Heavy {i}",
+                date=datetime.utcnow() + timedelta(days=i),
+                location="Bench Arena",
+                total_tickets=tickets,
+                price=10,
+                inventory_shards=4 if i % 3 == 0 else 0,
+            )).id
+            for i in range(events)
+        ]
+        now = datetime.utcnow()
+        db.execute(insert(models.Ticket), [
+            {"event_id": event_ids[i % events], "owner_id": user.id, "status": "booked", "booking_date": now - timedelta(seconds=i)}
+            for i in range(tickets)
+        ])
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def count_queries(owner_id: int, query: schemas.TicketQuery):
+    """Returns (statements executed, tickets served, elapsed ms) for one serialized page."""
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        tickets = crud.get_user_ticket_rows(db, owner_id=owner_id, query=query)
+        responses.FastJSONResponse(tickets)
+        elapsed = (time.perf_counter() - started) * 1000
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", listener)
+    return len(statements), len(tickets), round(elapsed, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=500)
+    parser.add_argument("--events", type=int, default=60)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    owner_id = seed_heavy_user(args.tickets, args.events)
+
+    results = []
+    for limit in (1, 10, 100):
+        queries, served, elapsed = count_queries(owner_id, schemas.TicketQuery(limit=limit))
+        results.append({"limit": limit, "tickets": served, "queries": queries, "elapsed_ms": elapsed})
+    print(json.dumps(results, indent=2))
+
+    if max(r["queries"] for r in results) > MAX_QUERIES_PER_PAGE:
+        raise SystemExit(f"N+1 REGRESSION: a ticket page needed more than {MAX_QUERIES_PER_PAGE} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Discrete-event simulation of an on-sale spike with and without the waiting room.
+
+50k buyers arrive within a few seconds. Without admission control they all hit
+the booking endpoint at once and queue for the DB pool; with it they join the
+app.admission queue (the real InMemoryAdmissionQueue, driven by a virtual clock),
+poll their position, and book once admitted. The database is modelled as a
+pool of --db-connections connections with a fixed service time per booking.
+No server or database is needed:
+
+    python -m benchmarks.waiting_room_sim --arrivals 50000 --rate 400
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import random
+from collections import Counter
+
+# Importing the app requires a database URL, even though the simulation never connects
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app import admission
+from benchmarks.common import percentile
+
+
+class SimulatedDatabase:
+    """FIFO queue in front of a fixed number of connections, each serving one booking at a time."""
+
+    def __init__(self, connections: int, service_s: float):
+        self.free_at = [0.0] * connections
+        self.service_s = service_s
+        self.waiting_peak = 0
+        self._waiting_until = []  # start times of bookings still queued
+
+    def book(self, now: float) -> float:
+        """Schedules a booking arriving at `now`; returns its completion time."""
+        start = max(now, heapq.heappop(self.free_at))
+        heapq.heappush(self.free_at, start + self.service_s)
+        heapq.heappush(self._waiting_until, start)
+        while self._waiting_until and self._waiting_until[0] <= now:
+            heapq.heappop(self._waiting_until)
+        self.waiting_peak = max(self.waiting_peak, len(self._waiting_until))
+        return start + self.service_s
+
+
+async def simulate(args, waiting_room: bool) -> dict:
+    rng = random.Random(args.seed)
+    db = SimulatedDatabase(args.db_connections, args.service_ms / 1000)
+    queue = admission.InMemoryAdmissionQueue()
+    admission.ADMISSION_EVENT_RATES[1] = args.rate
+
+    # (time, buyer, action, place)
+    events = [(rng.uniform(0, args.arrival_window), buyer, "arrive", 0) for buyer in range(args.arrivals)]
+    heapq.heapify(events)
+    latencies, bookings_per_second, polls = [], Counter(), 0
+
+    while events:
+        now, buyer, action, place = heapq.heappop(events)
+        if action == "arrive" and not waiting_room:
+            action = "book"
+        if action == "arrive":
+            place, watermark = await queue.advance(1, join=True, now=now)
+            action = "poll"
+        if action == "poll":
+            polls += 1
+            _, watermark = await queue.advance(1, join=False, now=now)
+            wait = (place - watermark) / args.rate
+            if wait > 0:
+                # Clients poll at the suggested wait, but at least every poll interval
+                heapq.heappush(events, (now + min(max(wait, 0.05), args.poll_interval), buyer, "poll", place))
+                continue
+            action = "book"
+        if action == "book":
+            done = db.book(now)
+            latencies.append(done - now)
+            bookings_per_second[int(done)] += 1
+
+    per_second = list(bookings_per_second.values())
+    return {
+        "waiting_room": waiting_room,
+        "bookings": len(latencies),
+        "booking_latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "booking_latency_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "booking_latency_max_ms": round(max(latencies) * 1000, 1),
+        "db_queue_peak": db.waiting_peak,
+        "db_bookings_per_s_max": max(per_second),
+        "db_bookings_per_s_median": sorted(per_second)[len(per_second) // 2],
+        "position_polls": polls,
+        "drained_after_s": round(max(bookings_per_second) + 1, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--arrivals", type=int, default=50_000)
+    parser.add_argument("--arrival-window", type=float, default=5.0, help="seconds over which buyers arrive")
+    parser.add_argument("--rate", type=float, default=400, help="admissions per second for the event")
+    parser.add_argument("--db-connections", type=int, default=15)
+    parser.add_argument("--service-ms", type=float, default=20, help="DB time per booking")
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = [asyncio.run(simulate(args, waiting_room)) for waiting_room in (False, True)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
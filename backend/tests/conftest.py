@@ -0,0 +1,69 @@
+"""
+Shared fixtures. The app reads its configuration when it is imported, so the
+environment is set here first: a throwaway SQLite database and no rate limits.
+
+    cd backend && python -m pytest -q
+"""
+import itertools
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import auth, bootstrap, cache, crud, models, schemas
+from app.database import SessionLocal
+
+_names = itertools.count()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def tables():
+    bootstrap.create_db_and_tables()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The API without its startup hooks, so no background task queries the database behind a test's back."""
+    from app.main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_user(db):
+    """Creates a user (no bcrypt: the hash is never checked) and returns (user_id, auth headers)."""
+    def make(is_admin: bool = False):
+        name = f"user-{next(_names)}"
+        user = models.User(username=name, email=f"{name}@example.com", hashed_password="x", role="admin" if is_admin else "user")
+        db.add(user)
+        db.commit()
+        token = auth.create_access_token(data={"sub": user.username, "role": user.role, "uid": user.id})
+        return user.id, {"Authorization": f"Bearer {token}"}
+    return make
+
+
+@pytest.fixture
+def make_event(db):
+    def make(total_tickets: int = 100, inventory_shards: int = 0, price: int = 10) -> int:
+        event = crud.admin_create_event(db, schemas.EventCreate(
+            name=f"Event {next(_names)}", date=datetime.utcnow() + timedelta(days=30), location="Test Arena",
+            total_tickets=total_tickets, price=price, inventory_shards=inventory_shards,
+        ))
+        # As the create route does after the session call
+        cache.invalidate_catalog()
+        return event.id
+    return make
@@ -0,0 +1,33 @@
+"""Inventory sharding is set and seen by admins only, never in public event bodies."""
+from datetime import datetime, timedelta
+
+
+def event_body(**overrides) -> dict:
+    body = {
+        "name": "Sharded Gala", "date": (datetime.utcnow() + timedelta(days=20)).isoformat(),
+        "location": "Shard Hall", "total_tickets": 40, "price": 10,
+    }
+    return {**body, **overrides}
+
+
+def test_inventory_shards_are_admin_only(client, make_user):
+    _, admin = make_user(is_admin=True)
+    _, buyer = make_user()
+
+    created = client.post("/v1/events/", json=event_body(inventory_shards=4), headers=admin)
+    assert created.status_code == 201
+    assert created.json()["inventory_shards"] == 4
+    event_id = created.json()["id"]
+
+    public = client.get(f"/v1/events/{event_id}").json()
+    assert "inventory_shards" not in public and public["available_tickets"] == 40
+    assert all("inventory_shards" not in event for event in client.get("/v1/events/", params={"location": "Shard Hall"}).json())
+
+    # Left out on update: the event keeps its shards
+    updated = client.put(f"/v1/events/{event_id}", json=event_body(total_tickets=50), headers=admin)
+    assert updated.status_code == 200
+    assert updated.json()["inventory_shards"] == 4 and updated.json()["available_tickets"] == 50
+
+    assert client.post(f"/v1/tickets/book/{event_id}", headers=buyer).status_code == 201
+    tickets = client.get("/v1/tickets/", headers=buyer).json()
+    assert "inventory_shards" not in tickets[0]["event"] and tickets[0]["event"]["available_tickets"] == 49
@@ -0,0 +1,151 @@
+"""Waiting room tokens are bound to one buyer, book once, and joining again keeps the buyer's place."""
+import asyncio
+import time
+
+import pytest
+
+from app import admission
+
+
+@pytest.fixture(autouse=True)
+def waiting_room(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_CONTROL_ENABLED", True)
+    monkeypatch.setattr(admission, "_queue", admission.InMemoryAdmissionQueue())
+    monkeypatch.setattr(admission, "ADMISSION_EVENT_RATES", {})
+
+
+def join(client, event_id: int, headers: dict) -> dict:
+    response = client.post(f"/v1/queue/{event_id}/join", headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+def book(client, event_id: int, headers: dict, token: str, key: str = None):
+    headers = {**headers, "X-Queue-Token": token}
+    if key:
+        headers["Idempotency-Key"] = key
+    return client.post(f"/v1/tickets/book/{event_id}", headers=headers)
+
+
+def test_token_lifetime_is_minutes():
+    assert admission.ADMISSION_TOKEN_TTL_SECONDS <= 15 * 60
+
+
+def test_joining_again_returns_the_same_place(client, make_user, make_event):
+    event_id = make_event()
+    _, headers = make_user()
+
+    first, second = join(client, event_id, headers), join(client, event_id, headers)
+
+    assert second["token"] == first["token"]
+    # Another buyer is behind, not next to a second place of the first one
+    _, other = make_user()
+    assert join(client, event_id, other)["token"].split(".")[1] == "2"
+
+
+def test_token_is_bound_to_the_buyer(client, make_user, make_event):
+    event_id = make_event()
+    _, headers = make_user()
+    _, thief = make_user()
+    token = join(client, event_id, headers)["token"]
+
+    assert book(client, event_id, thief, token).status_code == 403
+    assert book(client, event_id, headers, token).status_code == 201
+
+
+def test_token_books_once(client, make_user, make_event):
+    event_id = make_event()
+    _, headers = make_user()
+    token = join(client, event_id, headers)["token"]
+
+    assert book(client, event_id, headers, token).status_code == 201
+    assert book(client, event_id, headers, token).status_code == 403
+    assert client.get(f"/v1/queue/{event_id}/position", headers={**headers, "X-Queue-Token": token}).status_code == 403
+    # A new join is a new place at the back
+    assert join(client, event_id, headers)["token"] != token
+
+
+def test_basket_and_hold_use_the_tokens_up(client, make_user, make_event):
+    first, second = make_event(), make_event()
+    _, headers = make_user()
+    tokens = ",".join(join(client, event_id, headers)["token"] for event_id in (first, second))
+    basket = {"items": [{"event_id": first, "quantity": 1}, {"event_id": second, "quantity": 1}]}
+
+    assert client.post("/v1/tickets/book", json=basket, headers={**headers, "X-Queue-Token": tokens}).status_code == 201
+    assert client.post("/v1/tickets/book", json=basket, headers={**headers, "X-Queue-Token": tokens}).status_code == 403
+
+    token = join(client, first, headers)["token"]
+    hold = {"event_id": first, "quantity": 1}
+    assert client.post("/v1/holds/", json=hold, headers={**headers, "X-Queue-Token": token}).status_code == 201
+    assert client.post("/v1/holds/", json=hold, headers={**headers, "X-Queue-Token": token}).status_code == 403
+
+
+def test_failed_booking_gives_the_token_back(client, make_user, make_event):
+    event_id = make_event(total_tickets=1)
+    _, buyer = make_user()
+    _, late = make_user()
+    assert book(client, event_id, buyer, join(client, event_id, buyer)["token"]).status_code == 201
+    token = join(client, event_id, late)["token"]
+
+    assert book(client, event_id, late, token).status_code == 409
+    assert client.get(f"/v1/queue/{event_id}/position", headers={**late, "X-Queue-Token": token}).json()["admitted"]
+
+
+def test_idempotent_retry_replays_a_booking_that_used_its_token(client, make_user, make_event):
+    event_id = make_event()
+    _, headers = make_user()
+    token = join(client, event_id, headers)["token"]
+
+    first = book(client, event_id, headers, token, key="retry-after-admission")
+    retry = book(client, event_id, headers, token, key="retry-after-admission")
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers.get("Idempotent-Replayed") == "true"
+
+
+def test_waiting_room_rejection_is_not_stored_under_the_key(client, make_user, make_event):
+    event_id = make_event()
+    _, headers = make_user()
+    admission.ADMISSION_EVENT_RATES[event_id] = 0.001
+    token = join(client, event_id, headers)["token"]
+
+    assert book(client, event_id, headers, token, key="queued").status_code == 429
+
+    admission.ADMISSION_EVENT_RATES[event_id] = 10_000
+    time.sleep(0.01)
+    assert book(client, event_id, headers, token, key="queued").status_code == 201
+
+
+@pytest.mark.parametrize("key", [None, "checked-once"])
+def test_booking_checks_the_token_once(client, make_user, make_event, monkeypatch, key):
+    event_id = make_event()
+    _, headers = make_user()
+    token = join(client, event_id, headers)["token"]
+    checks = []
+    check_token = admission._check_token
+
+    async def counting_check_token(*args):
+        checks.append(args)
+        return await check_token(*args)
+
+    monkeypatch.setattr(admission, "_check_token", counting_check_token)
+
+    assert book(client, event_id, headers, token, key=key).status_code == 201
+    assert len(checks) == 1
+
+
+def test_expired_places_are_dropped_whatever_their_order():
+    queue = admission.InMemoryAdmissionQueue()
+
+    async def fill():
+        # Stored first but admitted last: expires after the place stored next
+        await queue.set_member(1, "late", (1, 1000), now=0)
+        await queue.set_member(1, "early", (2, 10), now=0)
+        await queue.set_member(1, "claimed", (3, 15), now=0)
+        await queue.claim_member(1, "claimed", (3, 15))
+        await queue.set_member(1, "next", (4, 3000), now=20)
+
+    asyncio.run(fill())
+
+    assert set(queue._members) == {(1, "late"), (1, "next")}
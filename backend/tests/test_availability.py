@@ -0,0 +1,44 @@
+"""Availability streams are well-formed SSE and end with a `closed` message when their event is deleted."""
+import asyncio
+
+from app import availability, crud
+
+
+def test_delete_closes_the_event_streams(db, client, make_event, monkeypatch):
+    event_id = make_event()
+    other_id = make_event()
+    hub = availability.AvailabilityHub(availability.InProcessBroker(), heartbeat_seconds=3600)
+    monkeypatch.setattr(availability, "_hub", hub)
+
+    async def watch():
+        hub.broker.attach(hub)
+        deleted, other = hub.stream(event_id, 100), hub.stream(other_id, 100)
+        first = await deleted.__anext__()
+        await other.__anext__()
+        crud.admin_delete_event(db, event_id)
+        hub.publish(other_id)
+        await hub.tick()
+        closed = await deleted.__anext__()
+        try:
+            await deleted.__anext__()
+            ended = False
+        except StopAsyncIteration:
+            ended = True
+        await other.aclose()
+        return first, closed, ended
+
+    first, closed, ended = asyncio.run(asyncio.wait_for(watch(), timeout=10))
+
+    assert b"event: availability" in first
+    assert b"event: closed" in closed and f'"event_id": {event_id}'.encode() in closed
+    assert ended
+    assert hub.subscribers == 0
+    assert client.get(f"/v1/events/{event_id}/availability").status_code == 404
+
+
+def test_messages_are_sse_frames():
+    assert availability._message(7, 3, retry=3000) == (
+        b'event: availability\ndata: {"event_id": 7, "available_tickets": 3}\nretry: 3000\n\n'
+    )
+    assert availability._closed_message(7) == b'event: closed\ndata: {"event_id": 7}\n\n'
+    assert availability._KEEPALIVE == b": keepalive\n\n"
@@ -0,0 +1,165 @@
+"""Concurrent bookings never oversell: on every inventory path, booked + available == total."""
+import asyncio
+import random
+import threading
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app import batcher, crud, models, schemas
+from app.database import SessionLocal
+
+CLIENTS = 6
+ATTEMPTS_PER_CLIENT = 40
+
+
+def booked(db, event_id: int) -> int:
+    return db.scalar(
+        select(func.count(models.Ticket.id))
+        .where(models.Ticket.event_id == event_id, models.Ticket.status == "booked")
+    )
+
+
+def assert_consistent(db, event_ids: list) -> None:
+    db.expire_all()
+    for event_id in event_ids:
+        event = crud.get_event_by_id(db, event_id)
+        assert 0 <= event.available_tickets <= event.total_tickets
+        assert booked(db, event_id) + event.available_tickets == event.total_tickets
+    assert crud.get_inventory_discrepancies(db, event_ids) == []
+
+
+def run_buyer(owner_id: int, event_ids: list, rng: random.Random, errors: list, cancel: bool = False) -> None:
+    """Books 1-5 tickets at a time until the attempts run out; optionally cancels some of them again."""
+    db = SessionLocal()
+    mine = []
+    try:
+        for _ in range(ATTEMPTS_PER_CLIENT):
+            try:
+                if cancel and mine and rng.random() < 0.25:
+                    crud.cancel_ticket(db, mine.pop(rng.randrange(len(mine))), owner_id)
+                else:
+                    tickets = crud.book_tickets(db, rng.choice(event_ids), owner_id, rng.randint(1, 5))
+                    mine.extend(ticket.id for ticket in tickets)
+            except HTTPException:
+                # Sold out
+                db.rollback()
+            except OperationalError:
+                # SQLite: "database is locked" under many writers; the transaction was rolled back
+                db.rollback()
+    except Exception as exc:
+        errors.append(exc)
+    finally:
+        db.close()
+
+
+def run_rebalancer(event_id: int, shard_counts: list, done: threading.Event, errors: list) -> None:
+    """Re-shards the event while the buyers run, including back to a single counter (0) and out again."""
+    db = SessionLocal()
+    try:
+        for shard_count in shard_counts:
+            if done.wait(0.02):
+                break
+            event = crud.get_event_by_id(db, event_id)
+            update = schemas.EventUpdate(
+                name=event.name, date=event.date, location=event.location,
+                total_tickets=event.total_tickets, price=event.price, inventory_shards=shard_count,
+            )
+            try:
+                crud.admin_update_event(db, event_id, update)
+            except OperationalError:
+                db.rollback()
+    except Exception as exc:
+        errors.append(exc)
+    finally:
+        db.close()
+
+
+def run_threads(threads: list) -> None:
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=120)
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_conditional_update_never_oversells(db, make_user, make_event):
+    event_ids = [make_event(total_tickets=60), make_event(total_tickets=25)]
+    owners = [make_user()[0] for _ in range(CLIENTS)]
+    errors = []
+    rng = random.Random(1)
+
+    run_threads([
+        threading.Thread(target=run_buyer, args=(owner_id, event_ids, random.Random(rng.random()), errors))
+        for owner_id in owners
+    ])
+
+    assert errors == []
+    assert_consistent(db, event_ids)
+    # Far more demand than stock: what is left is too little for at least one of the failed requests
+    assert all(crud.get_event_by_id(db, event_id).available_tickets < 5 for event_id in event_ids)
+
+
+def test_booking_spills_over_shards(db, make_user, make_event):
+    event_id = make_event(total_tickets=8, inventory_shards=4)
+    owner_id, _ = make_user()
+
+    # No shard holds 5 (2 each): the booking is gathered from several
+    assert len(crud.book_tickets(db, event_id, owner_id, 5)) == 5
+    assert crud.get_event_by_id(db, event_id).available_tickets == 3
+    try:
+        crud.book_tickets(db, event_id, owner_id, 4)
+        raise AssertionError("booked more than was left")
+    except HTTPException as e:
+        assert e.status_code == 409
+    assert len(crud.book_tickets(db, event_id, owner_id, 3)) == 3
+    assert crud.get_shard_totals(db, [event_id]) == {event_id: 0}
+    assert_consistent(db, [event_id])
+
+
+def test_shards_never_oversell_while_rebalanced_and_cancelled(db, make_user, make_event):
+    event_ids = [make_event(total_tickets=50, inventory_shards=4), make_event(total_tickets=30, inventory_shards=3)]
+    owners = [make_user()[0] for _ in range(CLIENTS)]
+    errors = []
+    rng = random.Random(2)
+    done = threading.Event()
+
+    buyers = [
+        threading.Thread(target=run_buyer, args=(owner_id, event_ids, random.Random(rng.random()), errors, True))
+        for owner_id in owners
+    ]
+    rebalancer = threading.Thread(target=run_rebalancer, args=(event_ids[0], [2, 6, 0, 3, 8, 1, 4] * 3, done, errors))
+    run_threads([rebalancer] + buyers)
+    done.set()
+
+    assert errors == []
+    assert_consistent(db, event_ids)
+
+
+def test_batched_bookings_fill_partially_without_overselling(db, make_user, make_event):
+    event_ids = [make_event(total_tickets=25), make_event(total_tickets=25, inventory_shards=4)]
+    owners = [make_user()[0] for _ in range(CLIENTS)]
+    rng = random.Random(3)
+    requests = [(rng.choice(event_ids), rng.choice(owners), rng.randint(1, 3)) for _ in range(60)]
+
+    async def book_through_two_workers():
+        # Two workers' batchers commit at the same time against the same stock
+        workers = [batcher.BookingBatcher(window_ms=10, max_batch=15), batcher.BookingBatcher(window_ms=10, max_batch=15)]
+        return await asyncio.gather(
+            *(workers[i % 2].submit(*request) for i, request in enumerate(requests)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(book_through_two_workers())
+
+    for event_id in event_ids:
+        granted = [len(result) for (request_event, _, _), result in zip(requests, results)
+                   if request_event == event_id and isinstance(result, list)]
+        refused = [quantity for (request_event, _, quantity), result in zip(requests, results)
+                   if request_event == event_id and isinstance(result, HTTPException) and result.status_code == 409]
+        # Each request gets all of its tickets or none, and a sold out batch still grants what fits
+        assert granted and refused
+        assert sum(granted) == booked(db, event_id) <= 25
+        assert crud.get_event_by_id(db, event_id).available_tickets < max(refused)
+    assert_consistent(db, event_ids)
@@ -0,0 +1,102 @@
+"""Stock stays equal to total minus booked and held tickets under concurrent bookings and cancellations."""
+import random
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app import crud, models
+from app.database import SessionLocal
+
+CLIENTS = 4
+ACTIONS_PER_CLIENT = 60
+
+
+def run_client(owner_id: int, event_ids: list, cancelled_event_id: int, rng: random.Random, errors: list) -> None:
+    """Books, cancels one by one and in bulk, takes and releases holds, and tries the cancelled event."""
+    db = SessionLocal()
+    mine = []
+    try:
+        for _ in range(ACTIONS_PER_CLIENT):
+            action = rng.random()
+            try:
+                if action < 0.4 or not mine:
+                    items = {event_id: rng.randint(1, 2) for event_id in rng.sample(event_ids, rng.randint(1, 2))}
+                    mine.extend(ticket.id for ticket in crud.book_basket(db, owner_id, items))
+                elif action < 0.6:
+                    crud.cancel_ticket(db, mine.pop(rng.randrange(len(mine))), owner_id)
+                elif action < 0.75:
+                    batch, mine = mine[:3], mine[3:]
+                    # The same ids twice: each ticket returns its stock once
+                    crud.cancel_tickets(db, owner_id, batch + batch)
+                elif action < 0.9:
+                    hold = crud.create_hold(db, owner_id, rng.choice(event_ids), 2)
+                    if rng.random() < 0.5:
+                        mine.extend(ticket.id for ticket in crud.confirm_hold(db, hold.id, owner_id))
+                    else:
+                        crud.release_hold(db, hold.id, owner_id)
+                else:
+                    crud.book_basket(db, owner_id, {cancelled_event_id: 1})
+            except HTTPException:
+                # Sold out, off sale, or a ticket another action got to first
+                db.rollback()
+            except OperationalError:
+                # SQLite: "database is locked" under many writers; the transaction was rolled back
+                db.rollback()
+    except Exception as exc:
+        errors.append(exc)
+    finally:
+        db.close()
+
+
+def run_cascade(event_id: int, started: threading.Event, errors: list) -> None:
+    """Cancels the event once the clients are running, in small batches that interleave with them."""
+    db = SessionLocal()
+    try:
+        started.wait()
+        crud.start_event_cancellation(db, event_id)
+        while crud.get_event_cancellation(db, event_id)["status"] != "done":
+            try:
+                crud.cancel_event_tickets_batch(db, event_id, batch_size=10)
+            except OperationalError:
+                db.rollback()
+    except Exception as exc:
+        errors.append(exc)
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def owners(make_user):
+    return [make_user()[0] for _ in range(CLIENTS + 1)]
+
+
+def test_inventory_is_consistent_after_concurrent_cancellations(db, make_event, owners):
+    event_ids = [make_event(total_tickets=40, inventory_shards=4 * (i % 2)) for i in range(4)]
+    cancelled_event_id = make_event(total_tickets=300)
+    crud.book_basket(db, owners[-1], {cancelled_event_id: 200})
+
+    started = threading.Event()
+    errors = []
+    rng = random.Random(22)
+    threads = [
+        threading.Thread(target=run_client, args=(owner_id, event_ids, cancelled_event_id, random.Random(rng.random()), errors))
+        for owner_id in owners[:-1]
+    ]
+    threads.append(threading.Thread(target=run_cascade, args=(cancelled_event_id, started, errors)))
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join(timeout=120)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert errors == []
+    db.expire_all()
+    assert crud.get_inventory_discrepancies(db, event_ids + [cancelled_event_id]) == []
+    assert db.scalar(
+        select(func.count(models.Ticket.id))
+        .where(models.Ticket.event_id == cancelled_event_id, models.Ticket.status == "booked")
+    ) == 0
@@ -0,0 +1,144 @@
+"""The catalog cache never serves a body under a tag that describes another version of the event."""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app import cache, crud, models, schemas
+
+
+def edit_elsewhere(db, event_id: int, name: str) -> None:
+    """An admin edit handled by another worker: the row changes, this worker's cache is not told."""
+    db.execute(
+        update(models.Event)
+        .where(models.Event.id == event_id)
+        .values(name=name, version=models.Event.version + 1)
+    )
+    db.commit()
+
+
+def deactivate_elsewhere(db, event_id: int) -> None:
+    """A soft delete handled by another worker: this worker's cached id pages still list the event."""
+    db.execute(update(models.Event).where(models.Event.id == event_id).values(is_active=False))
+    db.commit()
+
+
+def test_detail_reloads_a_body_edited_on_another_worker(client, db, make_event):
+    event_id = make_event()
+    first = client.get(f"/v1/events/{event_id}")
+    edit_elsewhere(db, event_id, "Renamed")
+
+    second = client.get(f"/v1/events/{event_id}")
+
+    assert second.json()["name"] == "Renamed"
+    assert "version" not in second.json()
+    assert second.headers["ETag"] != first.headers["ETag"]
+    # The old tag no longer matches, and the new one is a valid 304 for the new body
+    assert client.get(f"/v1/events/{event_id}", headers={"If-None-Match": first.headers["ETag"]}).status_code == 200
+    assert client.get(f"/v1/events/{event_id}", headers={"If-None-Match": second.headers["ETag"]}).status_code == 304
+
+
+def test_list_reloads_bodies_edited_on_another_worker(client, db, make_event):
+    event_id = make_event()
+    params = {"location": "Test Arena", "limit": 100}
+    first = client.get("/v1/events/", params=params)
+    assert any(event["id"] == event_id for event in first.json())
+    edit_elsewhere(db, event_id, "Renamed in list")
+
+    second = client.get("/v1/events/", params=params)
+
+    assert [event["name"] for event in second.json() if event["id"] == event_id] == ["Renamed in list"]
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert client.get("/v1/events/", params=params, headers={"If-None-Match": second.headers["ETag"]}).status_code == 304
+
+
+def test_list_and_search_drop_events_deactivated_on_another_worker(client, db):
+    event_id = crud.admin_create_event(db, schemas.EventCreate(
+        name="Farewell Tour", date=datetime.utcnow() + timedelta(days=30), location="Deactivation Hall",
+        total_tickets=10, price=10,
+    )).id
+    params = {"location": "Deactivation Hall"}
+    search = {"q": "farewell", "location": "Deactivation Hall"}
+    assert any(event["id"] == event_id for event in client.get("/v1/events/", params=params).json())
+    assert any(event["id"] == event_id for event in client.get("/v1/events/search", params=search).json())
+    deactivate_elsewhere(db, event_id)
+
+    assert all(event["id"] != event_id for event in client.get("/v1/events/", params=params).json())
+    assert all(event["id"] != event_id for event in client.get("/v1/events/search", params=search).json())
+
+
+@pytest.mark.parametrize("argv, environ, workers", [
+    (["uvicorn", "app.main:app", "--workers", "4"], {}, 4),
+    (["gunicorn", "app.main:app", "--workers=3"], {}, 3),
+    (["gunicorn", "app.main:app", "-w", "2"], {}, 2),
+    (["uvicorn", "app.main:app"], {"WEB_CONCURRENCY": "5"}, 5),
+    (["uvicorn", "app.main:app"], {}, 1),
+])
+def test_server_workers(monkeypatch, argv, environ, workers):
+    monkeypatch.setattr(sys, "argv", argv)
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+    assert cache.server_workers() == workers
+
+
+def test_memory_backend_refuses_several_workers(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["uvicorn", "app.main:app", "--workers", "2"])
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "memory")
+    with pytest.raises(RuntimeError, match="CACHE_BACKEND=redis"):
+        cache.check_backend()
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "redis")
+    cache.check_backend()
+
+
+class RecordingBackend(cache.InMemoryBackend):
+    """A network backend stand-in: records whether each call ran on an event loop."""
+    blocking = True
+
+    def __init__(self):
+        super().__init__(maxsize=1000)
+        self.on_loop = []
+
+    def _record(self):
+        try:
+            asyncio.get_running_loop()
+            self.on_loop.append(True)
+        except RuntimeError:
+            self.on_loop.append(False)
+
+    def get_many(self, keys):
+        self._record()
+        return super().get_many(keys)
+
+    def set_many(self, mapping, ttl):
+        self._record()
+        super().set_many(mapping, ttl)
+
+    def delete(self, *keys):
+        self._record()
+        super().delete(*keys)
+
+    def incr(self, key):
+        self._record()
+        return super().incr(key)
+
+
+def test_network_cache_calls_never_run_on_the_event_loop(client, make_user, make_event, monkeypatch):
+    backend = RecordingBackend()
+    monkeypatch.setattr(cache, "_backend", backend)
+    event_id = make_event()
+    _, admin = make_user(is_admin=True)
+
+    client.get("/v1/events/", params={"location": "Test Arena"})
+    client.get(f"/v1/events/{event_id}")
+    client.get("/v1/events/search", params={"q": "event"})
+    client.put(f"/v1/events/{event_id}", headers=admin, json={
+        "name": "Moved", "date": (datetime.utcnow() + timedelta(days=9)).isoformat(), "location": "Test Arena",
+        "total_tickets": 100, "price": 10,
+    })
+    client.delete(f"/v1/events/{event_id}", headers=admin)
+
+    assert len(backend.on_loop) > 5
+    assert not any(backend.on_loop)
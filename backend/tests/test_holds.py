@@ -0,0 +1,39 @@
+"""Holds of an event that goes off sale cannot be confirmed, and deleting an event returns its held stock."""
+from sqlalchemy import func, select
+
+from app import crud, models
+
+
+def hold(client, event_id: int, headers: dict, quantity: int = 2) -> str:
+    response = client.post("/v1/holds/", json={"event_id": event_id, "quantity": quantity}, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_deleting_an_event_releases_its_holds(db, client, make_user, make_event):
+    event_id = make_event(total_tickets=10)
+    _, buyer = make_user()
+    _, admin = make_user(is_admin=True)
+    hold_id = hold(client, event_id, buyer)
+
+    assert client.delete(f"/v1/events/{event_id}", headers=admin).status_code == 200
+
+    assert client.post(f"/v1/holds/{hold_id}/confirm", headers=buyer).status_code == 409
+    db.expire_all()
+    assert db.get(models.Hold, hold_id).status == "released"
+    assert crud.get_event_by_id(db, event_id).available_tickets == 10
+    assert crud.get_inventory_discrepancies(db, [event_id]) == []
+
+
+def test_hold_of_an_inactive_event_cannot_be_confirmed(db, client, make_user, make_event):
+    event_id = make_event(total_tickets=10)
+    _, buyer = make_user()
+    hold_id = hold(client, event_id, buyer)
+    # Deactivated without going through delete or cancellation
+    db.get(models.Event, event_id).is_active = False
+    db.commit()
+
+    assert client.post(f"/v1/holds/{hold_id}/confirm", headers=buyer).status_code == 409
+    db.expire_all()
+    assert db.get(models.Hold, hold_id).status == "held"
+    assert db.scalar(select(func.count(models.Ticket.id)).where(models.Ticket.event_id == event_id)) == 0
@@ -0,0 +1,87 @@
+"""Idempotency keys: a request is not run twice by its retry, whether cancelled by a disconnect or slow."""
+import asyncio
+from typing import Dict
+
+import pytest
+from fastapi import HTTPException
+
+from app import crud, idempotency
+from app.database import SessionLocal
+
+
+def run(db, key, handler):
+    return idempotency.run_idempotent(db, "test.book", "1", key, idempotency.request_hash(key), handler, response_model=Dict[str, int])
+
+
+def test_cancelled_request_finishes_and_the_retry_replays_it(db):
+    calls = []
+
+    async def book():
+        await asyncio.sleep(0.2)  # Committing in a threadpool thread or the batcher: not stopped by the cancel
+        calls.append(1)
+        return {"ticket": len(calls)}
+
+    async def scenario():
+        request = asyncio.create_task(run(db, "disconnect", book))
+        await asyncio.sleep(0.05)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        return await run(db, "disconnect", book)
+
+    retry = asyncio.run(scenario())
+
+    assert calls == [1]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.body == b'{"ticket": 1}'
+    assert crud._get_idempotency_key(db, "test.book", "1", "disconnect").status_code == 201
+
+
+def test_failed_request_releases_the_key(db):
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        raise HTTPException(status_code=503, detail="Try again")
+
+    async def succeed():
+        calls.append(1)
+        return {"ticket": 7}
+
+    with pytest.raises(HTTPException):
+        asyncio.run(run(db, "failed", fail))
+    response = asyncio.run(run(db, "failed", succeed))
+
+    assert calls == [1, 1]
+    assert "Idempotent-Replayed" not in response.headers
+
+
+def test_slow_request_keeps_its_claim_from_a_retry_on_another_worker(db, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", 0.5)
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_HEARTBEAT_SECONDS", 0.1)
+    calls = []
+
+    async def book():
+        await asyncio.sleep(1.5)  # Waiting on the pool or the batcher, well past the lock timeout
+        calls.append(1)
+        return {"ticket": len(calls)}
+
+    async def scenario():
+        first = asyncio.create_task(run(db, "slow", book))
+        await asyncio.sleep(0.8)
+        # Another worker: no in-process future to wait on, only the table
+        other = SessionLocal()
+        try:
+            retry = await idempotency._run_claimed(
+                other, ("test.book", "1", "slow"), idempotency.request_hash("slow"),
+                book, Dict[str, int], 201, None,
+            )
+        finally:
+            other.close()
+        return await first, retry
+
+    first, retry = asyncio.run(scenario())
+
+    assert calls == [1]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.body == first.body == b'{"ticket": 1}'
@@ -0,0 +1,26 @@
+"""With PROMETHEUS_MULTIPROC_DIR, /metrics reports the sum over every worker process."""
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code: str, multiproc_dir) -> str:
+    # prometheus_client picks its mode at import, so each "worker" is a process of its own
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir)}
+    return subprocess.run(
+        [sys.executable, "-c", "from app import metrics\n" + code], env=env, cwd=BACKEND,
+        capture_output=True, text=True, check=True,
+    ).stdout
+
+
+def test_metrics_are_summed_over_workers(tmp_path):
+    run("metrics.LOGINS_TOTAL.labels('success').inc()\nmetrics.HTTP_REQUESTS_IN_FLIGHT.inc()", tmp_path)
+    # A worker that shut down: its counters stay, its live gauges are dropped
+    run("metrics.LOGINS_TOTAL.labels('success').inc(2)\nmetrics.HTTP_REQUESTS_IN_FLIGHT.inc()\nmetrics.mark_worker_dead()", tmp_path)
+
+    scrape = run("print(metrics.metrics_response().body.decode())", tmp_path)
+
+    assert 'logins_total{outcome="success"} 3.0' in scrape
+    assert "http_requests_in_flight 1.0" in scrape
@@ -0,0 +1,48 @@
+"""Only login, registration and booking routes are rate limited, and RATE_LIMITS typos fail at startup."""
+import pytest
+
+from app import ratelimit
+
+
+@pytest.fixture
+def tight_limits(monkeypatch):
+    """One request per bucket, from a fresh limiter."""
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "_limiter", ratelimit.InMemoryRateLimiter())
+    monkeypatch.setattr(ratelimit, "RATE_LIMITS", {key: (0.001, 1) for key in ratelimit.RATE_LIMITS})
+
+
+def test_catalog_reads_are_not_limited(client, make_event, tight_limits):
+    event_id = make_event()
+    for _ in range(5):
+        assert client.get("/v1/events/").status_code == 200
+        assert client.get(f"/v1/events/{event_id}").status_code == 200
+
+
+def test_booking_is_limited(client, make_user, make_event, tight_limits):
+    event_id = make_event()
+    _, headers = make_user()
+    assert client.post(f"/v1/tickets/book/{event_id}", headers=headers).status_code == 201
+    limited = client.post(f"/v1/tickets/book/{event_id}", headers=headers)
+    assert limited.status_code == 429
+    assert "Retry-After" in limited.headers
+
+
+def test_parse_limits():
+    assert ratelimit.parse_limits(" booking.user=5:20, login.ip=2:40 ,") == {
+        ("booking", "user"): (5.0, 20.0), ("login", "ip"): (2.0, 40.0),
+    }
+    assert ratelimit.parse_limits("") == {}
+
+
+@pytest.mark.parametrize("spec, error", [
+    ("booking.user=5", "not class.scope=rate:burst"),
+    ("booking.user:5:20", "not class.scope=rate:burst"),
+    ("booking.user=fast:20", "not class.scope=rate:burst"),
+    ("default.ip=50:200", "unknown limit 'default.ip'"),
+    ("booking=5:20", "unknown limit 'booking'"),
+    ("booking.user=0:20", "rate above 0"),
+])
+def test_parse_limits_rejects(spec, error):
+    with pytest.raises(ValueError, match=error):
+        ratelimit.parse_limits(spec)
@@ -0,0 +1,31 @@
+"""Search flags queries that match more events than it ranks."""
+from datetime import datetime, timedelta
+
+from app import cache, crud, schemas, search
+
+
+def make_festival(db) -> None:
+    crud.admin_create_event(db, schemas.EventCreate(
+        name="Zephyr Festival", date=datetime.utcnow() + timedelta(days=30), location="Truncation Field",
+        total_tickets=10, price=10,
+    ))
+    cache.invalidate_catalog()
+
+
+def test_truncated_search_is_flagged(db, client, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_MAX_CANDIDATES", 3)
+    monkeypatch.setattr(search, "SEARCH_MAX_RESULTS", 3)
+    for _ in range(3):
+        make_festival(db)
+
+    complete = client.get("/v1/events/search", params={"q": "zephyr"})
+    assert complete.status_code == 200 and len(complete.json()) == 3
+    assert "X-Search-Truncated" not in complete.headers
+
+    make_festival(db)
+    truncated = client.get("/v1/events/search", params={"q": "zephyr", "limit": 2})
+    assert truncated.headers["X-Search-Truncated"] == "true"
+    assert len(truncated.json()) == 2
+    following = client.get("/v1/events/search", params={"q": "zephyr", "cursor": truncated.headers["X-Next-Cursor"]})
+    assert following.headers["X-Search-Truncated"] == "true"
+    assert len(following.json()) == 1
@@ -0,0 +1,59 @@
+"""GET /v1/tickets/ runs the same few statements however many tickets a page holds (no N+1)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from app import models
+from app.database import engine, replica_engine
+
+# The page joined with its events, plus one shard-totals query when sharded events are on it
+MAX_STATEMENTS_PER_PAGE = 2
+
+
+@pytest.fixture
+def heavy_user(db, make_user, make_event):
+    """A user with 150 tickets spread over 30 events, every third one sharded."""
+    user_id, headers = make_user()
+    event_ids = [make_event(total_tickets=500, inventory_shards=4 if i % 3 == 0 else 0) for i in range(30)]
+    now = datetime.utcnow()
+    db.execute(insert(models.Ticket), [
+        {"event_id": event_ids[i % 30], "owner_id": user_id, "status": "booked", "booking_date": now - timedelta(seconds=i)}
+        for i in range(150)
+    ])
+    db.commit()
+    return headers
+
+
+def get_page(client, headers, **params):
+    """Returns (statements executed, response) for one request."""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    for db_engine in {engine, replica_engine}:
+        event.listen(db_engine, "before_cursor_execute", listener)
+    try:
+        response = client.get("/v1/tickets/", params=params, headers=headers)
+    finally:
+        for db_engine in {engine, replica_engine}:
+            event.remove(db_engine, "before_cursor_execute", listener)
+    return statements, response
+
+
+@pytest.mark.parametrize("limit", [1, 10, 100])
+def test_statements_per_page_do_not_grow_with_page_size(client, heavy_user, limit):
+    statements, response = get_page(client, heavy_user, limit=limit)
+
+    assert response.status_code == 200
+    assert len(response.json()) == limit
+    assert all(ticket["event"]["id"] == ticket["event_id"] for ticket in response.json())
+    assert len(statements) <= MAX_STATEMENTS_PER_PAGE, statements
+
+
+def test_next_page_costs_the_same(client, heavy_user):
+    _, first = get_page(client, heavy_user, limit=100)
+    statements, second = get_page(client, heavy_user, limit=100, cursor=first.headers["X-Next-Cursor"])
+
+    assert second.status_code == 200
+    assert len(second.json()) == 50
+    assert not {ticket["id"] for ticket in first.json()} & {ticket["id"] for ticket in second.json()}
+    assert len(statements) <= MAX_STATEMENTS_PER_PAGE, statements